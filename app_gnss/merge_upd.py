@@ -1,62 +1,26 @@
 import argparse
 import os
+import sys
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from funcs import gnss_tools as gt
 
-def merge_epo_upd(f_ins, f_out, intv=30):
-    lines_in = []
-    nlines = []
-    nsats = []
-    idx_sys = []
-    for isys in range(0, len(f_ins)):
-        idxHeads = []
-        with open(f_ins[isys]) as file_object:
-            lines = file_object.readlines()
-        nline = len(lines)
-        nlines.append(nline)
-        for i in range(0, nline):
-            lines_in.append(lines[i])
-            if len(idxHeads) < 3:
-                if "EPOCH-TIME" in lines[i]:
-                    idxHeads.append(i)
-        recLen = idxHeads[1] - idxHeads[0] - 1
-        nsats.append(recLen)
-
-    idx_sys.append(0)
-    idx = nlines[0]
-    for isys in range(1, len(f_ins)):
-        idx_sys.append(idx)
-        idx += nlines[isys]
 
-    first_line = ""
-    with open(f_ins[0]) as f:
+def _first_line(f_in):
+    with open(f_in) as f:
         for line in f:
-            first_line = line
-            break
-    nepo = int(86400 / intv) + 1
-    with open(f_out, 'w') as file_object:
-        file_object.write(first_line)
-        for i in range(1, nepo):
-            idx1 = 2 + (i - 1) * (nsats[0] + 1) - 1
-            idx2 = 1 + i * (nsats[0] + 1) - 1
-            for j in range(idx1, idx2 + 1):
-                file_object.write(lines_in[j])
+            return line
+    return ""
 
-            for isys in range(1, len(f_ins)):
-                idx1 = idx_sys[isys] + 3 + (i - 1) * (nsats[isys] + 1) - 1
-                idx2 = idx_sys[isys] + 1 + i * (nsats[isys] + 1) - 1
-                for j in range(idx1, idx2 + 1):
-                    file_object.write(lines_in[j])
-        file_object.write("EOF\n")
+
+def merge_epo_upd(f_ins, f_out, intv=30):
+    """ merge epoch-wise UPD files by epoch time, epochs off the grid of intv seconds are dropped """
+    gt.merge_epo_upd(f_ins, f_out, header=_first_line(f_ins[0]), intv=intv)
 
 
 def merge_upd(f_ins, f_out):
-    first_line = ""
-    with open(f_ins[0]) as f:
-        for line in f:
-            first_line = line
-            break
     with open(f_out, 'w') as f1:
-        f1.write(first_line)
+        f1.write(_first_line(f_ins[0]))
         for file in f_ins:
             with open(file) as f2:
                 for line in f2:
@@ -17,9 +17,9 @@ class ProcCarRng(ProcGen):
 
     proj_id = 'CarRng'
 
-    required_subdir = super().required_subdir + ['ambupd', 'res', 'ambcon', 'enu']
-    required_opt = super().required_opt + ['estimator']
-    required_file = super().required_file + ['rinexo', 'rinexn', 'rinexc', 'sp3', 'biabern']
+    required_subdir = ProcGen.required_subdir + ['ambupd', 'res', 'ambcon', 'enu']
+    required_opt = ProcGen.required_opt + ['estimator']
+    required_file = ProcGen.required_file + ['rinexo', 'rinexn', 'rinexc', 'sp3', 'biabern']
 
     def init_daily(self):
         self._config.carrier_range = False
@@ -42,7 +42,7 @@ class ProcCarRng(ProcGen):
         logging.info(f"===> Calculate float ambiguities by precise point positioning")
         # GrtPpplsq(self._config, 'ppplsq_F', nmp=self.nthread).run()
         # self.basic_check(files=['recover_all', 'ambupd_in'])
-        backup_dir('log_tb', 'log_tb_save')
+        backup_dir('log_tb', 'log_tb_save', dedup=True)
         # backup_dir('res', 'res_F0')
         # self.editres(bad=80, jump=80, nshort=600, all_sites=True)
 
@@ -56,13 +56,13 @@ class ProcCarRng(ProcGen):
         GrtPpplsq(self._config, 'ppplsq_F', nmp=self.nthread).run()
         self.basic_check(files=['recover_all', 'ambupd_in'])
         GrtAmbfix(self._config, 'SD', 'ambfix', nmp=self.nthread, all_sites=True).run()
-        backup_dir('log_tb', 'log_tb_edtres')
-        backup_dir('res', 'res_F')
-        backup_dir('ambcon', 'ambcon_SD')
+        backup_dir('log_tb', 'log_tb_edtres', dedup=True)
+        backup_dir('res', 'res_F', dedup=True)
+        backup_dir('ambcon', 'ambcon_SD', dedup=True)
 
         GrtPpplsq(self._config, 'ppplsq_AR', nmp=self.nthread, fix_amb=True).run()
         check_res_sigma(self._config)
-        backup_dir('res', 'res_AR')
+        backup_dir('res', 'res_AR', dedup=True)
         self.basic_check(files=['recover_all', 'ambupd_in'])
 
         logging.info(f"===> Fix UD ambiguities of each site")
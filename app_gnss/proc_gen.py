@@ -4,7 +4,8 @@ import logging
 import argparse
 from funcs import GnssConfig, GnssTime, gns_sat, hms2sod, read_site_list, MAX_THREAD, timeblock, mkdir, \
     get_grg_wsb, check_turboedit_log, check_brd_orbfit, backup_files, edit_ics, \
-    GrtClockRepair, GrtTurboedit, GrtPreedit, GrtOi, GrtOrbfit, GrtEditres
+    GrtClockRepair, GrtTurboedit, GrtPreedit, GrtOi, GrtOrbfit, GrtEditres, ResourceBudget, set_telemetry, set_context, \
+    RetentionPolicy, wait_retention, set_product_cache
 
 
 def basic_args(default_args: dict):
@@ -103,6 +104,10 @@ class ProcGen:
             sat_rm.extend(gns_sat(s))
         sat_rm = list(set(sat_rm))
         self.sat_rm = sat_rm
+        # the path is fixed here, before changing to the daily work directories
+        set_telemetry(self._config.telemetry)
+        set_product_cache(self._config.product_cache)
+        set_context(proj=self.proj_id)
 
     @classmethod
     def from_args(cls):
@@ -121,7 +126,14 @@ class ProcGen:
 
     @property
     def nthread(self):
-        return min(len(self._config.all_sites), MAX_THREAD)
+        """
+        processes of the receiver-parallel commands, at most MAX_THREAD unless [common] max_cores is set,
+        limited again by the budget in GrtCmd.check
+        """
+        ncore = ResourceBudget.from_config(self._config).cores
+        if self._config.max_cores <= 0:
+            ncore = min(ncore, MAX_THREAD)
+        return min(len(self._config.all_sites), ncore)
 
     @property
     def base_dir(self):
@@ -153,6 +165,9 @@ class ProcGen:
         if not os.path.isdir(self._workdir):
             os.makedirs(self._workdir)
         else:
+            # the retention of a previous day may still run in this directory (fixed workdir),
+            # also if the directory is kept, the files must not be compressed while they are used
+            wait_retention(self._workdir)
             if not self._kp_dir:
                 shutil.rmtree(self._workdir)
                 os.makedirs(self._workdir)
@@ -276,6 +291,7 @@ class ProcGen:
                 self.next_day()
                 continue
             crt_time = self._config.beg_time
+            set_context(day=f"{crt_time.year}-{crt_time.doy:0>3d}")
             # set logger
             logger = logging.getLogger()
             fh = logging.FileHandler(f"proc_{crt_time.year}{crt_time.doy:0>3d}.log")
@@ -293,11 +309,16 @@ class ProcGen:
 
             with timeblock(f"Finished process {crt_time.year}-{crt_time.doy:0>3d}"):
                 self.process_daily()
+            # compress and delete outputs in the background while the next day is processed
+            retention = RetentionPolicy.from_config(self._config)
+            if retention is not None:
+                retention.submit(self._workdir)
 
             # next day
             logging.info(f"------------------------------------------------------------------------\n")
             logger.removeHandler(fh)
             self.next_day()
+        wait_retention()
 
 
 if __name__ == '__main__':
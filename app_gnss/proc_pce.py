@@ -16,9 +16,9 @@ class ProcPce(ProcGen):
 
     proj_id = 'PCE'
 
-    required_subdir = super().required_subdir + ['clkdif']
-    required_opt = super().required_opt + ['estimator']
-    required_file = super().required_file + ['rinexo', 'rinexn', 'biabern', 'sp3']
+    required_subdir = ProcGen.required_subdir + ['clkdif']
+    required_opt = ProcGen.required_opt + ['estimator']
+    required_file = ProcGen.required_file + ['rinexo', 'rinexn', 'biabern', 'sp3']
 
     ref_cen = ['com', 'gbm', 'wum', 'esm']
 
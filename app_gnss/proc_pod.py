@@ -18,9 +18,9 @@ class ProcPod(ProcGen):
 
     proj_id = 'POD'
 
-    required_subdir = super().required_subdir + ['orbdif', 'clkdif']
-    required_opt = super().required_opt + ['estimator']
-    required_file = super().required_file + ['rinexo', 'rinexn', 'biabern']
+    required_subdir = ProcGen.required_subdir + ['orbdif', 'clkdif']
+    required_opt = ProcGen.required_opt + ['estimator']
+    required_file = ProcGen.required_file + ['rinexo', 'rinexn', 'biabern']
 
     ref_cen = ['com', 'gbm', 'wum', 'esm']
     sat_rm = ['C01', 'C02', 'C03', 'C04', 'C05', 'C59', 'C60',
@@ -134,7 +134,7 @@ class ProcPod(ProcGen):
         with timeblock("Finished 1st POD"):
             if not self.process_1st_pod('F1', True, False):
                 return
-            backup_dir('log_tb', 'log_tb_orig')
+            backup_dir('log_tb', 'log_tb_orig', dedup=True)
             self.editres(bad=80, jump=80, nshort=600)
             if not self.basic_check(files=['ambflag']):
                 logging.error('process POD failed! no valid ambflag file')
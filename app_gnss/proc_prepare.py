@@ -16,9 +16,9 @@ class ProcPrepare(ProcGen):
 
     proj_id = 'PREPARE'
 
-    required_subdir = super().required_subdir + ['orbdif']
-    required_opt = super().required_opt + ['estimator']
-    required_file = super().required_file + ['rinexo', 'rinexn']
+    required_subdir = ProcGen.required_subdir + ['orbdif']
+    required_opt = ProcGen.required_opt + ['estimator']
+    required_file = ProcGen.required_file + ['rinexo', 'rinexn']
 
     sat_rm = ['C01', 'C02', 'C03', 'C04', 'C05', 'C59', 'C60']
 
@@ -5,7 +5,7 @@ import logging
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from funcs import gns_name, gns_sat, timeblock, merge_upd_all, merge_upd_bds, copy_result_files_to_path, \
-    backup_dir, check_res_sigma, GrtUpdlsq, GrtPpplsq, GrtAmbfix
+    backup_dir, check_res_sigma, cache_upd_files, GrtUpdlsq, GrtPpplsq, GrtAmbfix
 from app_gnss.proc_gen import ProcGen
 
 
@@ -18,9 +18,9 @@ class ProcUpd(ProcGen):
 
     proj_id = 'UPD'
 
-    required_subdir = super().required_subdir + ['enu', 'flt', 'ppp', 'ambupd', 'res']
-    required_opt = super().required_opt + ['estimator']
-    required_file = super().required_file + ['rinexo', 'rinexn', 'rinexc', 'sp3', 'biabern']
+    required_subdir = ProcGen.required_subdir + ['enu', 'flt', 'ppp', 'ambupd', 'res']
+    required_opt = ProcGen.required_opt + ['estimator']
+    required_file = ProcGen.required_file + ['rinexo', 'rinexn', 'rinexc', 'sp3', 'biabern']
 
     def process_ifcb(self):
         if self._config.freq < 3 or 'G' not in self._config.gsys:
@@ -133,7 +133,9 @@ class ProcUpd(ProcGen):
 
         upd_data = os.path.join(self._config.upd_data, self._config.orb_ac, f"{self._config.beg_time.year}")
         logging.info(f"===> Copy UPD results to {upd_data}")
-        copy_result_files_to_path(self._config, [f for f in upd_results if f != 'ifcb'], upd_data)
+        copied = copy_result_files_to_path(self._config, [f for f in upd_results if f != 'ifcb'], upd_data)
+        # parse the archived products once, plotting and evaluation then load the binary cache
+        cache_upd_files(copied)
 
     def process_daily(self):
         logging.info(f"------------------------------------------------------------------------\n{' '*36}"
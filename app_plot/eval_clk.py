@@ -1,17 +1,17 @@
 import logging
 import os
 import math
-import seaborn as sns
 import sys
 from datetime import datetime
-import pandas as pd
-import xml.etree.ElementTree as ET
 from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from funcs import GnssTime, read_clkdif_sum, gns_sat, gns_name, GnssConfig, GrtClkdif, timeblock
+from funcs import GnssTime, gns_sat, gns_name, GnssConfig, clkdif_job, clkdif_batch, timeblock
+from funcs.lazy_import import lazy_import
 from gnss_plot import draw_clkdif_std
 
+sns = lazy_import('seaborn')
+
 
 def eval_one_prod(cen, gns, overwrite=False):
     cf_file = os.path.join(os.path.dirname(__file__), f'cf_{cen}.ini')
@@ -29,13 +29,14 @@ def eval_one_prod(cen, gns, overwrite=False):
     if not os.path.isdir(wkdir):
         os.makedirs(wkdir)
     os.chdir(wkdir)
-    if not os.path.isdir('clkdif'):
-        os.makedirs('clkdif')
     if not os.path.isdir('figs'):
         os.makedirs('figs')
     beg_time = GnssTime(first_time.mjd, 0.0)
 
     cen_refs = ['gbm', 'cor']
+    # the jobs of all days, references and systems, the clock differences are computed in one pool
+    jobs = []
+    figs = []
     while beg_time < last_time:
         end_time = GnssTime(beg_time.mjd, 86400 - config.intv)
         config.beg_time = beg_time
@@ -49,27 +50,25 @@ def eval_one_prod(cen, gns, overwrite=False):
             if os.path.isfile(fig_file) and not overwrite:
                 continue
             config.orb_ac = cr
-            data = pd.DataFrame()
+            ibeg = len(jobs)
             for gs in gss:
-                file = os.path.join('clkdif', f'{beg_time.doy:0>3d}',
-                                    f'clkdif_{beg_time.year}{beg_time.doy:0>3d}_{cen}_{cr}_{gs}')
-                if not os.path.isfile(file) or overwrite:
-                    config.gsys = gs
-                    GrtClkdif(config, f'clkdif_{cen}_{cr}_{gs}').run()
-
-                f_dif_xml = os.path.join(wkdir, 'xml', f'clkdif_{cen}_{cr}_{gs}.xml')
-                ref_tree = ET.parse(f_dif_xml)
-                refsat = ref_tree.getroot().find('gen').find('refsat').text.strip()
-                data_tmp = read_clkdif_sum(file, beg_time.mjd, refsat)
-                data = data.append(data_tmp)
-
-            if not data.empty:
-                draw_clkdif_std(data, fig_file, f'{str(beg_time)}~{str(end_time)} ({cen.upper()}-{cr.upper()})')
-            else:
-                logging.warning(f'no data for {str(beg_time)}~{str(end_time)}, origin: {cen}, reference: {cr}')
+                # native clock differences, the same files and reference satellite as great_clkdif
+                config.gsys = gs
+                job = clkdif_job(config)
+                if job is not None:
+                    jobs.append(job)
+            figs.append((fig_file, f'{str(beg_time)}~{str(end_time)}', cr, range(ibeg, len(jobs))))
 
         beg_time += 86400
 
+    data = clkdif_batch(jobs)
+    for fig_file, span, cr, ijobs in figs:
+        sel = data[data['job'].isin(ijobs)].drop(columns='job') if not data.empty else data
+        if not sel.empty:
+            draw_clkdif_std(sel, fig_file, f'{span} ({cen.upper()}-{cr.upper()})')
+        else:
+            logging.warning(f'no data for {span}, origin: {cen}, reference: {cr}')
+
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)8s: %(message)s')
@@ -1,15 +1,20 @@
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
 import math
 import logging
 from datetime import datetime
-import matplotlib.dates as mdates
 from typing import List
+from funcs.lazy_import import lazy_import
 from funcs.gnss_files import read_sp3_file
 from funcs.gnss_time import GnssTime, sod2hms, mjd2ymd
 from funcs.coordinate import ell2cart, cart2ell
 from funcs.constants import gns_name, gns_sat
+from funcs.gnss_upd import read_upd
+from funcs.gnss_io import open_gnss
+
+# plotting modules are imported on first use, reading functions do not need them
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+plt = lazy_import('matplotlib.pyplot')
+mdates = lazy_import('matplotlib.dates')
 
 
 def isfloat(value):
@@ -31,7 +36,7 @@ def isint(value):
 
 
 def read_atxpcv(catx, f_atx):
-    with open(f_atx) as file_object:
+    with open_gnss(f_atx) as file_object:
         lines = file_object.readlines()
 
     isfound = False
@@ -102,7 +107,7 @@ def read_atxpcv(catx, f_atx):
 
 def read_enu(f_enu):
     try:
-        with open(f_enu) as f:
+        with open_gnss(f_enu) as f:
             lines = f.readlines()
     except FileNotFoundError:
         logging.error(f"file not found {f_enu}")
@@ -138,7 +143,7 @@ def dxyz2enu(ell: List[float], dxyz: List[float]):
 
 def read_enu_kin(f_enu, xyz: List[float]):
     try:
-        with open(f_enu) as f:
+        with open_gnss(f_enu) as f:
             lines = f.readlines()
     except FileNotFoundError:
         logging.error(f"{f_enu} not found")
@@ -171,7 +176,7 @@ def read_orbdif_old(sats_in, f_name):
     sats = []
     str_rms = ''
     try:
-        with open(f_name) as file_object:
+        with open_gnss(f_name) as file_object:
             for line in file_object:
                 if line.find('SAT') >= 0:
                     sats = line[27:].replace('\n', '').split('               ')
@@ -210,7 +215,7 @@ def read_orbdif_series(sats_in, f_name, beg_fmjd, seslen=86400):
     """read the orbdif series from panda orbdif file"""
     orbdif = {}
     try:
-        with open(f_name) as file_object:
+        with open_gnss(f_name) as file_object:
             lines = file_object.readlines()
     except FileNotFoundError:
         msg = "Error, the file " + f_name + " does not exist"
@@ -271,7 +276,7 @@ def read_orbdif_series(sats_in, f_name, beg_fmjd, seslen=86400):
 
 def read_orbdif(file):
     try:
-        with open(file) as file_object:
+        with open_gnss(file) as file_object:
             lines = file_object.readlines()
     except FileNotFoundError:
         logging.warning(f"file not found {file}")
@@ -339,7 +344,7 @@ def read_clkdif(f_name, beg_time=None, ref_sat=None):
     if ref_sat is None:
         ref_sat = ""
     try:
-        with open(f_name) as file_object:
+        with open_gnss(f_name) as file_object:
             lines = file_object.readlines()
     except FileNotFoundError:
         logging.warning(f"file not found {f_name}")
@@ -620,7 +625,7 @@ def draw_clkdif_std(data, figname, title=''):
 
 def read_orbsum(f_name, labels, year, tbeg, seslen, ymax=5):
     try:
-        with open(f_name) as file_object:
+        with open_gnss(f_name) as file_object:
             lines = file_object.readlines()
     except FileNotFoundError:
         msg = "Error, the file " + f_name + " does not exist"
@@ -679,7 +684,7 @@ def read_orbsum(f_name, labels, year, tbeg, seslen, ymax=5):
 def read_slromc(f_name, sat, tbeg, seslen):
     """read the PANDA slromcs"""
     try:
-        with open(f_name) as file_object:
+        with open_gnss(f_name) as file_object:
             lines = file_object.readlines()
     except FileNotFoundError:
         msg = "Error, the file " + f_name + " does not exist"
@@ -807,7 +812,7 @@ def read_residuals_sum(sats_in, f_name, intv=300, sites_in=[]):
         return res_all
 
     try:
-        with open(f_name) as file_object:
+        with open_gnss(f_name) as file_object:
             lines = file_object.readlines()
     except FileNotFoundError:
         msg = "Error, the file " + f_name + " does not exist"
@@ -907,7 +912,7 @@ def read_residuals_sum(sats_in, f_name, intv=300, sites_in=[]):
 
 
 def read_residuals(f_name):
-    with open(f_name) as file_object:
+    with open_gnss(f_name) as file_object:
         lines = file_object.readlines()
 
     ## read resfile header
@@ -969,7 +974,7 @@ def read_residuals(f_name):
 
 def read_ressum(f_name, labels, year, tbeg, seslen, ymax=15):
     try:
-        with open(f_name) as file_object:
+        with open_gnss(f_name) as file_object:
             lines = file_object.readlines()
     except FileNotFoundError:
         msg = "Error, the file " + f_name + " does not exist"
@@ -1017,21 +1022,15 @@ def read_daily_upd(files: dict):
     upd_first = {}
     data = []
     for mjd, file in files.items():
-        try:
-            with open(file) as f:
-                lines = f.readlines()
-        except FileNotFoundError:
-            logging.warning(f"file not found {file}")
+        upd = read_upd(file)
+        if upd is None:
             continue
 
         year, mon, day = mjd2ymd(mjd)
         cal_time = datetime(year, mon, day)
         data_tmp = {}
-        for line in lines:
-            if not line.startswith(' '):
-                continue
-            sat, val, sig, nobs, *_ = line.split()
-            data_tmp[sat] = [float(val), float(sig), int(nobs)]
+        for sat, val, sig, nobs in zip(upd.sat.tolist(), upd.val.tolist(), upd.sig.tolist(), upd.nobs.tolist()):
+            data_tmp[sat] = [val, sig, nobs]
 
         ref_val = {"G": 0, "R": 0, "E": 0, "C": 0}
         ref_sats = {
@@ -1073,31 +1072,10 @@ def read_daily_upd(files: dict):
 
 
 def read_epo_upd(file):
-    try:
-        with open(file) as f:
-            lines = f.readlines()
-    except FileNotFoundError:
-        logging.warning(f"file not found {file}")
+    upd = read_upd(file)
+    if upd is None:
         return pd.DataFrame()
-
-    cal_time = datetime(1970, 1, 1)
-    data = []
-    for line in lines:
-        if not line.startswith(' '):
-            continue
-        if line.startswith(' EPOCH-TIME'):
-            mjd, sod = line[12:].split()
-            year, mon, day = mjd2ymd(int(mjd))
-            hh, mm, ss = sod2hms(sod)
-            cal_time = datetime(year, mon, day, hh, mm, ss)
-        elif len(line) >= 37:
-            sat, val, sig, nobs, *_ = line.split()
-            data.append({
-                'date': cal_time, 'sat': sat, 'upd': float(val), 'sig': float(sig),
-                'nobs': int(nobs), 'sys': gns_name(sat[0])
-            })
-
-    return pd.DataFrame(data)
+    return upd.to_frame()
 
 
 def draw_upd(data, figfile="", figtitle="", grid=True, dform="%H:%M", linestyle='.', dpi=300):
@@ -1157,7 +1135,7 @@ def read_nl_res(f_name):
     """"read the residuals, sigmas and alphas of each NL ambiguity"""
     nl_amb = []
     try:
-        with open(f_name) as file_object:
+        with open_gnss(f_name) as file_object:
             for line in file_object:
                 info = line.split()
                 if float(info[2]) > 5:
@@ -9,15 +9,17 @@ from datetime import datetime
 import argparse
 import xml.etree.ElementTree as ET
 from concurrent.futures import ThreadPoolExecutor
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
-import matplotlib.dates as mdates
-import matplotlib as mpl
-import seaborn as sns
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from funcs import GnssTime, sod2hms, gns_sat, gns_name, gns_id, GnssConfig, GrtClkdif, GrtOrbdif, GrtSp3orb, timeblock
-from gnss_plot import draw_orbdif, draw_orbdif_series, read_clkdif, read_orbdif
+from funcs import GnssTime, sod2hms, gns_sat, gns_name, gns_id, GnssConfig, ClockDiff, OrbitDiff, timeblock
+from funcs.lazy_import import lazy_import
+from gnss_plot import draw_orbdif, draw_orbdif_series
+
+pd = lazy_import('pandas')
+plt = lazy_import('matplotlib.pyplot')
+np = lazy_import('numpy')
+mdates = lazy_import('matplotlib.dates')
+mpl = lazy_import('matplotlib')
+sns = lazy_import('seaborn')
 
 
 def read_time_info(file):
@@ -325,25 +327,17 @@ def monitor_clkdif(cen, gns: str):
         if "C" in gns:
             gns_dif.extend(["C2", "C3"])
         for gs in gns_dif:
-            file = os.path.join('clkdif', f'clkdif_{crt_time.year}{crt_time.doy:0>3d}_{cen}_{gs}')
-            if crt_time.mjd == t_beg.mjd or crt_time.mjd == dend_time.mjd or not os.path.isfile(file):
-                config.gsys = gs[0]
-                if gs == "C2":
-                    config.sat_rm += gns_sat("C3")
-                elif gs == "C3":
-                    config.sat_rm += gns_sat("C2")
-                GrtClkdif(config, f'clkdif_{cen}_{gs}').run()
-                config.sat_rm = sat_rm
-            
-            if not os.path.isfile(file):
-                continue
-            f_dif_xml = os.path.join(wkdir, 'xml', f'clkdif_{cen}_{gs}.xml')
-            ref_tree = ET.parse(f_dif_xml)
-            refsat = ref_tree.getroot().find('gen').find('refsat').text.strip()
-            data_tmp = read_clkdif(file, crt_time, refsat)
+            # native clock differences, the same files and reference satellite as great_clkdif
+            config.gsys = gs[0]
+            if gs == "C2":
+                config.sat_rm += gns_sat("C3")
+            elif gs == "C3":
+                config.sat_rm += gns_sat("C2")
+            data_tmp = ClockDiff.from_config(config).to_frame(crt_time)
+            config.sat_rm = sat_rm
             if not data_tmp.empty and len(data_tmp) > 1000 and len(set(data_tmp.sat)) > 4:
                 data = data.append(data_tmp)
-        
+
         if not data.empty:
             draw_clkdif(data, figfile1, f'{str(crt_time)}~{str(end_time)} ({cen.upper()})')
             data0, data1 = get_clkdif_statistic(data, crt_time.datetime(), end_time.datetime())
@@ -375,7 +369,11 @@ def monitor_clkdif(cen, gns: str):
     #     crt_time += 86400
 
 
-def monitor_orbdif(cen, gns: str):
+# excsat of GrtOrbdif, used by great_orbdif before the native comparison
+ORBDIF_EXCSAT = "C01 C02 C03 C04 C05 G04 G14 G18 G23".split()
+
+
+def monitor_orbdif(cen, gns: str, excsat=None, trans='NONE'):
     f_pce_xml = os.path.join('xml', 'pcelsq.xml')
     ref_tree = ET.parse(f_pce_xml)
     beg = ref_tree.getroot().find('gen').find('beg')
@@ -392,9 +390,6 @@ def monitor_orbdif(cen, gns: str):
     config.orb_ac = cen
     config.intv = intv
     
-    if not os.path.isdir('orbdif'):
-        os.makedirs('orbdif')
-
     crt_time = GnssTime(t_beg.mjd, 0)
     while crt_time < dend_time:
         end_time = GnssTime(crt_time.mjd, 86400 - intv)
@@ -417,17 +412,8 @@ def monitor_orbdif(cen, gns: str):
             crt_time += 86400
             continue
 
-        f_dif = os.path.join('orbdif', f'orbdif_{crt_time.year}{crt_time.doy:0>3d}_{cen}')
-        if not os.path.isfile(f_dif):
-            f_orb = f'orb_{crt_time.year}{crt_time.doy:0>3d}_{cen}'
-            if not os.path.isfile(f_orb):
-                GrtSp3orb(config, f'sp3orb_{cen}').run()
-            if not os.path.isfile(f_orb):
-                crt_time += 86400
-                continue
-            GrtOrbdif(config, f'orbdif_{cen}', trans='NONE').run()
-
-        data = read_orbdif(f_dif)
+        # native orbit differences, no orb files are staged for great_orbdif
+        data = OrbitDiff.from_config(config, ORBDIF_EXCSAT if excsat is None else excsat, trans).to_frame()
         if not data.empty:
             sats = list(set(data['sat']))
             setgns = set([s[0] for s in sats])
@@ -0,0 +1,86 @@
+import os
+import sys
+import argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from funcs import read_records
+
+
+def stage_key(rec, by='stage'):
+    """ GREAT commands by binary, other stages by label without the day, e.g. Finished process <day> """
+    if by == 'stage' and rec.get('stage'):
+        return rec['stage']
+    label = rec['label']
+    if rec.get('day'):
+        label = label.replace(rec['day'], '<day>')
+    return label
+
+
+def summarize(recs, by='stage'):
+    """ {stage: {num, wall, wall_mean, wall_max, cpu, maxrss, read, write}} """
+    stats = {}
+    for rec in recs:
+        st = stats.setdefault(stage_key(rec, by), {'num': 0, 'wall': 0.0, 'wall_max': 0.0, 'cpu': 0.0,
+                                                  'maxrss': 0, 'read': 0, 'write': 0})
+        st['num'] += 1
+        st['wall'] += rec['wall']
+        st['wall_max'] = max(st['wall_max'], rec['wall'])
+        st['cpu'] += rec['cpu'] + rec['cpu_children']
+        st['maxrss'] = max(st['maxrss'], rec['maxrss'] or 0)
+        st['read'] += rec['read_bytes']
+        st['write'] += rec['write_bytes']
+    for st in stats.values():
+        st['wall_mean'] = st['wall'] / st['num']
+    return stats
+
+
+def print_slowest(stats, top=20):
+    print(f"{'stage':40s} {'num':>5s} {'total[s]':>10s} {'mean[s]':>9s} {'max[s]':>9s} {'cpu/wall':>8s} "
+          f"{'rss[MB]':>8s} {'read[MB]':>9s} {'write[MB]':>9s}")
+    for key, st in sorted(stats.items(), key=lambda x: -x[1]['wall'])[0:top]:
+        print(f"{key[0:40]:40s} {st['num']:5d} {st['wall']:10.1f} {st['wall_mean']:9.2f} {st['wall_max']:9.2f} "
+              f"{st['cpu'] / max(st['wall'], 1e-6):8.2f} {st['maxrss'] / 1e6:8.0f} {st['read'] / 1e6:9.1f} "
+              f"{st['write'] / 1e6:9.1f}")
+
+
+def print_regressions(recs, base, run, by='stage', threshold=1.2):
+    """ stages of run whose mean wall time is threshold times of the base run or more """
+    old = summarize([r for r in recs if r['run'] == base], by)
+    new = summarize([r for r in recs if r['run'] == run], by)
+    print(f"\nregressions of {run} against {base} (>= {threshold:.2f}x)")
+    rows = []
+    for key, st in new.items():
+        if key in old and old[key]['wall_mean'] > 0:
+            ratio = st['wall_mean'] / old[key]['wall_mean']
+            if ratio >= threshold:
+                rows.append((ratio, key, old[key]['wall_mean'], st['wall_mean']))
+    if not rows:
+        print('none')
+    for ratio, key, t1, t2 in sorted(rows, reverse=True):
+        print(f"{key[0:40]:40s} {t1:9.2f} s => {t2:9.2f} s  {ratio:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Slowest stages and regressions from the telemetry records')
+    parser.add_argument('sink', help='telemetry file, *.jsonl or *.db')
+    parser.add_argument('-by', dest='by', default='stage', choices=['stage', 'label'], help='group records by')
+    parser.add_argument('-top', dest='top', type=int, default=20, help='number of the slowest stages')
+    parser.add_argument('-base', dest='base', help='base run for regressions (default the second last run)')
+    parser.add_argument('-run', dest='run', help='run compared to base (default the last run)')
+    parser.add_argument('-thres', dest='threshold', type=float, default=1.2, help='ratio of a regression')
+    args = parser.parse_args()
+
+    recs = read_records(args.sink)
+    if not recs:
+        print(f"no telemetry records in {args.sink}")
+        return
+    runs = sorted({r['run'] for r in recs}, key=lambda x: min(r['time'] for r in recs if r['run'] == x))
+    print(f"{len(recs)} records of {len(runs)} runs, {runs[0]} ... {runs[-1]}\n")
+    print_slowest(summarize(recs, args.by), args.top)
+    run = args.run or runs[-1]
+    base = args.base or (runs[-2] if len(runs) > 1 else None)
+    if base:
+        print_regressions(recs, base, run, args.by, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
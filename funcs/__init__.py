@@ -1,6 +1,67 @@
-from .grt_cmd import *
-from .constants import *
-from .gnss_config import *
-from .gnss_time import *
-from .gnss_files import *
-from .gnss_tools import *
+"""
+GNSS processing functions, the sub-modules are imported on first use (PEP 562)
+e.g. "from funcs import GrtPpplsq" imports grt_cmd and its dependencies only
+"""
+from importlib import import_module
+
+# public names of each sub-module, must be the same as __all__ of the sub-module
+_SUBMODULES = {
+    'grt_cmd': ['GrtCmd', 'GrtTurboedit', 'GrtClockRepair', 'GrtPreedit', 'GrtOi', 'GrtSp3orb', 'GrtOrbsp3',
+                'GrtOrbfit', 'GrtOrbdif', 'GrtOrbfitLeo', 'GrtClkdif', 'GrtEditres', 'GrtConvobs', 'GrtUpdlsq',
+                'GrtAmbfix', 'GrtAmbfixD', 'GrtAmbfixDd', 'GrtPodlsq', 'GrtPodleo', 'GrtPcelsq', 'GrtPpplsq'],
+    'constants': ['gns_id', 'gns_name', 'gns_sat', 'is_gns_sat', 'gns_band', 'gns_sig', 'LeoSat', 'leo_sat',
+                  'leo_names', 'site_namelong', 'MAX_THREAD'],
+    'gnss_config': ['GnssConfig', 'ReceiverRegistry'],
+    'gnss_time': ['doy2mjd', 'doy2ymd', 'ymd2doy', 'ymd2mjd', 'ymd2gpsweek', 'mjd2ydoy', 'mjd2ymd', 'sod2hms',
+                  'hms2sod', 'GnssTime'],
+    'gnss_files': ['read_site_list', 'read_sp3_file', 'read_rnxc_file', 'read_rnxo_file', 'read_res_file',
+                   'read_clkdif_sum', 'read_time_info_new', 'sum_clkdif', 'read_orbdif_sum', 'read_orbdif_file',
+                   'sum_orbdif', 'rms_val', 'isfloat', 'isint', 'check_ambflag', 'switch_ambflag',
+                   'conv_ambflag_all', 'conv_ambflag_panda2great', 'clean_ambflag', 'check_rnxo_ant',
+                   'check_att_file', 'alter_file', 'alter_file_content'],
+    'gnss_tools': ['timethis', 'timeblock', 'split_receivers', 'pretty_xml', 'format_xml', 'write_xml',
+                   'write_xml_files', 'check_pod_sigma',
+                   'check_pod_residuals', 'check_pod_residuals_new', 'good_tb_site', 'check_turboedit_log',
+                   'check_brd_orbfit', 'edit_ics', 'check_ics', 'check_res_sigma', 'backup_dir', 'copy_dir',
+                   'backup_files', 'recover_files', 'get_rnxc_satlist', 'copy_ambflag_from', 'copy_result_files',
+                   'copy_result_files_to_path', 'get_grg_wsb', 'merge_upd_bds', 'merge_upd_all',
+                   'iter_upd_epochs', 'merge_epo_upd', 'merge_upd', 'get_crd_snx', 'get_crd_res',
+                   'xml_receiver_snx', 'mkdir'],
+    'gnss_visibility': ['iter_sp3_epochs', 'grid_visibility', 'site_visibility'],
+    'gnss_ambflag': ['AmbflagFile', 'IntervalIndex', 'clean_ambflag_file', 'switch_ambflag_file',
+                     'clean_ambflag_all', 'switch_ambflag_all', 'conv_ambflag_file', 'conv_ambflag_files'],
+    'gnss_upd': ['UpdProduct', 'read_upd', 'cache_upd_files', 'read_clk_wsb'],
+    'gnss_clock': ['ClockProduct', 'DUP_RULES', 'read_clock', 'read_clock_header', 'header_prns', 'cache_clock_files'],
+    'gnss_clkdif': ['ClockDiff', 'REF_SATS', 'clkdif_job', 'clkdif_batch'],
+    'gnss_orbit': ['OrbitProduct', 'OrbitDiff', 'read_orbit', 'fit_helmert'],
+    'gnss_product': ['load_product', 'config_product', 'product_kind'],
+    'gnss_retention': ['RetentionPolicy', 'compress_zstd', 'wait_retention'],
+    'gnss_index': ['FileIndex', 'coverage_report'],
+    'gnss_archive': ['DedupStore', 'DEDUP_STORE', 'file_hash', 'snapshot_file', 'snapshot_files', 'sync_dir'],
+    'gnss_io': ['open_gnss', 'compression', 'decompress_file', 'find_source', 'stage_files',
+                'stat_cache', 'invalidate_stat', 'cached_isfile', 'cached_getsize',
+                'set_product_cache', 'product_cache_file', 'save_product_cache', 'ProductMemo'],
+    'gnss_cache': ['StaticCache', 'STATIC_FILES'],
+    'gnss_runcache': ['RunCache'],
+    'gnss_telemetry': ['RUN_ID', 'set_telemetry', 'set_context', 'Probe', 'write_record', 'read_records'],
+    'gnss_resource': ['ResourceBudget', 'RESOURCE_DIR', 'available_cores', 'available_memory',
+                      'children_maxrss'],
+}
+_NAMES = {name: mod for mod, names in _SUBMODULES.items() for name in names}
+
+__all__ = list(_NAMES)
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return import_module(f'.{name}', __name__)
+    mod = _NAMES.get(name)
+    if mod is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f'.{mod}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_NAMES) | set(_SUBMODULES))
@@ -1,5 +1,6 @@
 from multiprocessing import cpu_count
-import pandas as pd
+from functools import lru_cache
+from collections import namedtuple
 
 MAX_THREAD = min(8, cpu_count())
 
@@ -62,77 +63,41 @@ def gns_sig(gsys: str) -> dict:
     return _GNS_SIG[gsys]
 
 
+def _sat_range(prefix, beg, end, exc=()):
+    return tuple(sorted(f"{prefix}{i:0>2d}" for i in range(beg, end + 1) if f"{prefix}{i:0>2d}" not in exc))
+
+
+# satellites of each system, precomputed once
+_GNS_SAT = {
+    'GPS': _sat_range('G', 1, 32),  # G04 is now available
+    'BDS': tuple(s for s in _sat_range('C', 1, 61, ['C15', 'C17', 'C18', 'C31', 'C61']) if not 47 <= int(s[1:]) <= 58),
+    'BD2': _sat_range('C', 1, 16, ['C15']),
+    'BD3': tuple(s for s in _sat_range('C', 19, 61, ['C31', 'C61']) if not 47 <= int(s[1:]) <= 58),
+    'BDG': ('C01', 'C02', 'C03', 'C04', 'C05', 'C59', 'C60'),
+    'BDI': ('C06', 'C07', 'C08', 'C09', 'C10', 'C13', 'C16', 'C38', 'C39', 'C40'),
+    'BDM': _sat_range('C', 11, 46, ['C13', 'C16', 'C38', 'C39', 'C40']),
+    'GAL': _sat_range('E', 1, 36, ['E20', 'E22', 'E06', 'E10', 'E16', 'E17', 'E23', 'E28', 'E29', 'E32', 'E34', 'E35']),
+    'GLO': _sat_range('R', 1, 24),
+    'QZS': _sat_range('J', 1, 7)
+}
+_GNS_SATSET = {k: frozenset(v) for k, v in _GNS_SAT.items()}
+
+
+@lru_cache(maxsize=None)
+def _gns_sat(gsys: str, sats_rm: frozenset) -> tuple:
+    sats = _GNS_SAT.get(gsys, ())
+    if not sats_rm or sats_rm.isdisjoint(sats):
+        return sats
+    return tuple(s for s in sats if s not in sats_rm)
+
+
 def gns_sat(gsys, sats_rm=None) -> list:
-    if sats_rm is None:
-        sats_rm = []
-    gsys = gns_name(gsys)
-    if gsys == 'GPS':
-        _GPS_SAT = [f"G{i:0>2d}" for i in range(1, 33)]
-        _GPS_SAT_EXC = []  # G04 is now available
-        _GPS_SAT_EXC.extend(sats_rm)
-        _GPS_SAT = list(set(_GPS_SAT).difference(set(_GPS_SAT_EXC)))
-        _GPS_SAT.sort()
-        return _GPS_SAT
-    elif gsys == 'BDS':
-        _BDS_SAT = [f"C{i:0>2d}" for i in range(1, 62) if i < 47 or i > 58]
-        _BDS_SAT_EXC = ['C15', 'C17', 'C18', 'C31', 'C61']
-        _BDS_SAT_EXC.extend(sats_rm)
-        _BDS_SAT = list(set(_BDS_SAT).difference(set(_BDS_SAT_EXC)))
-        _BDS_SAT.sort()
-        return _BDS_SAT
-    elif gsys == 'BD2':
-        _BDS_SAT = [f"C{i:0>2d}" for i in range(1, 17)]
-        _BDS_SAT_EXC = ['C15']
-        _BDS_SAT_EXC.extend(sats_rm)
-        _BDS_SAT = list(set(_BDS_SAT).difference(set(_BDS_SAT_EXC)))
-        _BDS_SAT.sort()
-        return _BDS_SAT
-    elif gsys == 'BD3':
-        _BDS_SAT = [f"C{i:0>2d}" for i in range(19, 62) if i < 47 or i > 58]
-        _BDS_SAT_EXC = ['C31', 'C61']
-        _BDS_SAT_EXC.extend(sats_rm)
-        _BDS_SAT = list(set(_BDS_SAT).difference(set(_BDS_SAT_EXC)))
-        _BDS_SAT.sort()
-        return _BDS_SAT
-    elif gsys == 'BDG':
-        _BDS_SAT = ['C01', 'C02', 'C03', 'C04', 'C05', 'C59', 'C60']
-        _BDS_SAT = list(set(_BDS_SAT).difference(set(sats_rm)))
-        _BDS_SAT.sort()
-        return _BDS_SAT
-    elif gsys == 'BDI':
-        _BDS_SAT = ['C06', 'C07', 'C08', 'C09', 'C10', 'C13', 'C16', 'C38', 'C39', 'C40']
-        _BDS_SAT = list(set(_BDS_SAT).difference(set(sats_rm)))
-        _BDS_SAT.sort()
-        return _BDS_SAT
-    elif gsys == 'BDM':
-        _BDS_SAT = [f"C{i:0>2d}" for i in range(11, 47)]
-        _BDS_SAT_EXC = ['C13', 'C16', 'C38', 'C39', 'C40']
-        _BDS_SAT_EXC.extend(sats_rm)
-        _BDS_SAT = list(set(_BDS_SAT).difference(set(_BDS_SAT_EXC)))
-        _BDS_SAT.sort()
-        return _BDS_SAT
-    elif gsys == 'GAL':
-        _GAL_SAT = [f"E{i:0>2d}" for i in range(1, 37)]
-        _GAL_SAT_EXC = ['E20', 'E22', 'E06', 'E10', 'E16', 'E17', 'E23', 'E28', 'E29', 'E32', 'E34', 'E35']
-        _GAL_SAT_EXC.extend(sats_rm)
-        _GAL_SAT = list(set(_GAL_SAT).difference(set(_GAL_SAT_EXC)))
-        _GAL_SAT.sort()
-        return _GAL_SAT
-    elif gsys == 'GLO':
-        _GLO_SAT = [f"R{i:0>2d}" for i in range(1, 25)]
-        _GLO_SAT_EXC = []
-        _GLO_SAT_EXC.extend(sats_rm)
-        _GLO_SAT = list(set(_GLO_SAT).difference(set(_GLO_SAT_EXC)))
-        _GLO_SAT.sort()
-        return _GLO_SAT
-    elif gsys == 'QZS':
-        _QZS_SAT = [f"J{i:0>2d}" for i in range(1, 8)]
-        _QZS_SAT_EXC = []
-        _QZS_SAT_EXC.extend(sats_rm)
-        _QZS_SAT = list(set(_QZS_SAT).difference(set(_QZS_SAT_EXC)))
-        _QZS_SAT.sort()
-        return _QZS_SAT
-    return []
+    return list(_gns_sat(gns_name(gsys), frozenset(sats_rm) if sats_rm else frozenset()))
+
+
+def is_gns_sat(sat: str, gsys: str) -> bool:
+    """ if the satellite belongs to the system (GPS, BD3, ...) """
+    return sat in _GNS_SATSET.get(gns_name(gsys), ())
 
 
 def get_gns_info(gsys, sat_rm=None, band=None):
@@ -154,32 +119,53 @@ def get_gns_info(gsys, sat_rm=None, band=None):
     return info
 
 
-leo_df = pd.DataFrame(
-    [
-        ['grace-a',     'graa',     'gracea', 'GRAALEOANNTE'],
-        ['grace-b',     'grab',     'graceb', 'GRABLEOANNTE'],
-        ['grace-c',     'grac',   'gracefo1', 'GRACLEOANNTE'],
-        ['grace-d',     'grad',   'gracefo2', 'GRADLEOANNTE'],
-        ['jason-2',     'jas2',     'jason2', 'JA2_PA'],
-        ['jason-3',     'jas3',     'jason3', 'JA3_PA'],
-        ['kompsat5',    'koms',   'kompsat5', 'KOMPSAT5_ANT'],
-        ['metop-a',     'meta',     'metopa', 'METOP-A_PA'],
-        ['metop-b',     'metb',     'metopb', 'METOP-B_PA'],
-        ['metop-c',     'metc',     'metopc', 'METOP-C_PA'],
-        ['pazsat',      'pazs',     'pazsat', 'PAZ_ANT'],
-        ['sentinel-1a', 'se1a', 'sentinel1a', 'SEN-1A-GPSA'],
-        ['sentinel-1b', 'se1b', 'sentinel1b', 'SEN-1B-GPSA'],
-        ['sentinel-2a', 'se2a', 'sentinel2a', 'SEN-2A-GPSA'],
-        ['sentinel-2b', 'se2b', 'sentinel2b', 'SEN-2B-GPSA'],
-        ['sentinel-3a', 'se3a', 'sentinel3a', 'SEN-3A-GPSA'],
-        ['sentinel-3b', 'se3b', 'sentinel3b', 'SEN-3B-GPSA'],
-        ['swarm-a',     'swaa',     'swarma', 'SWARM-A_ANT'],
-        ['swarm-b',     'swab',     'swarmb', 'SWARM-B_ANT'],
-        ['swarm-c',     'swac',     'swarmc', 'SWARM-C_ANT'],
-        ['tandem-x',    'tadx',    'tandemx', 'TDX_ANT'],
-        ['terrasar-x',  'tesx',  'terrasarx', 'TSX_POD0']
-    ], columns=['svn', 'name', 'slr', 'ant']
-)
+LeoSat = namedtuple('LeoSat', ['svn', 'name', 'slr', 'ant'])
+
+_LEO_SATS = tuple(LeoSat(*x) for x in [
+    ['grace-a',     'graa',     'gracea', 'GRAALEOANNTE'],
+    ['grace-b',     'grab',     'graceb', 'GRABLEOANNTE'],
+    ['grace-c',     'grac',   'gracefo1', 'GRACLEOANNTE'],
+    ['grace-d',     'grad',   'gracefo2', 'GRADLEOANNTE'],
+    ['jason-2',     'jas2',     'jason2', 'JA2_PA'],
+    ['jason-3',     'jas3',     'jason3', 'JA3_PA'],
+    ['kompsat5',    'koms',   'kompsat5', 'KOMPSAT5_ANT'],
+    ['metop-a',     'meta',     'metopa', 'METOP-A_PA'],
+    ['metop-b',     'metb',     'metopb', 'METOP-B_PA'],
+    ['metop-c',     'metc',     'metopc', 'METOP-C_PA'],
+    ['pazsat',      'pazs',     'pazsat', 'PAZ_ANT'],
+    ['sentinel-1a', 'se1a', 'sentinel1a', 'SEN-1A-GPSA'],
+    ['sentinel-1b', 'se1b', 'sentinel1b', 'SEN-1B-GPSA'],
+    ['sentinel-2a', 'se2a', 'sentinel2a', 'SEN-2A-GPSA'],
+    ['sentinel-2b', 'se2b', 'sentinel2b', 'SEN-2B-GPSA'],
+    ['sentinel-3a', 'se3a', 'sentinel3a', 'SEN-3A-GPSA'],
+    ['sentinel-3b', 'se3b', 'sentinel3b', 'SEN-3B-GPSA'],
+    ['swarm-a',     'swaa',     'swarma', 'SWARM-A_ANT'],
+    ['swarm-b',     'swab',     'swarmb', 'SWARM-B_ANT'],
+    ['swarm-c',     'swac',     'swarmc', 'SWARM-C_ANT'],
+    ['tandem-x',    'tadx',    'tandemx', 'TDX_ANT'],
+    ['terrasar-x',  'tesx',  'terrasarx', 'TSX_POD0']
+])
+_LEO_INDEX = {f: {getattr(x, f): x for x in _LEO_SATS} for f in LeoSat._fields}
+
+
+def leo_sat(key: str, field='name'):
+    """ LEO information (svn, name, slr, ant) by its name (4-char), svn, slr or ant, None if unknown """
+    return _LEO_INDEX[field].get(key)
+
+
+def leo_names() -> tuple:
+    return tuple(_LEO_INDEX['name'].keys())
+
+
+def __getattr__(name):
+    # leo_df is created on first access, pandas is not needed to import this module
+    if name == 'leo_df':
+        import pandas as pd
+        df = pd.DataFrame(_LEO_SATS, columns=list(LeoSat._fields))
+        globals()['leo_df'] = df
+        return df
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 site_namelong = {
     'abmf': 'ABMF00GLP', 'abpo': 'ABPO00MDG', 'acrg': 'ACRG00GHA', 'adis': 'ADIS00ETH', 'aggo': 'AGGO00ARG',
@@ -288,4 +274,5 @@ site_namelong = {
     'norf': 'NORF00AUS', 'nrmg': 'NRMG00NCL', 'pthl': 'PTHL00AUS'
 }
 
-__all__ = ['gns_id', 'gns_name', 'gns_sat', 'gns_band', 'gns_sig', 'leo_df', 'site_namelong', 'MAX_THREAD']
+__all__ = ['gns_id', 'gns_name', 'gns_sat', 'is_gns_sat', 'gns_band', 'gns_sig', 'LeoSat', 'leo_sat', 'leo_names',
+           'site_namelong', 'MAX_THREAD']
@@ -1,6 +1,7 @@
 # ===========================================================
 # ========================= imports =========================
-import numpy as _np
+from .lazy_import import lazy_import
+_np = lazy_import('numpy')
 # ===========================================================
 __all__ = ["ell2cart", "cart2ell","ell2topo"]
 
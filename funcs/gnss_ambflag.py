@@ -0,0 +1,204 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from .constants import MAX_THREAD
+from .gnss_io import open_gnss
+from .lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+_AMB_FLAGS = ('IAM', 'AMB', 'DEL', 'BAD')
+
+
+class AmbflagFile:
+    """
+    Purpose: ambflag (log_tb) file held as arrays
+             record: "{flag} {sat}{iepo:>7d}{jepo:>7d}{rest}"
+    """
+    __slots__ = ['header', 'flag', 'sat', 'iepo', 'jepo', 'rest']
+
+    def __init__(self, header=None, flag=None, sat=None, iepo=None, jepo=None, rest=None):
+        self.header = header if header is not None else []
+        self.flag = flag if flag is not None else np.array([], dtype='U3')
+        self.sat = sat if sat is not None else np.array([], dtype='U3')
+        self.iepo = iepo if iepo is not None else np.array([], dtype=np.int64)
+        self.jepo = jepo if jepo is not None else np.array([], dtype=np.int64)
+        self.rest = rest if rest is not None else np.array([], dtype='U1')
+
+    def __len__(self):
+        return len(self.flag)
+
+    @classmethod
+    def from_lines(cls, lines):
+        header = [line for line in lines if line[0:1] == '%']
+        recs = [line for line in lines if line[0:3] in _AMB_FLAGS]
+        return cls(header,
+                   np.array([line[0:3] for line in recs], dtype='U3'),
+                   np.array([line[4:7] for line in recs], dtype='U3'),
+                   np.array([int(line[7:14]) for line in recs], dtype=np.int64),
+                   np.array([int(line[14:21]) for line in recs], dtype=np.int64),
+                   np.array([line[21:] for line in recs], dtype=str))
+
+    @classmethod
+    def read(cls, f_name):
+        """ read an ambflag file, return None if not found """
+        try:
+            with open_gnss(f_name) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            logging.warning(f"file not found {f_name}")
+            return
+        return cls.from_lines(lines)
+
+    def sort(self):
+        """ sort records by satellite and start epoch """
+        idx = np.lexsort((self.iepo, self.sat))
+        self.flag, self.sat, self.iepo = self.flag[idx], self.sat[idx], self.iepo[idx]
+        self.jepo, self.rest = self.jepo[idx], self.rest[idx]
+        return self
+
+    def format_records(self):
+        """ vectorized formatting of all records """
+        if len(self) == 0:
+            return np.array([], dtype=str)
+        lines = np.char.add(np.char.add(self.flag, ' '), self.sat)
+        lines = np.char.add(lines, np.char.rjust(self.iepo.astype(str), 7))
+        lines = np.char.add(lines, np.char.rjust(self.jepo.astype(str), 7))
+        return np.char.add(lines, self.rest)
+
+    def write(self, f_name):
+        """ write the header and records in one buffered pass """
+        with open(f_name, 'w') as f:
+            f.write(''.join(self.header) + ''.join(self.format_records().tolist()))
+
+    def switch(self, old='AMB', new='IAM'):
+        """ change the flag of records, return the number of changed records """
+        sel = self.flag == old.strip()
+        self.flag = np.where(sel, new.strip(), self.flag).astype('U3')
+        return int(sel.sum())
+
+
+class IntervalIndex:
+    """
+    Purpose: sorted per-satellite interval index for vectorized queries
+             contains(): any interval [a, b] with a > lo and b < hi
+             overlaps(): any interval [a, b] with a <= hi and b >= lo
+    """
+
+    def __init__(self, sat, beg, end):
+        sat = np.asarray(sat).astype(str)
+        beg = np.asarray(beg, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        self._index = {}
+        for s in np.unique(sat):
+            ss = sat == s
+            idx = np.argsort(beg[ss], kind='stable')
+            a, b = beg[ss][idx], end[ss][idx]
+            # suffix minimum of the ends for containment, prefix maximum for overlap
+            self._index[s] = (a, np.minimum.accumulate(b[::-1])[::-1], np.maximum.accumulate(b))
+
+    @classmethod
+    def from_frame(cls, data, scale=1):
+        """ build from a DataFrame with columns sat, iepo, jepo """
+        return cls(data.sat.values, data.iepo.values * scale, data.jepo.values * scale)
+
+    def contains(self, sat, lo, hi):
+        sat = np.asarray(sat).astype(str)
+        lo = np.asarray(lo, dtype=np.int64)
+        hi = np.asarray(hi, dtype=np.int64)
+        found = np.zeros(len(sat), dtype=bool)
+        for s, (a, bmin, _) in self._index.items():
+            ss = np.flatnonzero(sat == s)
+            if len(ss) == 0:
+                continue
+            pos = np.searchsorted(a, lo[ss], side='right')
+            ok = pos < len(a)
+            found[ss[ok]] = bmin[pos[ok]] < hi[ss[ok]]
+        return found
+
+    def overlaps(self, sat, lo, hi):
+        sat = np.asarray(sat).astype(str)
+        lo = np.asarray(lo, dtype=np.int64)
+        hi = np.asarray(hi, dtype=np.int64)
+        found = np.zeros(len(sat), dtype=bool)
+        for s, (a, _, bmax) in self._index.items():
+            ss = np.flatnonzero(sat == s)
+            if len(ss) == 0:
+                continue
+            pos = np.searchsorted(a, hi[ss], side='right') - 1
+            ok = pos >= 0
+            found[ss[ok]] = bmax[pos[ok]] >= lo[ss[ok]]
+        return found
+
+
+def _backup(f_name):
+    if not os.path.isfile(f"{f_name}.bak"):
+        os.rename(f_name, f"{f_name}.bak")
+
+
+def clean_ambflag_file(f_name, index: IntervalIndex):
+    """ IAM => AMB if an interval of index is inside the IAM arc """
+    amb = AmbflagFile.read(f_name)
+    if amb is None:
+        return
+    sel = np.flatnonzero(amb.flag == 'IAM')
+    if len(sel) > 0:
+        found = index.contains(amb.sat[sel], amb.iepo[sel] - 9, amb.jepo[sel] + 10)
+        amb.flag[sel[found]] = 'AMB'
+    _backup(f_name)
+    amb.write(f_name)
+    return len(sel)
+
+
+def switch_ambflag_file(f_name, old='AMB', new='IAM'):
+    amb = AmbflagFile.read(f_name)
+    if amb is None:
+        return
+    num = amb.switch(old, new)
+    if num > 0:
+        amb.write(f_name)
+    return num
+
+
+def conv_ambflag_file(f_name, f_new):
+    """ PANDA ambflag => GREAT ambflag, return True if converted """
+    amb = AmbflagFile.read(f_name)
+    if amb is None:
+        return False
+    amb.sort().write(f_new)
+    return True
+
+
+def _run_parallel(func, args, nthread):
+    if not args:
+        return []
+    nthread = max(1, min(nthread, len(args)))
+    if nthread == 1:
+        return [func(*a) for a in args]
+    with ProcessPoolExecutor(nthread) as pool:
+        return list(pool.map(func, *zip(*args)))
+
+
+def clean_ambflag_all(files: dict, nthread=MAX_THREAD):
+    """
+    Purpose: clean ambflag files of all sites in parallel
+    Inputs : files      {f_name: DataFrame(sat, iepo, jepo)}, epochs of the DataFrame are in 10 s
+    """
+    args = [(f, IntervalIndex.from_frame(data, 10)) for f, data in files.items()]
+    res = _run_parallel(clean_ambflag_file, args, nthread)
+    return sum(n for n in res if n)
+
+
+def switch_ambflag_all(files: list, old='AMB', new='IAM', nthread=MAX_THREAD):
+    """ switch flags of all ambflag files in parallel, return the number of changed records """
+    res = _run_parallel(switch_ambflag_file, [(f, old, new) for f in files], nthread)
+    return sum(n for n in res if n)
+
+
+def conv_ambflag_files(pairs: list, nthread=MAX_THREAD):
+    """ convert [(f_name, f_new), ...] in parallel, return the number of converted files """
+    return sum(_run_parallel(conv_ambflag_file, pairs, nthread))
+
+
+__all__ = ['AmbflagFile', 'IntervalIndex', 'clean_ambflag_file', 'switch_ambflag_file',
+           'clean_ambflag_all', 'switch_ambflag_all', 'conv_ambflag_file', 'conv_ambflag_files']
@@ -0,0 +1,291 @@
+import os
+import shutil
+import hashlib
+import logging
+import threading
+import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from .constants import MAX_THREAD
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# ioctl request of Linux FICLONE, clone the extents of a file (copy-on-write)
+_FICLONE = 0x40049409
+# default location (relative to the work directory) of the content-addressed store
+DEDUP_STORE = '.snapshot_store'
+_BUF_SIZE = 1024 * 1024
+
+
+# devices on which reflink failed, not tried again
+_no_reflink = set()
+
+
+def _reflink(src, dst):
+    """ copy-on-write clone of src to dst, False if not supported by the file system """
+    if fcntl is None:
+        return False
+    dev = os.stat(os.path.dirname(os.path.abspath(dst))).st_dev
+    if dev in _no_reflink:
+        return False
+    try:
+        with open(src, 'rb') as fs, open(dst, 'wb') as fd:
+            fcntl.ioctl(fd.fileno(), _FICLONE, fs.fileno())
+        return True
+    except OSError:
+        _no_reflink.add(dev)
+        if os.path.isfile(dst):
+            os.remove(dst)
+        return False
+
+
+def _tmp_name(dst):
+    """ files are written to a temporary name and then renamed, so that an existing dst
+        (maybe a link shared by other snapshots) is never written in place """
+    return f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def file_hash(f_name, algo='sha256'):
+    h = hashlib.new(algo)
+    with open(f_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(_BUF_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DedupStore:
+    """
+    Purpose: content-addressed store, identical files of different snapshots share one object (hard link)
+             objects must not be edited in place, files are always replaced via a new inode
+             lifecycle: link() adds a reference to an object, removing or replacing a snapshot drops it,
+             prune() removes the objects left without reference; it is called by sync_dir (dedup=True)
+             and by RetentionPolicy.apply. Not for stores whose objects are only referenced by name
+             (the run cache), their objects have a single link
+    """
+
+    def __init__(self, root=DEDUP_STORE):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def object_path(self, digest):
+        return os.path.join(self.root, digest[0:2], digest[2:])
+
+    def put(self, src):
+        """ add src to the store, return (object path, True if a new object is created) """
+        obj = self.object_path(file_hash(src))
+        with self._lock:
+            if os.path.isfile(obj):
+                return obj, False
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+        tmp = _tmp_name(obj)
+        if not _reflink(src, tmp):
+            shutil.copyfile(src, tmp)
+        shutil.copymode(src, tmp)
+        os.replace(tmp, obj)
+        return obj, True
+
+    def link(self, src, dst):
+        """ snapshot src to dst through the store, return the method used """
+        obj, new = self.put(src)
+        method = 'store' if new else 'dedup'
+        tmp = _tmp_name(dst)
+        try:
+            os.link(obj, tmp)
+        except OSError:
+            # the store is on another file system
+            shutil.copyfile(obj, tmp)
+            shutil.copymode(obj, tmp)
+            method = 'copy'
+        try:
+            os.replace(tmp, dst)
+        except BaseException:
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+            raise
+        return method
+
+    def prune(self):
+        """ remove objects not referenced by any snapshot (no other hard link), return the number removed """
+        num = 0
+        for path, _, files in os.walk(self.root):
+            for f in files:
+                # objects being written
+                if f.endswith('.tmp'):
+                    continue
+                obj = os.path.join(path, f)
+                try:
+                    if os.stat(obj).st_nlink == 1:
+                        os.remove(obj)
+                        num += 1
+                except OSError:
+                    continue
+        return num
+
+
+def snapshot_file(src, dst, store: DedupStore = None, link=False):
+    """
+    Purpose: copy src to dst with the cheapest method available
+             store  content-addressed store (dedup) or None
+             link   hard link src itself, only for files which are never modified in place afterwards
+    Return : method used: 'reflink', 'link', 'store', 'dedup' or 'copy'
+    """
+    if store is not None:
+        return store.link(src, dst)
+    tmp = _tmp_name(dst)
+    if link:
+        try:
+            os.link(src, tmp)
+            os.replace(tmp, dst)
+            return 'link'
+        except OSError:
+            pass
+    if _reflink(src, tmp):
+        shutil.copymode(src, tmp)
+        os.replace(tmp, dst)
+        return 'reflink'
+    try:
+        shutil.copyfile(src, tmp)
+        shutil.copymode(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+        raise
+    return 'copy'
+
+
+def snapshot_files(pairs, store: DedupStore = None, link=False, nthread=MAX_THREAD, failed=None):
+    """
+    Purpose: snapshot [(src, dst), ...] on a thread pool
+             failed     list, the pairs which cannot be copied are appended
+    Return : {method: number of files}, 'fail' counts the files which cannot be copied
+    """
+    stats = {}
+
+    def _one(pair):
+        src, dst = pair
+        try:
+            return snapshot_file(src, dst, store, link)
+        except (IOError, OSError) as e:
+            logging.warning(f"unable to copy file {src} to {dst}: {e}")
+            return 'fail'
+
+    if not pairs:
+        return stats
+    nthread = max(1, min(nthread, len(pairs)))
+    if nthread == 1:
+        methods = [_one(p) for p in pairs]
+    else:
+        with ThreadPoolExecutor(nthread) as pool:
+            methods = list(pool.map(_one, pairs))
+    for pair, m in zip(pairs, methods):
+        stats[m] = stats.get(m, 0) + 1
+        if m == 'fail' and failed is not None:
+            failed.append(pair)
+    return stats
+
+
+def _changed(src, dst, check):
+    """ True if dst is missing or differs from src (size + mtime, or content hash) """
+    try:
+        st2 = os.stat(dst)
+    except FileNotFoundError:
+        return True
+    st1 = os.stat(src)
+    if st1.st_size != st2.st_size:
+        return True
+    if check == 'hash':
+        return file_hash(src) != file_hash(dst)
+    return st1.st_mtime_ns != st2.st_mtime_ns
+
+
+def sync_dir(dir1, dir2, check='mtime', select=None, delete=False, dedup=False, dry_run=False,
+             nthread=MAX_THREAD):
+    """
+    Purpose: copy new or changed files of dir1 to dir2
+    Inputs : check      'mtime' (size + mtime) or 'hash' (size + sha256)
+             select     function(file_name) -> bool, files to be synchronized (default all)
+             delete     remove the files in dir2 which are not selected in dir1
+             dedup      share identical files through the snapshot store, which is pruned afterwards
+             dry_run    only report the files to be copied or removed
+    Return : {'copy': [...], 'delete': [...], 'fail': [...], 'bytes': n, 'seconds': t}
+    """
+    start = time.time()
+    if not os.path.isdir(dir1):
+        logging.error(f"directory not exists {dir1}")
+        return
+    files = [f for f in os.listdir(dir1) if (select is None or select(f)) and os.path.isfile(os.path.join(dir1, f))]
+    if not os.path.isdir(dir2):
+        if not dry_run:
+            os.makedirs(dir2)
+        todo = files
+    else:
+        with ThreadPoolExecutor(max(1, nthread)) as pool:
+            flags = pool.map(lambda f: _changed(os.path.join(dir1, f), os.path.join(dir2, f), check), files)
+            todo = [f for f, changed in zip(files, flags) if changed]
+    extra = []
+    if delete and os.path.isdir(dir2):
+        keep = set(files)
+        extra = [f for f in os.listdir(dir2) if f not in keep and os.path.isfile(os.path.join(dir2, f))]
+    fail = []
+    if not dry_run:
+        for f in extra:
+            os.remove(os.path.join(dir2, f))
+        pairs = [(os.path.join(dir1, f), os.path.join(dir2, f)) for f in todo]
+        store = DedupStore() if dedup else None
+        failed = []
+        snapshot_files(pairs, store=store, nthread=nthread, failed=failed)
+        fail = [os.path.basename(src) for src, _ in failed]
+        if fail:
+            fail_set = set(fail)
+            todo = [f for f in todo if f not in fail_set]
+            logging.warning(f"sync {dir1} => {dir2}: {len(fail)} files not copied")
+        # keep the mtime, so that unchanged files are skipped next time
+        for f in todo:
+            st = os.stat(os.path.join(dir1, f))
+            os.utime(os.path.join(dir2, f), ns=(st.st_atime_ns, st.st_mtime_ns))
+        # objects of the removed or replaced files
+        if store is not None and (todo or extra):
+            store.prune()
+    nbytes = sum(os.path.getsize(os.path.join(dir1, f)) for f in todo)
+
+    end = time.time()
+    logging.info(f"{'[dry-run] ' if dry_run else ''}sync {dir1} => {dir2}: {len(todo)} of {len(files)} files, "
+                 f"{nbytes / 1e6:.2f} MB copied, {len(extra)} removed in {end - start:.3f} sec")
+    return {'copy': todo, 'delete': extra, 'fail': fail, 'bytes': nbytes, 'seconds': end - start}
+
+
+def _benchmark(nfile=4000, size=20000):
+    """ python -m funcs.gnss_archive: serial shutil.copy vs. sync_dir on a log_tb-like directory """
+    with tempfile.TemporaryDirectory() as tmp:
+        dir1 = os.path.join(tmp, 'log_tb')
+        os.makedirs(dir1)
+        for i in range(nfile):
+            with open(os.path.join(dir1, f"s{i:03d}{i % 365 + 1:03d}0.20o.log"), 'w') as f:
+                f.write(f"{i:>10d}".ljust(size - 1, 'x') + '\n')
+
+        start = time.time()
+        os.makedirs(os.path.join(tmp, 'serial'))
+        for f in os.listdir(dir1):
+            shutil.copy(os.path.join(dir1, f), os.path.join(tmp, 'serial', f))
+        print(f"serial shutil.copy      : {time.time() - start:8.3f} sec")
+
+        dir2 = os.path.join(tmp, 'log_tb_bak')
+        for label in ['sync_dir (first)', 'sync_dir (unchanged)']:
+            res = sync_dir(dir1, dir2)
+            print(f"{label:24s}: {res['seconds']:8.3f} sec, {len(res['copy'])} files")
+        for i in range(0, nfile, 100):
+            with open(os.path.join(dir1, sorted(os.listdir(dir1))[i]), 'a') as f:
+                f.write('changed\n')
+        res = sync_dir(dir1, dir2)
+        print(f"{'sync_dir (1% changed)':24s}: {res['seconds']:8.3f} sec, {len(res['copy'])} files")
+
+
+__all__ = ['DedupStore', 'DEDUP_STORE', 'file_hash', 'snapshot_file', 'snapshot_files', 'sync_dir']
+
+
+if __name__ == '__main__':
+    _benchmark()
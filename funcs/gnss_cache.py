@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from contextlib import contextmanager
+from .gnss_io import find_source, decompress_file
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, the cache is then used without locking
+    fcntl = None
+
+# file types which do not change between days
+STATIC_FILES = ['atx', 'blq', 'oceantide', 'de', 'egm', 'leapsecond', 'satpars']
+_BUF_SIZE = 1024 * 1024
+
+
+class StaticCache:
+    """
+    Purpose: content-addressed cache of static input files shared by all work directories
+             objects/xx/sha256   cached (uncompressed) content
+             index.json         {'sources': {src: [size, mtime_ns, digest]},
+                                 'objects': {digest: {'size': n, 'used': t, 'refs': [links]}}}
+             an object is referenced by the links in work directories and evicted by LRU when unreferenced
+    """
+
+    def __init__(self, root, max_size=0):
+        self.root = os.path.abspath(root)
+        self.max_size = max_size
+        os.makedirs(os.path.join(self.root, 'objects'), exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        """ exclusive access to the index, shared by different processes and projects """
+        with open(os.path.join(self.root, 'index.lock'), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            f_idx = os.path.join(self.root, 'index.json')
+            try:
+                with open(f_idx) as f:
+                    index = json.load(f)
+            except (FileNotFoundError, ValueError):
+                index = {'sources': {}, 'objects': {}}
+            yield index
+            tmp = f"{f_idx}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp, f_idx)
+
+    def _object(self, digest):
+        return os.path.join(self.root, 'objects', digest[0:2], digest)
+
+    def _add(self, index, src):
+        """ digest of src, the object is created if it is not in the cache """
+        st = os.stat(src)
+        key = os.path.abspath(src)
+        known = index['sources'].get(key)
+        if known and known[0:2] == [st.st_size, st.st_mtime_ns] and os.path.isfile(self._object(known[2])):
+            return known[2]
+
+        tmp = os.path.join(self.root, f"incoming.{os.getpid()}")
+        h = hashlib.sha256()
+        decompress_file(src, tmp)
+        with open(tmp, 'rb') as f:
+            for chunk in iter(lambda: f.read(_BUF_SIZE), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        obj = self._object(digest)
+        if os.path.isfile(obj):
+            os.remove(tmp)
+        else:
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, obj)
+            logging.info(f"static file cached {os.path.basename(src)} => {obj}")
+        index['sources'][key] = [st.st_size, st.st_mtime_ns, digest]
+        index['objects'].setdefault(digest, {'size': os.path.getsize(obj), 'used': 0, 'refs': []})
+        return digest
+
+    def _live_refs(self, digest, refs):
+        obj = self._object(digest)
+        live = []
+        for ref in refs:
+            try:
+                if os.path.samefile(ref, obj):
+                    live.append(ref)
+            except OSError:
+                continue
+        return live
+
+    def expose(self, items, mode='symlink'):
+        """
+        Purpose: link static files into work directories
+        Inputs : items      [(src, dst), ...]
+                 mode       'symlink' or 'hardlink' (falls back to symlink on another file system)
+        Return : {'link': [...], 'fail': [...]}, lists of source files
+        """
+        result = {'link': [], 'fail': []}
+        with self._locked() as index:
+            for f1, dst in items:
+                src = find_source(f1)
+                if src is None:
+                    logging.warning(f'copy failed! file not found {f1}')
+                    result['fail'].append(f1)
+                    continue
+                try:
+                    digest = self._add(index, src)
+                    obj = self._object(digest)
+                    if os.path.lexists(dst):
+                        os.remove(dst)
+                    if mode == 'hardlink':
+                        try:
+                            os.link(obj, dst)
+                        except OSError:
+                            os.symlink(obj, dst)
+                    else:
+                        os.symlink(obj, dst)
+                except OSError as e:
+                    logging.warning(f'copy failed! {src}: {e}')
+                    result['fail'].append(f1)
+                    continue
+                rec = index['objects'][digest]
+                rec['used'] = time.time()
+                rec['refs'] = sorted(set(self._live_refs(digest, rec['refs']) + [os.path.abspath(dst)]))
+                result['link'].append(src)
+            self._evict(index)
+        return result
+
+    def _evict(self, index):
+        """ remove unreferenced objects, least recently used first, until the cache is below max_size """
+        if self.max_size <= 0:
+            return 0
+        total = sum(rec['size'] for rec in index['objects'].values())
+        num = 0
+        for digest, rec in sorted(index['objects'].items(), key=lambda x: x[1]['used']):
+            if total <= self.max_size:
+                break
+            rec['refs'] = self._live_refs(digest, rec['refs'])
+            if rec['refs']:
+                continue
+            obj = self._object(digest)
+            if os.path.isfile(obj):
+                os.chmod(obj, 0o644)
+                os.remove(obj)
+            total -= rec['size']
+            del index['objects'][digest]
+            num += 1
+        if num:
+            index['sources'] = {k: v for k, v in index['sources'].items() if v[2] in index['objects']}
+            logging.info(f"{num} static files evicted from {self.root}")
+        return num
+
+    def evict(self):
+        with self._locked() as index:
+            return self._evict(index)
+
+    def release(self, path):
+        """ drop the references of a work directory (e.g. before it is removed) """
+        path = os.path.abspath(path)
+        with self._locked() as index:
+            for rec in index['objects'].values():
+                rec['refs'] = [r for r in rec['refs'] if not r.startswith(path)]
+            return self._evict(index)
+
+    def usage(self):
+        """ (number of objects, total size in bytes, number of references) """
+        with self._locked() as index:
+            for digest, rec in index['objects'].items():
+                rec['refs'] = self._live_refs(digest, rec['refs'])
+            objs = index['objects'].values()
+            return len(objs), sum(rec['size'] for rec in objs), sum(len(rec['refs']) for rec in objs)
+
+
+__all__ = ['StaticCache', 'STATIC_FILES']
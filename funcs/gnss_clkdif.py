@@ -0,0 +1,188 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from .constants import gns_name, gns_sat, MAX_THREAD
+from .gnss_clock import ClockProduct, read_clock, read_clock_header, header_prns
+from .lazy_import import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# reference satellites in order of preference, the same as read_clkdif_sum
+REF_SATS = ['G01', 'G08', 'G05', 'E01', 'E02', 'C21', 'C22', 'C23', 'C24', 'C08', 'R01', 'R02']
+
+
+def _epoch_keys(epochs):
+    """ epochs (fractional MJD) as integer milliseconds, for exact matching """
+    return np.round(epochs * 86400000.0).astype(np.int64)
+
+
+class ClockDiff:
+    """
+    Purpose: satellite clock differences of a product against a reference product (ns)
+             the datum is removed per epoch by a reference satellite (datum='sat') or
+             by the mean of all satellites of each system (datum='mean')
+             the native alternative of great_clkdif, e.g. to evaluate many days and centers in one process
+    """
+
+    def __init__(self, epochs, sats, dif, ref_sat=''):
+        self.epochs = epochs
+        self.sats = sats
+        self.dif = dif
+        self.ref_sat = ref_sat
+
+    @classmethod
+    def compute(cls, prd: ClockProduct, ref: ClockProduct, ref_sat='', sats=None, intv=0,
+                t_beg=None, t_end=None, datum='sat'):
+        """
+        Inputs : prd, ref       clock products to be compared
+                 ref_sat        reference satellite, selected from REF_SATS if empty
+                 sats           satellites to compare (default all common satellites)
+                 intv           sampling interval (s), 0 for all common epochs
+                 t_beg, t_end   time window (GnssTime or fractional MJD)
+        """
+        if t_beg is not None or t_end is not None:
+            prd, ref = prd.window(t_beg, t_end), ref.window(t_beg, t_end)
+        t1, s1, v1 = prd.cube('AS')
+        t2, s2, v2 = ref.cube('AS')
+        common, j1, j2 = np.intersect1d(s1, s2, return_indices=True)
+        if sats is not None:
+            keep = np.isin(common, list(sats))
+            common, j1, j2 = common[keep], j1[keep], j2[keep]
+        _, i1, i2 = np.intersect1d(_epoch_keys(t1), _epoch_keys(t2), return_indices=True)
+        epochs = t1[i1]
+        if intv > 0 and len(epochs):
+            sod = np.round((epochs - np.floor(epochs)) * 86400.0)
+            keep = np.mod(sod, intv) == 0
+            epochs, i1, i2 = epochs[keep], i1[keep], i2[keep]
+        dif = (v1[np.ix_(i1, j1)] - v2[np.ix_(i2, j2)]) * 1e9
+        if len(common) == 0 or len(epochs) == 0:
+            return cls(epochs, common, dif, ref_sat)
+
+        if datum == 'mean':
+            systems = np.array([s[0] for s in common])
+            for gs in set(systems.tolist()):
+                cols = systems == gs
+                dif[:, cols] -= np.nanmean(dif[:, cols], axis=1)[:, None]
+            return cls(epochs, common, dif, '')
+
+        if not ref_sat or ref_sat not in common:
+            # the satellite with the most epochs among the preferred ones
+            nobs = dict(zip(common.tolist(), np.sum(~np.isnan(dif), axis=0).tolist()))
+            cand = [s for s in REF_SATS if nobs.get(s, 0) > 0]
+            ref_sat = cand[0] if cand else max(nobs, key=nobs.get)
+        iref = int(np.searchsorted(common, ref_sat))
+        dif -= dif[:, iref][:, None]
+        return cls(epochs, common, dif, ref_sat)
+
+    @classmethod
+    def from_files(cls, f_prds, f_refs, **kwargs):
+        """ clock differences of the product files against the reference files (lists of multi-day files) """
+        prd = ClockProduct.merge([read_clock(f) for f in f_prds])
+        ref = ClockProduct.merge([read_clock(f) for f in f_refs])
+        return cls.compute(prd, ref, **kwargs)
+
+    @classmethod
+    def from_config(cls, config, ref_sat='', datum='sat'):
+        """ the same files, satellites, interval and reference satellite as GrtClkdif """
+        job = clkdif_job(config, ref_sat, datum)
+        if job is None:
+            return cls(np.zeros(0), np.array([], dtype='U3'), np.zeros((0, 0)), ref_sat)
+        return cls.from_files(job[0], job[1], **job[3])
+
+    def stats(self, min_obs=2):
+        """ per satellite: number of epochs, mean, STD (mean removed) and RMS of the differences (ns) """
+        nobs = np.sum(~np.isnan(self.dif), axis=0)
+        mean = np.full(len(self.sats), np.nan)
+        std = np.full(len(self.sats), np.nan)
+        rms = np.full(len(self.sats), np.nan)
+        ok = nobs >= min_obs
+        if ok.any():
+            d = self.dif[:, ok]
+            mean[ok] = np.nanmean(d, axis=0)
+            std[ok] = np.nanstd(d, axis=0)
+            rms[ok] = np.sqrt(np.nanmean(d * d, axis=0))
+        return {'sat': self.sats, 'nobs': nobs, 'mean': mean, 'std': std, 'rms': rms}
+
+    def summary(self, mjd, max_std=3.0):
+        """ STD of each satellite, the same columns and selection as read_clkdif_sum (sat, gsys, val, mjd) """
+        st = self.stats()
+        sel = ~np.isnan(st['std']) & (st['std'] < max_std) & (st['sat'] != self.ref_sat)
+        sats = st['sat'][sel].tolist()
+        return pd.DataFrame({'sat': sats, 'gsys': [gns_name(s[0]) for s in sats], 'val': st['std'][sel],
+                             'mjd': int(mjd), 'rms': st['rms'][sel], 'nobs': st['nobs'][sel]})
+
+    def to_frame(self, beg_time=None, max_val=100.0):
+        """ differences of each epoch, the same columns as read_clkdif of gnss_plot (mjd, sod, sec, date, sat, val) """
+        if beg_time is not None:
+            t0 = beg_time.mjd + beg_time.sod / 86400.0
+        else:
+            t0 = self.epochs[0] if len(self.epochs) else 0.0
+        irow, icol = np.nonzero(~np.isnan(self.dif) & (np.abs(np.nan_to_num(self.dif)) <= max_val))
+        keep = (self.sats[icol] != self.ref_sat) & (self.epochs[irow] >= t0 - 1e-9)
+        irow, icol = irow[keep], icol[keep]
+        t = self.epochs[irow]
+        mjd = np.floor(t + 1e-9).astype(int)
+        sod = np.round((t - mjd) * 86400.0, 3)
+        return pd.DataFrame({'mjd': mjd, 'sod': sod, 'sec': np.round((t - t0) * 86400.0, 3),
+                             'date': pd.Timestamp(1858, 11, 17) + pd.to_timedelta(t, unit='D').round('ms'),
+                             'sat': self.sats[icol].astype(object), 'val': self.dif[irow, icol]})
+
+
+def clkdif_job(config, ref_sat='', datum='sat'):
+    """
+    Purpose: job of clkdif_batch for the current time span, center and systems of a config,
+             the same files, satellites, interval and reference satellite as GrtClkdif
+    Return : (product files, reference files, mjd, kwargs of ClockDiff.compute), None if files are missing
+    """
+    with config.compressed_files():
+        f_prd = config.get_xml_file('satclk_epo' if config.lsq_mode == 'EPO' else 'satclk', check=True)
+        f_ref = config.get_xml_file('ssrclk' if config.orb_ac.startswith('clk') else 'rinexc', check=True)
+    if not f_prd or not f_ref:
+        return None
+    if not ref_sat and datum == 'sat':
+        # satellites of GrtClkdif.ref_clk_sats
+        if config.orb_ac.startswith('clk') or config.orb_ac in ['grt', 'cnt']:
+            sats = [s for gs in config.gsystem for s in gns_sat(gs)]
+        else:
+            with config.compressed_files():
+                f_clks = config.get_xml_file('rinexc', check=True)
+            sats = header_prns(read_clock_header(f_clks[0])) if f_clks else []
+        if sats:
+            ref_sat = config.set_ref_clk(mode='sat', sats=sats)
+    # absolute paths, the job may run in another process
+    f_prd = [os.path.abspath(f) for f in f_prd]
+    f_ref = [os.path.abspath(f) for f in f_ref]
+    return f_prd, f_ref, config.beg_time.mjd, dict(ref_sat=ref_sat, sats=config.all_gnssat, intv=config.intv,
+                                                    t_beg=config.beg_time, t_end=config.end_time, datum=datum)
+
+
+def _clkdif_job(job):
+    f_prds, f_refs, mjd, kwargs = job
+    try:
+        return ClockDiff.from_files(f_prds, f_refs, **kwargs).summary(mjd)
+    except (OSError, ValueError, AttributeError) as e:
+        logging.warning(f"clock difference failed {f_prds[0] if f_prds else ''}: {e}")
+        return None
+
+
+def clkdif_batch(jobs, nthread=MAX_THREAD):
+    """
+    Purpose: clock differences of many days / centers / systems in one pool
+    Inputs : jobs       [(product files, reference files, mjd, {ref_sat, sats, intv, ...}), ...], see clkdif_job
+    Return : DataFrame of ClockDiff.summary for all jobs, with the column job (index in jobs)
+    """
+    if nthread > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(min(nthread, len(jobs))) as pool:
+            results = list(pool.map(_clkdif_job, jobs))
+    else:
+        results = [_clkdif_job(job) for job in jobs]
+    frames = []
+    for i, data in enumerate(results):
+        if data is not None and not data.empty:
+            data['job'] = i
+            frames.append(data)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+__all__ = ['ClockDiff', 'REF_SATS', 'clkdif_job', 'clkdif_batch']
@@ -0,0 +1,288 @@
+import os
+import logging
+from .gnss_io import open_gnss, product_cache_file, save_product_cache, ProductMemo
+from .lazy_import import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+_CACHE_VERSION = 1
+# in-process memo of the last clock files read, e.g. the neighbouring days merged by ClockDiff
+_clk_memo = ProductMemo(4)
+_LINE_LEN = 80
+# rules of the records duplicated in consecutive files, see ClockProduct.merge
+DUP_RULES = ('first', 'last', 'mean')
+
+
+def _ymd2mjd(year, mon, day):
+    """ vectorized ymd2mjd of gnss_time """
+    year = np.where(mon <= 2, year - 1, year)
+    mon = np.where(mon <= 2, mon + 12, mon)
+    return (np.floor(365.25 * year) - 679006 + np.floor(30.6001 * (mon + 1)) + 2 -
+            np.floor(year / 100.0) + np.floor(year / 400.0) + day).astype(np.int32)
+
+
+def _field(buf, beg, end, dtype):
+    """ fixed-width column [beg, end) of the records (uint8 array n x _LINE_LEN) converted to dtype """
+    col = np.array(buf[:, beg:end])  # a copy, buf is read-only and a single row slice is contiguous
+    if dtype is float:
+        # blank fields (e.g. no sigma) are NaN, Fortran exponents are accepted
+        col[col == ord('D')] = ord('E')
+        blank = (col == ord(' ')).all(axis=1)
+        if blank.any():
+            col[blank, -3:] = np.frombuffer(b'nan', dtype=np.uint8)
+    return col.view(f'S{end - beg}').ravel().astype(dtype)
+
+
+class ClockProduct:
+    """
+    Purpose: RINEX clock product held as arrays, one record per AS/AR line
+             mjd, sod   epoch
+             name       satellite PRN (AS) or station name (AR)
+             rtype      'AS' or 'AR'
+             val, sig   clock bias and sigma (s), sig is NaN if not given
+             header     header lines, up to END OF HEADER
+    """
+    __slots__ = ['header', 'mjd', 'sod', 'name', 'rtype', 'val', 'sig', '_cubes']
+
+    def __init__(self, mjd, sod, name, rtype, val, sig, header=None):
+        self.header = list(header) if header else []
+        self.mjd = np.asarray(mjd, dtype=np.int32)
+        self.sod = np.asarray(sod, dtype=np.float64)
+        self.name = np.asarray(name, dtype='U4')
+        self.rtype = np.asarray(rtype, dtype='U2')
+        self.val = np.asarray(val, dtype=np.float64)
+        self.sig = np.asarray(sig, dtype=np.float64)
+        self._cubes = {}
+
+    def __len__(self):
+        return len(self.name)
+
+    @property
+    def fmjd(self):
+        return self.mjd + self.sod / 86400.0
+
+    @property
+    def prn_list(self):
+        """ satellites of the PRN LIST header records """
+        return header_prns(self.header)
+
+    def names(self, mode='AS'):
+        return sorted(set(self.name[self.rtype == mode].tolist()))
+
+    def subset(self, idx):
+        return ClockProduct(self.mjd[idx], self.sod[idx], self.name[idx], self.rtype[idx], self.val[idx],
+                            self.sig[idx], self.header)
+
+    def window(self, t_beg=None, t_end=None):
+        """ records within [t_beg, t_end] (GnssTime or fractional MJD) """
+        t = self.fmjd
+        sel = np.ones(len(self), dtype=bool)
+        if t_beg is not None:
+            sel &= t >= _fmjd(t_beg) - 1e-9
+        if t_end is not None:
+            sel &= t <= _fmjd(t_end) + 1e-9
+        return self.subset(np.nonzero(sel)[0])
+
+    def cube(self, mode='AS'):
+        """
+        Purpose: clock cube of the AS (satellites) or AR (stations) records
+        Return : (epochs (fractional MJD), names, values (epochs x names, NaN if missing))
+        """
+        if mode not in self._cubes:
+            sel = np.nonzero(self.rtype == mode)[0]
+            # epochs rounded to 1 ms, identical epochs of different records then get one row
+            t = np.round(self.mjd[sel] * 86400000.0 + self.sod[sel] * 1000.0)
+            keys, irow = np.unique(t, return_inverse=True)
+            names, icol = np.unique(self.name[sel], return_inverse=True)
+            values = np.full((len(keys), len(names)), np.nan)
+            values[irow, icol] = self.val[sel]
+            self._cubes[mode] = (keys / 86400000.0, names, values)
+        return self._cubes[mode]
+
+    def series(self, name, mode='AS'):
+        """ (epochs, values) of one satellite or station, None if not found """
+        epochs, names, values = self.cube(mode)
+        i = np.searchsorted(names, name)
+        if i >= len(names) or names[i] != name:
+            return None
+        ok = ~np.isnan(values[:, i])
+        return epochs[ok], values[ok, i]
+
+    def to_frame(self, mode='AS'):
+        """ DataFrame with the columns of read_rnxc_file: epoch (fractional MJD), sod, name, clk """
+        sel = np.nonzero(self.rtype == mode)[0]
+        return pd.DataFrame({'epoch': self.fmjd[sel], 'sod': self.sod[sel], 'name': self.name[sel].astype(object),
+                             'clk': self.val[sel]})
+
+    @classmethod
+    def concat(cls, products, header=None):
+        products = [p for p in products if p is not None]
+        if not products:
+            return cls([], [], [], [], [], [], header)
+        return cls(*[np.concatenate([getattr(p, k) for p in products])
+                     for k in ['mjd', 'sod', 'name', 'rtype', 'val', 'sig']],
+                   header if header is not None else products[0].header)
+
+    @classmethod
+    def merge(cls, products, rule='last'):
+        """
+        Purpose: products of consecutive files (e.g. days) as one product sorted by epoch
+                 records of the same epoch, type and name (e.g. 24:00 of a day and 00:00 of the next) are
+                 resolved by rule: 'first' or 'last' file wins, or 'mean' of all files
+        """
+        if rule not in DUP_RULES:
+            raise ValueError(f"unknown duplicate rule {rule}, one of {' '.join(DUP_RULES)}")
+        data = cls.concat(products)
+        if len(data) == 0:
+            return data
+        src = np.concatenate([np.full(len(p), i) for i, p in enumerate(p for p in products if p is not None)])
+        t = np.round(data.mjd * 86400000.0 + data.sod * 1000.0).astype(np.int64)
+        # sorted by epoch, type, name and then file
+        idx = np.lexsort((src, data.name, data.rtype, t))
+        t, rtype, name = t[idx], data.rtype[idx], data.name[idx]
+        new = np.ones(len(idx), dtype=bool)
+        new[1:] = (t[1:] != t[:-1]) | (rtype[1:] != rtype[:-1]) | (name[1:] != name[:-1])
+        if new.all():
+            return data.subset(idx)
+        if rule == 'first':
+            return data.subset(idx[new])
+        last = np.append(new[1:], True)
+        if rule == 'last':
+            return data.subset(idx[last])
+        group = np.cumsum(new) - 1
+        nrec = np.bincount(group)
+        out = data.subset(idx[new])
+        out.val = np.bincount(group, weights=data.val[idx]) / nrec
+        sig = data.sig[idx]
+        with np.errstate(invalid='ignore'):
+            out.sig = np.bincount(group, weights=np.nan_to_num(sig)) / np.bincount(group, weights=~np.isnan(sig))
+        return out
+
+    @classmethod
+    def from_lines(cls, lines):
+        header = []
+        recs = []
+        in_header = True
+        for line in lines:
+            if in_header:
+                header.append(line)
+                if line.find('END OF HEADER') > 0:
+                    in_header = False
+                continue
+            # continuation lines (more than 2 values) do not start with the record type
+            if line[0:3] in ('AS ', 'AR ') and len(line) >= 59:
+                recs.append(line[0:_LINE_LEN].rstrip('\n').ljust(_LINE_LEN))
+        if in_header:
+            # no END OF HEADER, e.g. a file which only contains data records
+            recs = [line[0:_LINE_LEN].rstrip('\n').ljust(_LINE_LEN) for line in header
+                    if line[0:3] in ('AS ', 'AR ') and len(line) >= 59]
+            header = [line for line in header if line[0:3] not in ('AS ', 'AR ')]
+        if not recs:
+            return cls([], [], [], [], [], [], header)
+
+        buf = np.frombuffer(''.join(recs).encode('ascii', 'replace'), dtype=np.uint8).reshape(-1, _LINE_LEN)
+        mjd = _ymd2mjd(_field(buf, 8, 12, int), _field(buf, 13, 15, int), _field(buf, 16, 18, int))
+        sod = _field(buf, 19, 21, int) * 3600 + _field(buf, 22, 24, int) * 60 + _field(buf, 25, 34, float)
+        name = np.char.strip(_field(buf, 3, 7, 'U4'))
+        rtype = _field(buf, 0, 2, 'U2')
+        return cls(mjd, sod, name, rtype, _field(buf, 37, 59, float), _field(buf, 59, 80, float), header)
+
+    def save_npz(self, f_npz, stamp=(0, 0)):
+        np.savez(f_npz, version=_CACHE_VERSION, stamp=np.array(stamp, dtype=np.int64),
+                 header=np.array(self.header, dtype=str), mjd=self.mjd, sod=self.sod, name=self.name,
+                 rtype=self.rtype, val=self.val, sig=self.sig)
+
+    @classmethod
+    def load_npz(cls, f_npz, stamp=None):
+        """ load a binary cache, None if it is invalid or out of date """
+        try:
+            with np.load(f_npz, allow_pickle=False) as d:
+                if int(d['version']) != _CACHE_VERSION:
+                    return
+                if stamp is not None and tuple(d['stamp'].tolist()) != tuple(stamp):
+                    return
+                return cls(d['mjd'], d['sod'], d['name'], d['rtype'], d['val'], d['sig'], d['header'].tolist())
+        except (OSError, KeyError, ValueError):
+            return
+
+
+def _fmjd(t):
+    return t.mjd + t.sod / 86400.0 if hasattr(t, 'mjd') else float(t)
+
+
+def _stamp(f_name):
+    try:
+        st = os.stat(f_name)
+    except FileNotFoundError:
+        logging.warning(f"file not found {f_name}")
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def read_clock(f_name, cache=True):
+    """
+    Purpose: read a RINEX clock file, each file is parsed only once
+             the last files read are kept in memory and (cache=True) in a binary cache validated by size and mtime,
+             below the product cache root (set_product_cache), not in the archive
+    """
+    stamp = _stamp(f_name)
+    if stamp is None:
+        return
+    key = os.path.abspath(f_name)
+    clk = _clk_memo.get(key, stamp)
+    if clk is not None:
+        return clk
+
+    f_npz = product_cache_file(f_name, 'clk')
+    clk = ClockProduct.load_npz(f_npz, stamp) if cache and os.path.isfile(f_npz) else None
+    if clk is None:
+        with open_gnss(f_name, errors='replace') as f:
+            clk = ClockProduct.from_lines(f)
+        if cache:
+            save_product_cache(f_npz, lambda f: clk.save_npz(f, stamp))
+    _clk_memo.put(key, stamp, clk)
+    return clk
+
+
+def read_clock_header(f_name):
+    """ header lines of a RINEX clock file, from the memo or binary cache if available """
+    stamp = _stamp(f_name)
+    if stamp is None:
+        return
+    clk = _clk_memo.get(os.path.abspath(f_name), stamp)
+    if clk is not None:
+        return clk.header
+    f_npz = product_cache_file(f_name, 'clk')
+    if os.path.isfile(f_npz):
+        try:
+            with np.load(f_npz, allow_pickle=False) as d:
+                if int(d['version']) == _CACHE_VERSION and tuple(d['stamp'].tolist()) == stamp:
+                    return d['header'].tolist()
+        except (OSError, KeyError, ValueError):
+            pass
+    header = []
+    with open_gnss(f_name, errors='replace') as f:
+        for line in f:
+            header.append(line)
+            if line.find('END OF HEADER') > 0:
+                break
+    return header
+
+
+def header_prns(header):
+    """ satellites of the PRN LIST records """
+    sats = []
+    for line in header:
+        pos = line.find('PRN LIST')
+        if pos > 0:
+            sats.extend(line[0:pos].split())
+    return sats
+
+
+def cache_clock_files(files):
+    """ build the binary cache of clock files, e.g. after they are downloaded """
+    return sum(1 for f in files if read_clock(f) is not None)
+
+
+__all__ = ['ClockProduct', 'DUP_RULES', 'read_clock', 'read_clock_header', 'header_prns', 'cache_clock_files']
@@ -1,16 +1,21 @@
 import os
+import copy
+import functools
 import configparser
-import shutil
 import logging
 import math
 import platform
 import xml.etree.ElementTree as ET
+from contextlib import contextmanager
 from typing import List
 
 from . import gnss_files as gf
 from . import gnss_tools as gt
+from . import gnss_io as gio
+from .gnss_cache import StaticCache, STATIC_FILES
+from .gnss_index import FileIndex
 from .gnss_time import GnssTime
-from .constants import gns_name, gns_id, gns_sat, gns_band, gns_sig, leo_df, site_namelong
+from .constants import gns_name, gns_id, gns_sat, gns_band, gns_sig, leo_sat, leo_names, site_namelong
 
 default_process = {
     'apply_carrier_range': 'false',
@@ -32,11 +37,155 @@ default_ambiguity = {
     'carrier_range': "NO"
 }
 
+# per-receiver file types of get_xml_file, these differ between the shards of a command
+_RECEIVER_FILES = {'rinexo', 'kin', 'ambupd_in', 'recover_all', 'ambcon_all', 'ambflag', 'attitude', 'pso'}
+
+
+def _xml_cached(*state):
+    """
+    memoize an xml builder of GnssConfig inside xml_cache(), a deep copy is returned each time
+    state: names of the receiver attributes (e.g. leo_list) the result depends on besides the arguments,
+           all other settings are part of the key of xml_cached
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            key = (func.__name__, args, tuple(sorted(kwargs.items())),
+                   tuple(tuple(getattr(self, a)) for a in state))
+            return self.xml_cached(key, lambda: func(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+class ReceiverRegistry:
+    """
+    Purpose: parsed site_list, leo_list and sat_rm of [process_scheme]
+             receivers are kept in dicts {name: {'rec', 'rec_u', 'rec_l', 'leo'}} with the long names resolved once,
+             add, remove and lookup are O(1), the names are sorted only when a list is requested after a change
+             changes are written back to the configparser by write_back (GnssConfig.sync and write)
+    """
+    OPTIONS = ('site_list', 'leo_list', 'sat_rm')
+
+    def __init__(self, sites=(), leos=(), sat_rm=()):
+        self._sites = {}
+        self._leos = {}
+        self._sat_rm = {}
+        self._lists = {}
+        self.dirty = False
+        self.add_sites(sites)
+        self.add_leos(leos)
+        self.sat_rm = sat_rm
+        self.dirty = False
+
+    @classmethod
+    def from_config(cls, conf):
+        """ receivers of a configparser, LEOs not in leo_names are ignored """
+        sites = conf.get('process_scheme', 'site_list', fallback='').split()
+        names = set(leo_names())
+        leos = [s for s in conf.get('process_scheme', 'leo_list', fallback='').split() if s in names]
+        return cls(sites, leos, conf.get('process_scheme', 'sat_rm', fallback='').split())
+
+    def write_back(self, conf):
+        """ set the options of the configparser if anything was changed """
+        if not self.dirty:
+            return
+        conf.set('process_scheme', 'site_list', ' '.join(self.sites))
+        conf.set('process_scheme', 'leo_list', ' '.join(self.leos))
+        conf.set('process_scheme', 'sat_rm', ' '.join(self._sat_rm))
+        self.dirty = False
+
+    def _changed(self):
+        self._lists.clear()
+        self.dirty = True
+
+    def _sorted(self, key, recs):
+        if key not in self._lists:
+            self._lists[key] = sorted(recs)
+        return self._lists[key]
+
+    @property
+    def sites(self) -> list:
+        return list(self._sorted('sites', self._sites))
+
+    @property
+    def leos(self) -> list:
+        return list(self._sorted('leos', self._leos))
+
+    @property
+    def sat_rm(self) -> list:
+        return list(self._sat_rm)
+
+    @sat_rm.setter
+    def sat_rm(self, value):
+        self._sat_rm = dict.fromkeys(value)
+        self.dirty = True
+
+    def receivers(self, sites=True, leos=True) -> list:
+        """ receiver dicts in the order of site_list + leo_list, copies to be used as cf_vars """
+        recs = []
+        if sites:
+            recs.extend(dict(self._sites[s]) for s in self._sorted('sites', self._sites))
+        if leos:
+            recs.extend(dict(self._leos[s]) for s in self._sorted('leos', self._leos))
+        return recs
+
+    def get(self, name):
+        """ receiver dict of a site or LEO name, None if not found """
+        rec = self._sites.get(name.lower()) or self._leos.get(name.lower())
+        return dict(rec) if rec else None
+
+    def __contains__(self, name):
+        return name.lower() in self._sites or name.lower() in self._leos
+
+    def __len__(self):
+        return len(self._sites) + len(self._leos)
+
+    def add_sites(self, names):
+        for s in names:
+            s = s.lower()
+            if s not in self._sites:
+                rec_l = site_namelong[s].upper() if s in site_namelong else f'{s.upper()}00CHN'
+                self._sites[s] = {'rec': s, 'rec_u': s.upper(), 'rec_l': rec_l, 'leo': False}
+        self._changed()
+
+    def add_leos(self, names):
+        known = set(leo_names())
+        for s in names:
+            s = s.lower()
+            if s in known and s not in self._leos:
+                self._leos[s] = {'rec': s, 'rec_u': s.upper(), 'rec_l': leo_sat(s).svn, 'leo': True}
+        self._changed()
+
+    def remove_sites(self, names) -> list:
+        """ remove sites, return the names removed """
+        removed = [s.lower() for s in names if self._sites.pop(s.lower(), None) is not None]
+        if removed:
+            self._changed()
+        return removed
+
+    def remove_leos(self, names) -> list:
+        """ remove LEOs, return the names removed """
+        removed = [s.lower() for s in names if self._leos.pop(s.lower(), None) is not None]
+        if removed:
+            self._changed()
+        return removed
+
+    def set_sites(self, names):
+        self._sites.clear()
+        self.add_sites(names)
+
+    def set_leos(self, names):
+        self._leos.clear()
+        self.add_leos(names)
+
 
 class GnssConfig:
 
     def __init__(self, conf):
         self.config = conf
+        self._xml_cache = None
+        self._xml_sites = []
+        self._read_compressed = False
 
         if not self.__check():
             raise RuntimeError('GnssConfig check failed')
@@ -73,6 +222,7 @@ class GnssConfig:
 
     @property
     def config(self):
+        """ the configparser, site_list, leo_list and sat_rm are up to date after sync() """
         return self._config
 
     @config.setter
@@ -81,9 +231,23 @@ class GnssConfig:
                                   configparser.SafeConfigParser)):
             raise TypeError('Expected a configparser')
         self._config = value
+        self._registry = None
+
+    @property
+    def receivers(self) -> ReceiverRegistry:
+        """ registry of site_list, leo_list and sat_rm, parsed on first use """
+        if self._registry is None:
+            self._registry = ReceiverRegistry.from_config(self.config)
+        return self._registry
+
+    def sync(self):
+        """ write the changes of the receiver registry back to the configparser """
+        if self._registry is not None:
+            self._registry.write_back(self.config)
 
     def write(self, file):
         """ write the new config file """
+        self.sync()
         with open(file, 'w') as f:
             self.config.write(f)
 
@@ -280,8 +444,14 @@ class GnssConfig:
 
     def set_process(self, **kwargs):
         """ Update any process item in config """
+        if any(key in ReceiverRegistry.OPTIONS for key in kwargs):
+            # the pending changes of the other receiver options are kept
+            self.sync()
+            self._registry = None
         for key, val in kwargs.items():
             self.config.set('process_scheme', key, f"{val}")
+        if self._xml_cache:
+            self._xml_cache.clear()
 
     # -----------------------------------------------------------------------------------
     # GNSS settings
@@ -325,7 +495,7 @@ class GnssConfig:
 
     @property
     def sat_rm(self) -> list:
-        return self.config.get('process_scheme', 'sat_rm', fallback='').split()
+        return self.receivers.sat_rm
     
     @property
     def sys_rm(self) -> list:
@@ -335,7 +505,7 @@ class GnssConfig:
     def sat_rm(self, value: list):
         if not isinstance(value, list):
             raise TypeError('Expected a list')
-        self.config.set('process_scheme', 'sat_rm', ' '.join(value))
+        self.receivers.sat_rm = value
 
     def gnsfreq(self, gsys) -> int:
         """ freq of one system """
@@ -369,38 +539,27 @@ class GnssConfig:
 
     @property
     def site_list(self) -> list:
-        val = self.config.get('process_scheme', 'site_list', fallback='').split()
-        val.sort()
-        return [s.lower() for s in val]
+        return self.receivers.sites
 
     @site_list.setter
     def site_list(self, value: list):
         if not isinstance(value, list):
             raise TypeError('Expected a list')
-        self.config.set('process_scheme', 'site_list', ' '.join([s.lower() for s in value]))
+        self.receivers.set_sites(value)
 
     @property
     def leo_list(self) -> list:
-        val = self.config.get('process_scheme', 'leo_list', fallback='').split()
-        val = [s for s in val if s in list(leo_df.name)]
-        val = list(set(val))
-        val.sort()
-        return [s.lower() for s in val]
+        return self.receivers.leos
 
     @leo_list.setter
     def leo_list(self, value: list):
         if not isinstance(value, list):
             raise TypeError('Expected a list')
-        self.config.set('process_scheme', 'leo_list', ' '.join([s.lower() for s in value]))
+        self.receivers.set_leos(value)
 
     @property
     def leo_sats(self):
-        idx = leo_df.name == 'xxxx'
-        for leo in self.leo_list:
-            idx = idx | (leo_df.name == leo)
-        sats = list(leo_df[idx].svn)
-        sats.sort()
-        return sats
+        return sorted(rec['rec_l'] for rec in self.receivers.receivers(sites=False))
 
     @property
     def all_sites(self):
@@ -408,36 +567,32 @@ class GnssConfig:
 
     @property
     def site_receivers(self):
-        return [{'rec': s, 'rec_u': s.upper(), 'rec_l': site_namelong[s].upper() if s in site_namelong.keys()
-                else f'{s.upper()}00CHN', 'leo': False} for s in self.site_list]
+        return self.receivers.receivers(leos=False)
 
     @property
     def leo_receivers(self):
-        return [{'rec': s, 'rec_u': s.upper(), 'rec_l': leo_df[leo_df.name == s].svn.values[0], 'leo': True}
-                for s in self.leo_list]
+        return self.receivers.receivers(sites=False)
 
     @property
     def all_receivers(self):
-        return self.site_receivers + self.leo_receivers
+        return self.receivers.receivers()
 
     def remove_leo(self, leo_rm: list):
         """ Remove LEO satellite in config """
         if not isinstance(leo_rm, list):
             return
-        leo_rm = [s for s in leo_rm if s in self.leo_list]
+        leo_rm = self.receivers.remove_leos(leo_rm)
         if not leo_rm:
             return
-        self.leo_list = list(set(self.leo_list).difference(set(leo_rm)))
         logging.warning(f"LEOs {' '.join(leo_rm)} are removed")
 
     def remove_site(self, site_rm: list):
         """ Remove ground stations in config """
         if not isinstance(site_rm, list):
             return
-        site_rm = [s.lower() for s in site_rm if s.lower() in self.site_list]
+        site_rm = self.receivers.remove_sites(site_rm)
         if not site_rm:
             return
-        self.site_list = list(set(self.site_list).difference(set(site_rm)))
         logging.warning(f"STATIONS {' '.join(site_rm)} are removed")
 
     # -----------------------------------------------------------------------------------
@@ -527,6 +682,102 @@ class GnssConfig:
             raise TypeError('Expected a string')
         self.config.set('common', 'upd_data', os.path.abspath(value))
 
+    @property
+    def link_files(self) -> list:
+        """ file types of read-only inputs which are linked into the work directory, e.g. atx de """
+        return self.config.get('common', 'link_files', fallback='').split()
+
+    @property
+    def keep_compressed(self) -> list:
+        """
+        file types staged compressed, for the files read by open_gnss only (e.g. for monitoring),
+        the compressed files are found inside compressed_files(), i.e. never in the xml of GREAT
+        """
+        return self.config.get('common', 'keep_compressed', fallback='').split()
+
+    @property
+    def file_index(self) -> str:
+        """ SQLite file of the availability index of the archive ('memory' to keep it in memory), empty to disable """
+        return self.config.get('common', 'file_index', fallback='')
+
+    @property
+    def index_roots(self) -> list:
+        """ archive directories of the file index, default gnss_data """
+        value = self.config.get('common', 'index_roots', fallback='')
+        if value:
+            return value.split()
+        return [self.gnss_data] if self.gnss_data else []
+
+    @property
+    def index_ttl(self) -> float:
+        """ the file index is rescanned at most once per index_ttl seconds """
+        return self.config.getfloat('common', 'index_ttl', fallback=600)
+
+    @property
+    def static_cache(self) -> str:
+        """ directory of the static-data cache shared by all days and projects, empty to disable """
+        return self.config.get('common', 'static_cache', fallback='')
+
+    @property
+    def static_cache_size(self) -> float:
+        """ maximum size of the static-data cache (GB), 0 for no limit """
+        return self.config.getfloat('common', 'static_cache_size', fallback=0)
+
+    @property
+    def static_files(self) -> list:
+        value = self.config.get('common', 'static_files', fallback='')
+        return value.split() if value else STATIC_FILES
+
+    @property
+    def product_cache(self) -> str:
+        """ root of the binary caches of parsed UPD and clock files, default <static_cache>/products """
+        value = self.config.get('common', 'product_cache', fallback='')
+        if not value and self.static_cache:
+            value = os.path.join(self.static_cache, 'products')
+        return value
+
+    @property
+    def run_cache(self) -> str:
+        """ directory of the cache of GREAT command runs, empty to disable """
+        return self.config.get('common', 'run_cache', fallback='')
+
+    @property
+    def run_cache_check(self) -> str:
+        """ identity of the input files for the run cache: 'mtime' (size + mtime) or 'hash' """
+        return self.config.get('common', 'run_cache_check', fallback='mtime')
+
+    @property
+    def max_cores(self) -> int:
+        """ cores used by the GREAT binaries, 0 for all cores available (affinity and cgroup quota) """
+        return self.config.getint('common', 'max_cores', fallback=0)
+
+    @property
+    def max_memory(self) -> float:
+        """ memory used by the GREAT binaries (GB), 0 for the available memory """
+        return self.config.getfloat('common', 'max_memory', fallback=0)
+
+    @property
+    def resource_dir(self) -> str:
+        """
+        directory of the core reservations (flock'ed slot files) and scaling history, shared by concurrent
+        processing, default gnss_resource_<uid> in the temporary directory; it has to be on a local file system
+        """
+        return self.config.get('common', 'resource_dir', fallback='')
+
+    @property
+    def resource_timeout(self) -> float:
+        """ seconds a GREAT command waits for its cores before it runs without a reservation, 0 for no limit """
+        return self.config.getfloat('common', 'resource_timeout', fallback=3600)
+
+    @property
+    def telemetry(self) -> str:
+        """ telemetry file of the stages and GREAT commands, *.jsonl or *.db (SQLite), empty to disable """
+        return self.config.get('common', 'telemetry', fallback='')
+
+    @property
+    def stage_verify(self) -> bool:
+        return self.config.getboolean('common', 'stage_verify', fallback=False)
+
     @property
     def workdir(self):
         return self._file_name("work_dir", check=False)
@@ -558,18 +809,47 @@ class GnssConfig:
         self.config.set("process_files", file, new_path)
         logging.info(f"change {file} directory to {target_path}")
 
+    def _file_exists(self, f):
+        """
+        existence of a file, cached inside gio.stat_cache(), the file index of the archive answers the files found,
+        files it misses are checked on the disk as they may have been written after the last scan
+        """
+        if not f:
+            return False
+        index = FileIndex.from_config(self) if self.file_index else None
+        return bool(index and index.exists(f)) or gio.cached_isfile(f)
+
     def _file_name(self, f_type, cf_vars=None, sec='process_files', check=False, quiet=False):
         if cf_vars is None:
             cf_vars = {}
         cfv = self.beg_time.config_timedic()
         cfv.update(cf_vars)
         f = self.config.get(sec, f_type, vars=cfv, fallback='')
-        if check and not os.path.isfile(f):
+        if check and not self._file_exists(f):
+            if f and self._read_compressed and f_type in self.keep_compressed:
+                f_comp = gio.find_source(f)
+                if f_comp:
+                    return f_comp
             if not quiet:
                 logging.warning(f"file not found {f}")
             return ''
         return f
 
+    @contextmanager
+    def compressed_files(self):
+        """
+        Purpose: resolve the files of keep_compressed to their compressed variants (.gz, .Z, .zst ...)
+                 for the python readers using open_gnss, e.g.
+                     with config.compressed_files():
+                         f_clks = config.get_xml_file('rinexc', check=True)
+        """
+        state = self._read_compressed
+        self._read_compressed = True
+        try:
+            yield self
+        finally:
+            self._read_compressed = state
+
     def file_name(self, f_type, cf_vars=None, sec='process_files', check=False, quiet=False):
         return self._file_name(f_type, cf_vars, sec, check, quiet)
 
@@ -597,6 +877,14 @@ class GnssConfig:
 
     def get_xml_file(self, f_type: str, sattype='gns', sec='process_files', check=False,
                      remove=False, quiet=False) -> list:
+        if remove or f_type in _RECEIVER_FILES or f_type.startswith('ambflag1') or \
+                (f_type in ['sp3', 'sp3_inp'] and 'leo' in sattype):
+            return self._get_xml_file(f_type, sattype, sec, check, remove, quiet)
+        return self.xml_cached(('file', f_type, sattype, sec, check, quiet, self._read_compressed),
+                               lambda: self._get_xml_file(f_type, sattype, sec, check, remove, quiet))
+
+    def _get_xml_file(self, f_type: str, sattype='gns', sec='process_files', check=False,
+                      remove=False, quiet=False) -> list:
         # -------------------------------------------------------------------------------
         # files per site
         if f_type in ['rinexo', 'kin', 'ambupd_in', 'recover_all', 'ambcon_all', 'ambflag'] or \
@@ -727,10 +1015,13 @@ class GnssConfig:
     def remove_ambflag_file(self, sites: List[str]):
         for f_type in ['ambflag', 'ambflag13', 'ambflag14', 'ambflag15']:
             for site in sites:
+                f = self._file_name(f_type, {'rec': site, 'rec_u': site.upper()}, quiet=True)
                 try:
-                    os.remove(self._file_name(f_type, {'rec': site, 'rec_u': site.upper()}, quiet=True))
+                    os.remove(f)
                 except FileNotFoundError:
                     continue
+                finally:
+                    gio.invalidate_stat([f])
 
     def basic_check(self, opts=None, files=None):
         """ check the necessary settings and existence of files """
@@ -746,15 +1037,22 @@ class GnssConfig:
                 logging.error(f"basic check failed! cannot find {opt} in process_scheme")
                 return False
         # check necessary files
-        for file in files:
-            if not self.get_xml_file(file, check=True, remove=True):
-                logging.error(f"basic check failed! cannot find {file} files")
-                return False
+        with gio.stat_cache():
+            for file in files:
+                if not self.get_xml_file(file, check=True, remove=True):
+                    logging.error(f"basic check failed! cannot find {file} files")
+                    return False
         return True
 
     def copy_sys_data(self):
-        """ copy source_files to process_files """
-        f_rst = []
+        """ copy source_files to process_files, files of link_files are linked instead """
+        items = []
+        keep = set()
+        link_files = self.link_files
+        keep_compressed = self.keep_compressed
+        # static files are linked from the static-data cache if it is configured
+        static_items = []
+        static_files = self.static_files if self.static_cache else []
         for f_type in self.config.options('source_files'):
             if f_type in ['upd_ewl25', 'upd_ewl24', 'upd_ewl', 'upd_wl', 'upd_nl'] and self.upd_mode != 'UPD':
                 continue
@@ -772,25 +1070,28 @@ class GnssConfig:
                 continue
             fs_src = self.get_xml_file(f_type, sec='source_files', check=False)
             fs_dst = self.get_xml_file(f_type, sec='process_files', check=False)
-            if len(fs_src) != len(fs_src):
+            if len(fs_src) != len(fs_dst):
                 logging.warning(f"Number of source files ({f_type}, {len(fs_src)}) is not equal to target "
                                 f"files ({len(fs_dst)})")
-
-            for f1, f2 in zip(fs_src, fs_dst):
-                try:
-                    shutil.copy(f1, f2)
-                except FileNotFoundError:
-                    logging.warning(f'copy failed! file not found {f1}')
-                    continue
-                except shutil.SameFileError:
-                    logging.warning(f'copy failed! files are same {f1}')
-                    continue
-                f_rst.append(os.path.basename(f1))
+            if static_files and f_type in static_files:
+                static_items.extend(zip(fs_src, fs_dst))
+            else:
+                items.extend((f1, f2, f_type in link_files) for f1, f2 in zip(fs_src, fs_dst))
+                if f_type in keep_compressed:
+                    keep.update(fs_dst)
+
+        result = gio.stage_files(items, verify=self.stage_verify, keep=keep)
+        if static_items:
+            cache = StaticCache(self.static_cache, self.static_cache_size * 1e9)
+            result['link'].extend(cache.expose(static_items)['link'])
+        f_rst = [os.path.basename(f) for f in result['copy'] + result['link']]
         if f_rst:
             if len(f_rst) > 6:
                 logging.info(f"files copied to work directory: {', '.join(f_rst[0:6])} ...")
             else:
                 logging.info(f"files copied to work directory: {', '.join(f_rst)}")
+        if result['skip']:
+            logging.info(f"{len(result['skip'])} files are already in work directory")
 
     def set_ref_clk(self, mode='sat', sats=None):
         ref_sats = ['G01', 'G06', 'G08', 'G15', 'E01', 'E02', 'E03', 'C21', 'C22', 'C25', 'C08', 'C11', 'R01', 'R02', 'R05']
@@ -813,6 +1114,50 @@ class GnssConfig:
 
     # -----------------------------------------------------------------------------------
     # get xml nodes
+    @contextmanager
+    def xml_cache(self):
+        """
+        Purpose: reuse the receiver-independent xml nodes, file lists and station coordinates
+                 for all shards of a command, e.g. in GrtCmd.form_cmd
+                     with config.xml_cache():
+                         for sites in shards: ...
+        """
+        if self._xml_cache is not None:
+            yield self
+            return
+        self._xml_cache = {}
+        self._xml_sites = self.site_list
+        try:
+            yield self
+        finally:
+            self._xml_cache = None
+            self._xml_sites = []
+
+    def _xml_state(self) -> tuple:
+        """
+        all settings besides the receivers (time, intv, sys, files ...) and sat_rm, changed e.g. by the setters
+        in a command, the cached nodes are built again if any of them differs (about 10 us per call)
+        """
+        rec_opts = ReceiverRegistry.OPTIONS
+        return tuple((sec, tuple(item for item in self.config.items(sec, raw=True) if item[0] not in rec_opts))
+                     for sec in self.config.sections()) + (tuple(self.sat_rm),)
+
+    def xml_cached(self, key, build):
+        """
+        result of build() memoized by key and the settings inside xml_cache(), computed every time outside
+        a copy is returned, file lists are copied shallow, xml nodes deep (about 5-25 us for a hit,
+        the nodes and file lists take 0.05-1 ms to build)
+        """
+        if self._xml_cache is None:
+            return build()
+        key = (key, self._xml_state())
+        if key not in self._xml_cache:
+            self._xml_cache[key] = build()
+        value = self._xml_cache[key]
+        if isinstance(value, list) and all(isinstance(v, str) for v in value):
+            return list(value)
+        return copy.deepcopy(value)
+
     def get_xml_gen(self, opts: List[str]) -> ET.Element:
         gen = ET.Element('gen')
         beg, end = ET.SubElement(gen, 'beg'), ET.SubElement(gen, 'end')
@@ -835,6 +1180,7 @@ class GnssConfig:
             elem.text = self.estimator
         return gen
 
+    @_xml_cached()
     def get_xml_gns(self) -> List[ET.Element]:
         elems = []
         for gs in self.gsystem:
@@ -852,6 +1198,7 @@ class GnssConfig:
             elems.append(elem)
         return elems
 
+    @_xml_cached()
     def get_xml_ambiguity(self) -> ET.Element:
         amb_dict = default_ambiguity.copy()
         for opt in self.config.options('ambiguity_scheme'):
@@ -873,6 +1220,7 @@ class GnssConfig:
                 elem.text = val
         return amb
 
+    @_xml_cached()
     def get_xml_process(self) -> ET.Element:
         opt_list = ['obs_combination', 'ion_model', 'frequency', 'crd_constr', 'sig_init_crd', 'lsq_mode',
                     'sysbias_model', 'ztd_model', 'ambfix', 'bds2_isb']
@@ -900,6 +1248,7 @@ class GnssConfig:
             elem.text = ' '.join(self.get_xml_file(f, sattype=sattype, check=check))
         return inps
 
+    @_xml_cached()
     def get_xml_turboedit(self, isleo) -> ET.Element:
         tb = ET.Element('turboedit', attrib={'lite_mode': 'true' if self.lite_mode else 'false'})
         if self.lite_mode:
@@ -922,6 +1271,7 @@ class GnssConfig:
                                                           'max_mean_namb': '50' if isleo else '3', 'valid': 'true'})
         return tb
 
+    @_xml_cached('leo_list')
     def get_xml_force(self, sattype='gns') -> ET.Element:
         fm = ET.Element('force_model')
         xml_temp = self.config.get('xml_template', 'oi', fallback='')
@@ -944,19 +1294,35 @@ class GnssConfig:
 
     def get_xml_receiver(self, use_res_crd=False) -> ET.Element:
         receiver = ET.Element('receiver')
+        if self._xml_cache is not None and set(self.site_list).issubset(self._xml_sites):
+            # the coordinates of all sites of the command are read once, then selected for each shard
+            recs = self.xml_cached(('receiver', use_res_crd), lambda: self._receiver_info(self._xml_sites, use_res_crd))
+        else:
+            recs = self._receiver_info(self.site_list, use_res_crd)
+        for site in self.site_list:
+            if site in recs:
+                ET.SubElement(receiver, 'rec', attrib=recs[site])
+        return receiver
+
+    def _receiver_info(self, sites, use_res_crd=False) -> dict:
+        """ attributes of the <rec> elements, {site: info} """
+        recs = {}
         # get coordinates from IGS snx file
-        crd_data = gt.get_crd_snx(' '.join(self.get_xml_file('sinex', check=True, quiet=True)), self.site_list)
+        crd_data = gt.get_crd_snx(' '.join(self.get_xml_file('sinex', check=True, quiet=True)), sites)
         # get coordinates from GREAT residuals file
         if use_res_crd:
             f_res = self.get_xml_file('recover_in', check=True)
             if f_res:
-                crd_res = gt.get_crd_res(f_res[0], self.site_list)
+                crd_res = gt.get_crd_res(f_res[0], sites)
                 crd_data = crd_data.append(crd_res)
         if crd_data.empty:
-            return receiver
-        # get receiver elements
-        for site in self.site_list:
-            df = crd_data[crd_data.site == site]
+            return recs
+        # get receiver elements, records are grouped by site once instead of filtering the table for each site
+        groups = dict(tuple(crd_data.groupby('site')))
+        for site in sites:
+            if site not in groups:
+                continue
+            df = groups[site]
             df_x = df[df.type == 'crd_x'].sort_values(by=['obj'], ascending=False)
             df_y = df[df.type == 'crd_y'].sort_values(by=['obj'], ascending=False)
             df_z = df[df.type == 'crd_z'].sort_values(by=['obj'], ascending=False)
@@ -975,9 +1341,8 @@ class GnssConfig:
                 info['rec'] = df[df.type == 'rec']['val'].values[0]
             if not df[df.type == 'ant'].empty:
                 info['ant'] = df[df.type == 'ant']['val'].values[0]
-            ET.SubElement(receiver, 'rec', attrib=info)
-
-        return receiver
+            recs[site] = info
+        return recs
 
 
-__all__ = ['GnssConfig']
+__all__ = ['GnssConfig', 'ReceiverRegistry']
@@ -1,18 +1,23 @@
 import time
-import numpy as np
-import pandas as pd
 import os
 import logging
 import math
 import datetime
 from .gnss_time import GnssTime, hms2sod, sod2hms
-from .constants import gns_name, leo_df
+from .constants import gns_name, leo_sat, MAX_THREAD
+from .gnss_ambflag import IntervalIndex, clean_ambflag_file, switch_ambflag_all, conv_ambflag_file, conv_ambflag_files
+from .gnss_clock import read_clock
+from .gnss_io import open_gnss, cached_isfile
+from .lazy_import import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 
 
 def read_site_list(f_list):
     """ read a site list file """
     try:
-        with open(f_list) as f:
+        with open_gnss(f_list) as f:
             lines = f.readlines()
             return [line[1:5].lower() for line in lines if line.startswith(' ')]
     except FileNotFoundError:
@@ -23,7 +28,7 @@ def read_site_list(f_list):
 def read_sp3_file(f_sp3):
     start = time.time()
     try:
-        with open(f_sp3) as f:
+        with open_gnss(f_sp3) as f:
             lines = f.readlines()
     except FileNotFoundError:
         logging.warning(f"file not found {f_sp3}")
@@ -71,29 +76,11 @@ def read_sp3_file(f_sp3):
 
 
 def read_rnxc_file(f_name, mode="AS"):
+    """ AS (satellite) or AR (receiver) clocks of a RINEX clock file, columns epoch, sod, name, clk """
     if not os.path.isfile(f_name):
         logging.error(f"file not found {f_name}")
         return
-
-    data = []
-    mode = mode + ' '
-    with open(f_name) as f:
-        for line in f:
-            if line[0:3] != mode:
-                continue
-            if len(line) < 59:
-                continue
-            name = line[3:7].strip()
-            year = int(line[8:12])
-            mon = int(line[13:15])
-            dd = int(line[16:18])
-            sod = int(line[19:21]) * 3600 + int(line[22:24]) * 60 + float(line[25:34])
-            epoch = GnssTime.from_ymd(year, mon, dd, sod)
-            value = float(line[37:59])
-            sat_dict = {'epoch': epoch.mjd + epoch.sod / 86400.0, 'sod': sod, 'name': name, 'clk': value}
-            data.append(sat_dict)
-
-    return pd.DataFrame(data)
+    return read_clock(f_name).to_frame(mode)
 
 
 def read_rnxo_file(f_name):
@@ -103,7 +90,7 @@ def read_rnxo_file(f_name):
         return
 
     obs_type = {}
-    with open(f_name) as file_object:
+    with open_gnss(f_name) as file_object:
         lines = file_object.readlines()
 
     # read rnxo header
@@ -203,7 +190,7 @@ def read_rnxo_file(f_name):
 
 def read_res_file(f_res):
     try:
-        with open(f_res) as file_object:
+        with open_gnss(f_res) as file_object:
             lines = file_object.readlines()
     except FileNotFoundError:
         logging.warning(f"file not found {f_res}")
@@ -241,7 +228,7 @@ def read_res_file(f_res):
 
 def read_clkdif_sum(f_name, mjd, ref_sat=""):
     try:
-        with open(f_name) as f:
+        with open_gnss(f_name) as f:
             lines = f.readlines()
     except FileNotFoundError:
         logging.error(f"file not found {f_name}")
@@ -277,7 +264,7 @@ def read_clkdif_sum(f_name, mjd, ref_sat=""):
 
 def read_time_info_new(file):
     try:
-        with open(file) as file_object:
+        with open_gnss(file) as file_object:
             lines = file_object.readlines()
     except FileNotFoundError:
         logging.warning(f"file not found {file}")
@@ -345,7 +332,7 @@ def sum_clkdif(f_list, mjds, mode=None):
 
 def read_orbdif_sum(f_name):
     try:
-        with open(f_name) as f:
+        with open_gnss(f_name) as f:
             lines = f.readlines()
     except FileNotFoundError:
         logging.error(f"file not found {f_name}")
@@ -406,7 +393,7 @@ def read_orbdif_sum(f_name):
 
 def read_orbdif_file(f_name):
     try:
-        with open(f_name) as f:
+        with open_gnss(f_name) as f:
             lines = f.readlines()
     except FileNotFoundError:
         logging.error(f"file not found {f_name}")
@@ -542,7 +529,7 @@ def isint(value):
 def check_ambflag(f_ambflag, nobs=1000):
     """ check if the ambflag file is correct"""
     try:
-        with open(f_ambflag) as f:
+        with open_gnss(f_ambflag) as f:
             lfound = False
             num = 0
             for line in f:
@@ -563,109 +550,55 @@ def check_ambflag(f_ambflag, nobs=1000):
 
 
 def switch_ambflag(config, old='AMB ', new='IAM ', mode='123'):
-    if '2' in mode:
-        f_ambflag = config.get_filename('ambflag', check=True)
-        for f_name in f_ambflag.split():
-            alter_file(f_name, old, new)
-    if '3' in mode:
-        f_ambflag = config.get_filename('ambflag13', check=True)
-        for f_name in f_ambflag.split():
-            alter_file(f_name, old, new)
-    if '4' in mode:
-        f_ambflag = config.get_filename('ambflag14', check=True)
-        for f_name in f_ambflag.split():
-            alter_file(f_name, old, new)
-    if '5' in mode:
-        f_ambflag = config.get_filename('ambflag15', check=True)
-        for f_name in f_ambflag.split():
-            alter_file(f_name, old, new)
-
-
-def conv_ambflag_all(old_dir, new_dir):
+    """ switch the flags of ambflag files, all files are edited in parallel """
+    files = []
+    for key, f_type in zip('2345', ['ambflag', 'ambflag13', 'ambflag14', 'ambflag15']):
+        if key in mode:
+            files.extend(config.get_filename(f_type, check=True).split())
+    switch_ambflag_all(files, old, new)
+
+
+def conv_ambflag_all(old_dir, new_dir, nthread=MAX_THREAD):
     if not os.path.isdir(old_dir):
         logging.error(f"path not exists {old_dir}")
         return
     if not os.path.isdir(new_dir):
         os.makedirs(new_dir)
-    num = 0
+    pairs = []
     for file in os.listdir(old_dir):
         n = len(file)
         if n < 7:
             continue
         if file[n-5: n] == "o.log" or file[n-7: n] in ["o.log13", "o.log14", "o.log15"]:
-            file_new = os.path.join(new_dir, file)
-            conv_ambflag_panda2great(os.path.join(old_dir, file), file_new)
-            num += 1
+            pairs.append((os.path.join(old_dir, file), os.path.join(new_dir, file)))
+    num = conv_ambflag_files(pairs, nthread)
     logging.info(f"{num} ambflag files are converted to GREAT format")
 
 
 def conv_ambflag_panda2great(file, file_new):
-    try:
-        with open(file) as f:
-            lines = f.readlines()
-    except FileNotFoundError:
-        logging.warning(f"file not found {file}")
-        return
-    # get ambflag header
-    file_data = ""
-    data = []
-    for line in lines:
-        if line[0] == '%':
-            file_data += line
-        elif line[0:3] in ['IAM', 'AMB', 'DEL', 'BAD']:
-            data.append({'sat': line[4:7], 'iepo': int(line[7:14]), 'jepo': int(line[14:21]),
-                         'flag': line[0:3], 'other': line[21:]})
-
-    df = pd.DataFrame(data)
-    df = df.sort_values(by=['sat', 'iepo'])
-    for _, row in df.iterrows():
-        file_data += f"{row['flag']} {row['sat']}{row['iepo']:>7d}{row['jepo']:>7d}{row['other']}"
-    with open(file_new, 'w') as f:
-        f.write(file_data)
+    """ PANDA ambflag => GREAT ambflag (records sorted by satellite and epoch) """
+    return conv_ambflag_file(file, file_new)
 
 
 def clean_ambflag(f_name, data):
-    try:
-        with open(f_name) as f:
-            lines = f.readlines()
-    except FileNotFoundError:
+    """ IAM => AMB if an arc in data (sat, iepo, jepo, in 10 s) is inside the IAM arc """
+    if not os.path.isfile(f_name):
         logging.warning(f"file not found {f_name}")
         return
-
-    file_data = ""
-    for line in lines:
-        if line[0] == '%':
-            file_data += line
-        elif line[0:3] in ['AMB', 'DEL', 'BAD']:
-            file_data += line
-        elif line[0:3] == 'IAM':
-            sat = line[4:7]
-            iepo = int(line[7:14])
-            jepo = int(line[14:21])
-            x = data[(data.sat == sat) & (data.iepo * 10 > iepo - 9) & (data.jepo * 10 < jepo + 10)]
-            if not x.empty:
-                line = line.replace('IAM', 'AMB')
-                file_data += line
-            else:
-                file_data += line
-
-    if not os.path.isfile(f"{f_name}.bak"):
-        os.rename(f_name, f"{f_name}.bak")
-    with open(f_name, 'w') as f:
-        f.write(file_data)
+    clean_ambflag_file(f_name, IntervalIndex.from_frame(data, 10))
 
 
 def check_rnxo_ant(f_rnxo, f_atx, change=True):
     """ check if the antenna of RINEXO file in igs14.atx """
-    if not os.path.isfile(f_rnxo):
+    if not cached_isfile(f_rnxo):
         logging.warning(f"rinexo file not found {f_rnxo}")
         return False
-    if not os.path.isfile(f_atx):
+    if not cached_isfile(f_atx):
         logging.warning(f"atx file not found {f_atx}")
         return False
 
     rnxo_ant = ""
-    with open(f_rnxo) as f:
+    with open_gnss(f_rnxo) as f:
         for line in f:
             if line.find("ANT #") == 60:
                 rnxo_ant = line[20:40]
@@ -678,7 +611,7 @@ def check_rnxo_ant(f_rnxo, f_atx, change=True):
         return False
 
     atx_ant = ""
-    with open(f_atx) as f:
+    with open_gnss(f_atx) as f:
         for line in f:
             if line[0:16] == rnxo_ant[0:16]:
                 atx_ant = line[0:20]
@@ -700,11 +633,11 @@ def check_rnxo_ant(f_rnxo, f_atx, change=True):
 def check_att_file(f_att):
     """ modify the attitude file header """
     sat = os.path.basename(f_att).split('_')[-1]
-    if not sat.lower() in list(leo_df.svn):
+    if leo_sat(sat.lower(), 'svn') is None:
         logging.warning(f"Unknown LEO satellite {sat} in att file name")
         return False
     if os.path.isfile(f_att):
-        with open(f_att) as file_object:
+        with open_gnss(f_att) as file_object:
             lines = file_object.readlines()
         pos = 0
         for i in range(len(lines)):
@@ -782,3 +715,10 @@ def alter_file_content(file, old_str, new_str, end="", count=0):
             file_data += line
     with open(file, "w", encoding="utf-8") as f:
         f.write(file_data)
+
+
+__all__ = ['read_site_list', 'read_sp3_file', 'read_rnxc_file', 'read_rnxo_file', 'read_res_file',
+           'read_clkdif_sum', 'read_time_info_new', 'sum_clkdif', 'read_orbdif_sum', 'read_orbdif_file',
+           'sum_orbdif', 'rms_val', 'isfloat', 'isint', 'check_ambflag', 'switch_ambflag',
+           'conv_ambflag_all', 'conv_ambflag_panda2great', 'clean_ambflag', 'check_rnxo_ant',
+           'check_att_file', 'alter_file', 'alter_file_content']
@@ -0,0 +1,282 @@
+import os
+import re
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from .gnss_time import GnssTime, doy2mjd
+
+# variables of the file templates besides the references to other options (${common:gnss_data})
+_TIME_VARS = {'yyyy': r'\d{4}', 'ddd': r'\d{3}', 'yy': r'\d{2}', 'mm': r'\d{2}', 'hh': r'\d{2}', 'gwk': r'\d{4}',
+              'gwkd': r'\d{5}'}
+_REC_VARS = {'rec': r'[^/\\]+?', 'rec_u': r'[^/\\]+?', 'rec_l': r'[^/\\]+?'}
+_VAR = re.compile(r'\$\{([^}]+)\}')
+# shared by all configs of a process, {(db, roots): FileIndex}
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _norm(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _template_mjd(vals):
+    """ day (MJD) of the time variables of a matched file name, None if not known """
+    if 'ddd' in vals and ('yyyy' in vals or 'yy' in vals):
+        year = int(vals['yyyy']) if 'yyyy' in vals else 2000 + int(vals['yy'])
+        if 'yyyy' not in vals and year > 2079:
+            year -= 100
+        return doy2mjd(year, int(vals['ddd']))
+    if 'gwkd' in vals:
+        return 44244 + int(vals['gwkd'][0:4]) * 7 + int(vals['gwkd'][4])
+    if 'gwk' in vals:
+        return 44244 + int(vals['gwk']) * 7
+    return None
+
+
+class FileIndex:
+    """
+    Purpose: availability index of archive directories (roots), kept in SQLite (or in memory)
+             scan()     walks the roots once, later incrementally: only directories whose mtime changed are listed,
+                        i.e. the index follows added and removed files, sizes of rewritten files may be outdated
+             exists()   existence of a path below a root from the in-memory set, None if not below a root,
+                        files written since the last scan (e.g. during a run) are only found after the next one
+             classify() matches the indexed files with the file templates of a config section,
+                        e.g. [source_files], => (file type, day, receiver)
+             coverage() days and receivers found per file type
+    """
+
+    def __init__(self, db='', roots=(), ttl=600):
+        self.db = db or ':memory:'
+        self.roots = [_norm(r) for r in roots if r]
+        self.ttl = ttl
+        self._paths = set()
+        self._scanned = 0.0
+        self._con = sqlite3.connect(self.db, timeout=60, check_same_thread=False)
+        self._con.executescript("""
+            CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime INTEGER);
+            CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, dir TEXT, size INTEGER, mtime INTEGER);
+            CREATE TABLE IF NOT EXISTS entries (ftype TEXT, mjd INTEGER, rec TEXT, path TEXT);
+            CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+            CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+            CREATE INDEX IF NOT EXISTS entries_key ON entries (ftype, mjd, rec);
+        """)
+
+    @classmethod
+    def from_config(cls, config):
+        """ the index of [common] file_index (shared in the process), None if it is not configured """
+        db = config.file_index
+        if not db:
+            return None
+        key = (db, tuple(config.index_roots))
+        with _lock:
+            if key not in _indexes:
+                _indexes[key] = cls(db if db != 'memory' else '', config.index_roots, config.index_ttl)
+            return _indexes[key]
+
+    def _walk(self, root):
+        """ update the directories below root, return the number of directories listed """
+        known = {row[0]: row[1] for row in self._con.execute("SELECT path, mtime FROM dirs")}
+        todo = [root]
+        listed = 0
+        seen = set()
+        while todo:
+            path = todo.pop()
+            seen.add(path)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if known.get(path) == mtime:
+                todo.extend(row[0] for row in self._con.execute("SELECT path FROM dirs WHERE parent=?", (path,)))
+                continue
+            listed += 1
+            files, subdirs = [], []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir():
+                                subdirs.append(_norm(entry.path))
+                            elif entry.is_file():
+                                st = entry.stat()
+                                files.append((_norm(entry.path), path, st.st_size, st.st_mtime_ns))
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+            self._con.execute("DELETE FROM files WHERE dir=?", (path,))
+            self._con.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", files)
+            self._con.execute("DELETE FROM dirs WHERE parent=? AND path NOT IN (%s)" % ','.join('?' * len(subdirs)),
+                              [path] + subdirs)
+            self._con.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)",
+                              (path, os.path.dirname(path) if path != root else '', mtime))
+            # new sub-directories are listed (their mtime is not known yet)
+            todo.extend(subdirs)
+        # directories removed since the last scan
+        for path in [p for p in known if (p == root or p.startswith(root + os.sep)) and p not in seen]:
+            self._con.execute("DELETE FROM dirs WHERE path=?", (path,))
+            self._con.execute("DELETE FROM files WHERE dir=?", (path,))
+        return listed
+
+    def scan(self, force=False):
+        """ update the index of all roots, at most once per ttl seconds unless force """
+        if not force and time.time() - self._scanned < self.ttl:
+            return
+        start = time.time()
+        with _lock:
+            listed = sum(self._walk(root) for root in self.roots)
+            self._con.commit()
+            self._paths = {row[0] for row in self._con.execute("SELECT path FROM files")}
+            self._scanned = time.time()
+        logging.info(f"file index updated in {time.time() - start:.2f} sec, {len(self._paths)} files, "
+                     f"{listed} directories listed")
+
+    def covers(self, path):
+        p = _norm(path)
+        return any(p == r or p.startswith(r + os.sep) for r in self.roots)
+
+    def exists(self, path):
+        """ True/False if path is below a root of the index, None otherwise (to be checked on the disk) """
+        if not self.roots or not self.covers(path):
+            return None
+        self.scan()
+        return _norm(path) in self._paths
+
+    def stat(self, path):
+        """ (size, mtime_ns) of an indexed file, None if not found """
+        row = self._con.execute("SELECT size, mtime FROM files WHERE path=?", (_norm(path),)).fetchone()
+        return tuple(row) if row else None
+
+    # ---------------------------------------------------------------------------------------------
+    # file types
+    @staticmethod
+    def template_regex(config, f_type, sec='source_files'):
+        """ regular expression of the file names of a template, variables as named groups """
+        raw = config.config.get(sec, f_type, raw=True, fallback='')
+        if not raw:
+            return None
+        tokens = []
+        pos = 0
+        for m in _VAR.finditer(raw):
+            tokens.append((False, raw[pos:m.start()]))
+            name = m.group(1)
+            if name in _TIME_VARS or name in _REC_VARS:
+                tokens.append((True, name))
+            else:
+                # reference to another option, e.g. ${common:gnss_data} or ${process_scheme:cen}
+                s, _, opt = name.rpartition(':')
+                tokens.append((False, config.config.get(s or sec, opt, fallback='')))
+            pos = m.end()
+        tokens.append((False, raw[pos:]))
+
+        # the literal head is normalized as the indexed paths
+        ivar = next((i for i, t in enumerate(tokens) if t[0]), len(tokens))
+        head = ''.join(t[1] for t in tokens[0:ivar])
+        d = os.path.dirname(head)
+        pattern = re.escape(_norm(d) + head[len(d):] if d else _norm('.') + os.sep + head)
+        groups = set()
+        for is_var, text in tokens[ivar:]:
+            if not is_var:
+                pattern += re.escape(os.path.normcase(text))
+            elif text in groups:
+                pattern += f'(?P={text})'
+            else:
+                pattern += f'(?P<{text}>{_TIME_VARS.get(text) or _REC_VARS[text]})'
+                groups.add(text)
+        return re.compile(pattern)
+
+    def classify(self, config, sec='source_files', f_types=None):
+        """ (re)build the entries (file type, day, receiver) of the templates of a config section """
+        self.scan()
+        f_types = f_types or config.config.options(sec)
+        paths = sorted(self._paths)
+        with _lock:
+            for f_type in f_types:
+                regex = self.template_regex(config, f_type, sec)
+                if regex is None:
+                    continue
+                rows = []
+                for p in paths:
+                    m = regex.fullmatch(p)
+                    if m:
+                        vals = m.groupdict()
+                        rec = vals.get('rec') or vals.get('rec_u') or vals.get('rec_l') or ''
+                        rows.append((f_type, _template_mjd(vals), rec.lower(), p))
+                self._con.execute("DELETE FROM entries WHERE ftype=?", (f_type,))
+                self._con.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)", rows)
+            self._con.commit()
+
+    def lookup(self, f_type, mjd=None, rec=None):
+        """ indexed files of a type (and day and receiver) """
+        sql, args = "SELECT path FROM entries WHERE ftype=?", [f_type]
+        if mjd is not None:
+            sql += " AND mjd=?"
+            args.append(int(mjd))
+        if rec is not None:
+            sql += " AND rec=?"
+            args.append(rec.lower())
+        return [row[0] for row in self._con.execute(sql, args)]
+
+    def coverage(self, f_types=None, mjd_beg=None, mjd_end=None):
+        """ {file type: {'days': {mjd: number of receivers or files}, 'missing': [mjd, ...]}} """
+        result = {}
+        rows = self._con.execute("SELECT ftype, mjd, COUNT(DISTINCT rec), COUNT(*) FROM entries "
+                                 "GROUP BY ftype, mjd").fetchall()
+        for ftype, mjd, nrec, nfile in rows:
+            if f_types and ftype not in f_types:
+                continue
+            if mjd is not None and ((mjd_beg is not None and mjd < mjd_beg) or (mjd_end is not None and mjd > mjd_end)):
+                continue
+            days = result.setdefault(ftype, {'days': {}, 'missing': []})['days']
+            days[mjd] = nrec if nrec > 1 else nfile
+        for ftype in (f_types or list(result)):
+            info = result.setdefault(ftype, {'days': {}, 'missing': []})
+            days = [d for d in info['days'] if d is not None]
+            beg = mjd_beg if mjd_beg is not None else min(days, default=0)
+            end = mjd_end if mjd_end is not None else max(days, default=-1)
+            info['missing'] = [d for d in range(beg, end + 1) if d not in info['days']]
+        return result
+
+
+def coverage_report(config, t_beg: GnssTime, t_end: GnssTime, f_types=None, sec='source_files'):
+    """ text lines of the days and receivers found per file type in [t_beg, t_end] """
+    index = FileIndex.from_config(config) or FileIndex('', config.index_roots)
+    index.classify(config, sec, f_types)
+    cov = index.coverage(f_types, t_beg.mjd, t_end.mjd)
+    lines = [f"{'type':16s} {'days':>5s} {'missing':>7s} {'min/max':>9s}  missing days"]
+    ndays = t_end.mjd - t_beg.mjd + 1
+    for ftype, info in sorted(cov.items()):
+        counts = [n for d, n in info['days'].items() if d is not None]
+        span = f"{min(counts, default=0)}/{max(counts, default=0)}"
+        missing = ' '.join(f"{GnssTime(d, 0).year}-{GnssTime(d, 0).doy:0>3d}" for d in info['missing'][0:10])
+        if len(info['missing']) > 10:
+            missing += ' ...'
+        lines.append(f"{ftype:16s} {len(counts):5d} {ndays - len(counts):7d} {span:>9s}  {missing}")
+    return lines
+
+
+def main():
+    from .gnss_config import GnssConfig
+    parser = argparse.ArgumentParser(description='Data availability of a campaign from the file index')
+    parser.add_argument('cf', help='config file')
+    parser.add_argument('-b', dest='beg', required=True, help='begin date: yyyy-ddd')
+    parser.add_argument('-e', dest='end', required=True, help='end date: yyyy-ddd')
+    parser.add_argument('-t', dest='types', nargs='*', help='file types (default all of the section)')
+    parser.add_argument('-sec', dest='sec', default='source_files', help='section of the file templates')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)8s: %(message)s')
+    config = GnssConfig.from_file(args.cf)
+    t_beg = GnssTime(doy2mjd(*[int(x) for x in args.beg.split('-')]), 0)
+    t_end = GnssTime(doy2mjd(*[int(x) for x in args.end.split('-')]), 0)
+    print('\n'.join(coverage_report(config, t_beg, t_end, args.types, args.sec)))
+    return 0
+
+
+__all__ = ['FileIndex', 'coverage_report']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,480 @@
+import io
+import os
+import bz2
+import lzma
+import zlib
+import shutil
+import stat
+import hashlib
+import logging
+import subprocess
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from .constants import MAX_THREAD
+
+try:
+    import zstandard
+except ImportError:  # optional, the zstd command is used instead
+    zstandard = None
+
+_BUF_SIZE = 1024 * 1024
+# compressed variants searched when a source file is not found
+_COMP_SUFFIX = ['.gz', '.Z', '.bz2', '.zst', '.xz']
+# compression formats by magic bytes
+_MAGIC = [(b'\x1f\x8b', 'gz'), (b'\x1f\x9d', 'Z'), (b'BZh', 'bz2'), (b'\x28\xb5\x2f\xfd', 'zst'),
+          (b'\xfd7zXZ\x00', 'xz')]
+# exit codes of the decompressing processes which are only warnings
+_WARNING_CODES = {'gzip': 2, 'crx2rnx': 2}
+# {absolute path: os.stat_result or None} inside stat_cache(), None outside
+_stat_cache = None
+# number of threads inside stat_cache(), the lock guards both
+_stat_depth = 0
+_stat_lock = threading.Lock()
+# root of the binary caches of parsed products (UPD, clock files), see set_product_cache
+_DEFAULT_PRODUCT_CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join('~', '.cache'), 'gnss_scripts')
+_product_cache = os.path.expanduser(_DEFAULT_PRODUCT_CACHE)
+
+
+def _is_crinex(f_name, head: bytes):
+    """ Hatanaka compressed RINEX (CRINEX) """
+    return head[60:80].startswith(b'CRINEX VERS') or f_name.endswith('.crx') or \
+        (len(f_name) > 3 and f_name[-4] == '.' and f_name[-1] in 'dD' and f_name[-3:-1].isdigit())
+
+
+def compression(f_name):
+    """ 'gz', 'Z', 'bz2', 'zst' or 'xz' from the magic bytes of the file, '' if not compressed """
+    with open(f_name, 'rb') as f:
+        head = f.read(6)
+    for magic, comp in _MAGIC:
+        if head.startswith(magic):
+            return comp
+    return ''
+
+
+class _GzipReader(io.RawIOBase):
+    """ members of a gzip file, trailing garbage (common in archived products) is ignored as by gzip -dq """
+
+    def __init__(self, f_name):
+        super().__init__()
+        self._f = open(f_name, 'rb')
+        self._dec = zlib.decompressobj(31)
+        self._pending = b''
+        self._buf = b''
+        self.name = f_name
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        while not self._buf and self._dec is not None:
+            if self._dec.eof:
+                rest = self._dec.unused_data + self._pending
+                if len(rest) < 2:
+                    rest += self._f.read(_BUF_SIZE)
+                if rest.startswith(b'\x1f\x8b'):
+                    # the next member
+                    self._dec = zlib.decompressobj(31)
+                    self._pending = rest
+                    continue
+                if rest.strip(b'\x00'):
+                    logging.warning(f"trailing garbage ignored in {self.name}")
+                self._dec = None
+                return
+            data = self._dec.unconsumed_tail or self._pending or self._f.read(_BUF_SIZE)
+            self._pending = b''
+            if not data:
+                raise EOFError(f"compressed file ended before the end-of-stream marker {self.name}")
+            self._buf = self._dec.decompress(data, _BUF_SIZE)
+
+    def readinto(self, b):
+        self._fill()
+        n = min(len(b), len(self._buf))
+        b[0:n] = self._buf[0:n]
+        self._buf = self._buf[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+        super().close()
+
+
+class _ProcReader(io.RawIOBase):
+    """ stdout of a decompressing process, the process is waited for (and its exit code checked) on close """
+
+    def __init__(self, proc, name, feeder=None):
+        super().__init__()
+        self._proc = proc
+        self._feeder = feeder
+        self._size = 0
+        self.name = name
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self._proc.stdout.readinto(b)
+        self._size += n or 0
+        return n
+
+    def close(self):
+        if self.closed:
+            return
+        eof = not self._proc.stdout.read(1)
+        self._proc.stdout.close()
+        if not eof:
+            # closed before the end, e.g. only the header is read
+            self._proc.kill()
+        code = self._proc.wait()
+        if self._feeder is not None:
+            self._feeder.join()
+        super().close()
+        if not eof or code == 0:
+            return
+        # gzip and crx2rnx exit with 2 on warnings, e.g. trailing garbage of archived .Z files
+        if code == _WARNING_CODES.get(os.path.basename(self._proc.args[0])) and self._size > 0:
+            logging.warning(f"{self._proc.args[0]} warnings for {self.name}")
+            return
+        raise OSError(f"{self._proc.args[0]} failed for {self.name} (exit code {code})")
+
+
+def _feed(fin, fout):
+    try:
+        _copy_stream(fin, fout)
+    except (OSError, ValueError):
+        # the reader was closed early
+        pass
+    finally:
+        fin.close()
+        try:
+            fout.close()
+        except OSError:
+            pass
+
+
+def _open_stream(f_name):
+    """ buffered binary stream of the uncompressed content, compression detected by magic bytes """
+    comp = compression(f_name)
+    if comp == 'gz':
+        stream = _GzipReader(f_name)
+    elif comp == 'bz2':
+        stream = bz2.open(f_name, 'rb')
+    elif comp == 'xz':
+        stream = lzma.open(f_name, 'rb')
+    elif comp == 'zst' and zstandard is not None:
+        stream = zstandard.ZstdDecompressor().stream_reader(open(f_name, 'rb'), read_size=_BUF_SIZE,
+                                                            closefd=True)
+    elif comp in ['Z', 'zst']:
+        # gzip is able to decompress the LZW (.Z) format, zstd decompresses in its own process
+        cmd = ['gzip', '-dcq', f_name] if comp == 'Z' else ['zstd', '-dcq', f_name]
+        stream = _ProcReader(subprocess.Popen(cmd, stdout=subprocess.PIPE), f_name)
+    else:
+        stream = open(f_name, 'rb', buffering=_BUF_SIZE)
+    if not hasattr(stream, 'peek'):
+        stream = io.BufferedReader(stream, _BUF_SIZE)
+    return stream
+
+
+def open_gnss(f_name, mode='r', encoding=None, errors=None):
+    """
+    Purpose: open a file for reading whatever its compression: plain, gz, Z, bz2, zst, xz and Hatanaka
+             (crx2rnx must be in PATH), decompressed while reading, e.g.
+                 with open_gnss('brdm0010.21p.gz') as f:
+                     for line in f: ...
+    Inputs : mode   'r' (text) or 'rb' (binary)
+    """
+    if mode not in ['r', 'rt', 'rb']:
+        raise ValueError(f"open_gnss is read only, mode {mode}")
+    stream = _open_stream(f_name)
+    if _is_crinex('', stream.peek(80)[0:80]):
+        crx = subprocess.Popen(['crx2rnx', '-'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        feeder = threading.Thread(target=_feed, args=(stream, crx.stdin), daemon=True)
+        feeder.start()
+        stream = io.BufferedReader(_ProcReader(crx, f_name, feeder), _BUF_SIZE)
+    if mode == 'rb':
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding, errors=errors)
+
+
+def _copy_stream(fin, fout, digest=None):
+    while True:
+        chunk = fin.read(_BUF_SIZE)
+        if not chunk:
+            break
+        if digest is not None:
+            digest.update(chunk)
+        fout.write(chunk)
+
+
+def decompress_file(f_in, f_out, digest=None):
+    """
+    Purpose: stream f_in (plain, gz, Z, bz2, zst, xz, Hatanaka or any combination) to f_out
+    Return : sha256 of the written content if digest (hashlib object) is given
+    """
+    tmp = f"{f_out}.{os.getpid()}.tmp"
+    if digest is None and not compression(f_in) and not _is_crinex(f_in, b''):
+        with open(f_in, 'rb') as f:
+            head = f.read(80)
+        if not _is_crinex('', head):
+            # plain file, let shutil use the fastest copy of the platform
+            shutil.copyfile(f_in, tmp)
+            os.replace(tmp, f_out)
+            return None
+
+    try:
+        with open_gnss(f_in, 'rb') as fin, open(tmp, 'wb') as fout:
+            _copy_stream(fin, fout, digest)
+        os.replace(tmp, f_out)
+    except BaseException:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+        raise
+    return digest.hexdigest() if digest is not None else None
+
+
+@contextmanager
+def stat_cache():
+    """
+    Purpose: memoize isfile and getsize of this module inside a stage, e.g. for the repeated
+             resolution of the files of a config in form_xml and basic_check
+                 with stat_cache():
+                     ...
+             the cache is shared by the threads inside a block and dropped when the last one leaves,
+             files written inside the block are to be announced by invalidate_stat
+    """
+    global _stat_cache, _stat_depth
+    with _stat_lock:
+        if _stat_depth == 0:
+            _stat_cache = {}
+        _stat_depth += 1
+    try:
+        yield
+    finally:
+        with _stat_lock:
+            _stat_depth -= 1
+            if _stat_depth == 0:
+                _stat_cache = None
+
+
+def invalidate_stat(paths=None, below=''):
+    """ forget the cached stat of paths, of all paths below a directory or (both empty) of all paths """
+    with _stat_lock:
+        if _stat_cache is None:
+            return
+        if paths is None and not below:
+            _stat_cache.clear()
+            return
+        for f_name in paths or []:
+            _stat_cache.pop(os.path.abspath(f_name), None)
+        if below:
+            top = os.path.join(os.path.abspath(below), '')
+            for f_name in [f for f in _stat_cache if f.startswith(top)]:
+                del _stat_cache[f_name]
+
+
+def _stat(f_name):
+    """ os.stat of a file (following links), None if not found """
+    cache = _stat_cache
+    if cache is None:
+        try:
+            return os.stat(f_name)
+        except (OSError, ValueError):
+            return None
+    key = os.path.abspath(f_name)
+    with _stat_lock:
+        if key in cache:
+            return cache[key]
+    # the stat itself is not done under the lock, concurrent misses of a path give the same result
+    try:
+        st = os.stat(key)
+    except (OSError, ValueError):
+        st = None
+    with _stat_lock:
+        cache[key] = st
+    return st
+
+
+def cached_isfile(f_name):
+    """ os.path.isfile, cached inside stat_cache() """
+    st = _stat(f_name) if f_name else None
+    return st is not None and stat.S_ISREG(st.st_mode)
+
+
+def cached_getsize(f_name):
+    """ os.path.getsize, cached inside stat_cache() """
+    st = _stat(f_name)
+    if st is None:
+        raise FileNotFoundError(f"file not found {f_name}")
+    return st.st_size
+
+
+def find_source(f_name):
+    """ the file itself, or a compressed variant of it, None if not found """
+    if cached_isfile(f_name):
+        return f_name
+    for suffix in _COMP_SUFFIX:
+        if cached_isfile(f_name + suffix):
+            return f_name + suffix
+    return None
+
+
+class ProductMemo:
+    """
+    Purpose: in-process memo of parsed products, {key: (size, mtime_ns, product)} of the maxsize files
+             used last, so that loops over a campaign do not keep every file read; maxsize 0 disables it
+    """
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, stamp):
+        """ the product of key if it is memoized with the same (size, mtime_ns), None otherwise """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] != tuple(stamp):
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key, stamp, product):
+        with self._lock:
+            self._items[key] = (tuple(stamp), product)
+            self._items.move_to_end(key)
+            while len(self._items) > max(0, self.maxsize):
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+def set_product_cache(path):
+    """ root directory of the binary caches of parsed products, empty for ~/.cache/gnss_scripts """
+    global _product_cache
+    _product_cache = os.path.abspath(os.path.expanduser(path or _DEFAULT_PRODUCT_CACHE))
+
+
+def product_cache_file(f_name, kind):
+    """ binary cache of a product below the cache root, the sub-directories mirror its absolute path """
+    path = os.path.splitdrive(os.path.abspath(f_name))[1].lstrip('\\/')
+    return os.path.join(_product_cache, kind, f"{path}.npz")
+
+
+def save_product_cache(f_npz, save):
+    """ save(f_npz) into the cache directory, silently skipped if the cache root is not writable """
+    try:
+        os.makedirs(os.path.dirname(f_npz), exist_ok=True)
+        save(f_npz)
+    except OSError as e:
+        logging.debug(f"product cache not written {f_npz}: {e}")
+        return False
+    return True
+
+
+def _file_hash(f_name):
+    h = hashlib.sha256()
+    with open(f_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(_BUF_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _is_staged(src, dst, link, check):
+    """ dst is already staged from src and identical """
+    if link:
+        return os.path.islink(dst) and os.readlink(dst) == os.path.abspath(src)
+    if os.path.islink(dst) or not os.path.isfile(dst):
+        return False
+    st1, st2 = os.stat(src), os.stat(dst)
+    if st1.st_mtime_ns != st2.st_mtime_ns:
+        return False
+    # decompressed on the fly (unless kept compressed, then the sizes are the same)
+    unpacked = (src.endswith(tuple(_COMP_SUFFIX)) or _is_crinex(src, b'')) and st1.st_size != st2.st_size
+    if not unpacked and st1.st_size != st2.st_size:
+        return False
+    if check != 'hash':
+        return True
+    if unpacked:
+        digest = hashlib.sha256()
+        with open_gnss(src, 'rb') as fin:
+            for chunk in iter(lambda: fin.read(_BUF_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest() == _file_hash(dst)
+    return _file_hash(src) == _file_hash(dst)
+
+
+def _stage_one(src, dst, link, verify, keep=False):
+    if link:
+        if os.path.lexists(dst):
+            os.remove(dst)
+        os.symlink(os.path.abspath(src), dst)
+        return 'link'
+    if keep:
+        # compressed copy, read by open_gnss
+        tmp = f"{dst}.{os.getpid()}.tmp"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+        digest = _file_hash(src) if verify else None
+    else:
+        digest = decompress_file(src, dst, hashlib.sha256() if verify else None)
+    if digest is not None and digest != _file_hash(dst):
+        os.remove(dst)
+        raise OSError(f"checksum of {dst} differs from {src}")
+    st = os.stat(src)
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return 'copy'
+
+
+def stage_files(items, check='mtime', verify=False, nthread=MAX_THREAD, keep=()):
+    """
+    Purpose: stage source files into the work directory
+    Inputs : items      [(src, dst, link), ...], link=True creates a symbolic link (read-only inputs)
+             check      'mtime' (size + mtime) or 'hash', to skip the files already staged
+             verify     compare the checksum of each copied file with the source
+             keep       destination files whose compressed source is copied as it is, to dst + suffix
+    Return : {'copy': [...], 'link': [...], 'skip': [...], 'fail': [...]}, lists of source files
+    """
+    result = {'copy': [], 'link': [], 'skip': [], 'fail': []}
+    todo = []
+    # plan all pairs first, compressed sources (.gz, .Z, .bz2) are found here
+    for f1, f2, link in items:
+        src = find_source(f1)
+        if src is None:
+            logging.warning(f'copy failed! file not found {f1}')
+            result['fail'].append(f1)
+            continue
+        if os.path.abspath(src) == os.path.abspath(f2):
+            logging.warning(f'copy failed! files are same {f1}')
+            result['fail'].append(f1)
+            continue
+        keep_comp = src != f1 and f2 in keep
+        if keep_comp:
+            f2 += src[len(f1):]
+        if _is_staged(src, f2, link and src == f1, check):
+            result['skip'].append(src)
+            continue
+        todo.append((src, f2, link and src == f1, keep_comp))
+
+    def _one(item):
+        src, dst, link, keep_comp = item
+        try:
+            return _stage_one(src, dst, link, verify, keep_comp)
+        except (IOError, OSError) as e:
+            logging.warning(f'copy failed! {src}: {e}')
+            return 'fail'
+
+    if todo:
+        with ThreadPoolExecutor(max(1, min(nthread, len(todo)))) as pool:
+            for item, status in zip(todo, pool.map(_one, todo)):
+                result[status].append(item[0])
+        invalidate_stat([item[1] for item in todo])
+    return result
+
+
+__all__ = ['open_gnss', 'compression', 'decompress_file', 'find_source', 'stage_files',
+           'stat_cache', 'invalidate_stat', 'cached_isfile', 'cached_getsize',
+           'set_product_cache', 'product_cache_file', 'save_product_cache', 'ProductMemo']
@@ -0,0 +1,342 @@
+import os
+import math
+import logging
+from .gnss_files import read_sp3_file
+from .constants import gns_name
+from .gnss_clock import DUP_RULES
+from .gnss_io import ProductMemo
+from .lazy_import import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# earth rotation rate (rad/s), velocity of the interpolant (ECEF) => inertial for the cross-track direction
+OMGE = 7.2921151467e-5
+# in-process memo of the last SP3 files read, e.g. the neighbouring days merged by OrbitDiff
+_orb_memo = ProductMemo(4)
+# number of output epochs interpolated in one NumPy batch
+_EPO_CHUNK = 512
+# rad => milli-arc-seconds
+_MAS = 180 / math.pi * 3600e3
+
+
+class OrbitProduct:
+    """
+    Purpose: SP3 orbit held as a cube
+             epochs     fractional MJD (nepo)
+             sats       satellite PRNs, sorted (nsat)
+             xyz        ECEF positions in meters (nepo x nsat x 3), NaN if missing
+    """
+
+    def __init__(self, epochs, sats, xyz):
+        self.epochs = np.asarray(epochs, dtype=np.float64)
+        self.sats = np.asarray(sats, dtype='U3')
+        self.xyz = np.asarray(xyz, dtype=np.float64).reshape(len(self.epochs), len(self.sats), 3)
+
+    def __len__(self):
+        return len(self.epochs)
+
+    @classmethod
+    def from_frame(cls, data):
+        """ from the output of read_sp3_file (epoch, sod, sat, px, py, pz) """
+        if data is None or data.empty:
+            return cls([], [], np.zeros((0, 0, 3)))
+        # epochs rounded to 1 ms, the same as the clock cube
+        keys, irow = np.unique(np.round(data.epoch.values * 86400000.0), return_inverse=True)
+        sats, icol = np.unique(data.sat.values.astype('U3'), return_inverse=True)
+        xyz = np.full((len(keys), len(sats), 3), np.nan)
+        xyz[irow, icol] = data[['px', 'py', 'pz']].values
+        # zero positions mark missing satellites in SP3
+        xyz[np.all(xyz == 0, axis=2)] = np.nan
+        return cls(keys / 86400000.0, sats, xyz)
+
+    @classmethod
+    def merge(cls, products, rule='last'):
+        """
+        Purpose: products of consecutive files (e.g. days) as one product
+                 positions of the same epoch and satellite (e.g. 24:00 of a day and 00:00 of the next) are
+                 resolved by rule: 'first' or 'last' file wins, or 'mean' of all files
+        """
+        if rule not in DUP_RULES:
+            raise ValueError(f"unknown duplicate rule {rule}, one of {' '.join(DUP_RULES)}")
+        products = [p for p in products if p is not None and len(p)]
+        if not products:
+            return cls([], [], np.zeros((0, 0, 3)))
+        if len(products) == 1:
+            return products[0]
+        keys, index = np.unique(np.round(np.concatenate([p.epochs for p in products]) * 86400000.0),
+                                return_inverse=True)
+        sats = np.unique(np.concatenate([p.sats for p in products]))
+        xyz = np.full((len(keys), len(sats), 3), np.nan)
+        nval = np.zeros((len(keys), len(sats), 1))
+        offsets = np.cumsum([0] + [len(p) for p in products])
+        # 'first': later files are written first and overwritten by the earlier ones
+        order = list(zip(products, offsets[:-1]))
+        for p, ibeg in (reversed(order) if rule == 'first' else order):
+            rows = index[ibeg:ibeg + len(p)]
+            cols = np.searchsorted(sats, p.sats)
+            sub = xyz[rows][:, cols]
+            ok = ~np.isnan(p.xyz)
+            if rule == 'mean':
+                sub[ok & np.isnan(sub)] = 0.0
+                sub[ok] += p.xyz[ok]
+                nval[np.ix_(rows, cols)] += ok[..., 0:1]
+            else:
+                sub[ok] = p.xyz[ok]
+            xyz[np.ix_(rows, cols)] = sub
+        if rule == 'mean':
+            with np.errstate(invalid='ignore'):
+                xyz /= np.where(nval > 0, nval, np.nan)
+        return cls(keys / 86400000.0, sats, xyz)
+
+    def window(self, t_beg=None, t_end=None):
+        """ epochs within [t_beg, t_end] (GnssTime or fractional MJD) """
+        sel = np.ones(len(self), dtype=bool)
+        if t_beg is not None:
+            sel &= self.epochs >= _fmjd(t_beg) - 1e-9
+        if t_end is not None:
+            sel &= self.epochs <= _fmjd(t_end) + 1e-9
+        return OrbitProduct(self.epochs[sel], self.sats, self.xyz[sel])
+
+    def subset(self, sats):
+        cols = np.nonzero(np.isin(self.sats, list(sats)))[0]
+        return OrbitProduct(self.epochs, self.sats[cols], self.xyz[:, cols])
+
+    def interpolate(self, epochs, order=9):
+        """
+        Purpose: Lagrange interpolation of all satellites at once
+        Inputs : epochs     fractional MJD of the output
+                 order      polynomial order, order + 1 nodes around each output epoch
+        Return : (positions, velocities), (nout x nsat x 3) in m and m/s (ECEF)
+                 NaN outside the product, across data gaps or if a node of the satellite is missing
+        """
+        epochs = np.asarray(epochs, dtype=np.float64)
+        pos = np.full((len(epochs), len(self.sats), 3), np.nan)
+        vel = np.full_like(pos, np.nan)
+        n = len(self.epochs)
+        if n < 2 or len(epochs) == 0:
+            return pos, vel
+        mjd0 = np.floor(self.epochs[0])
+        t = (self.epochs - mjd0) * 86400.0
+        t_out = (epochs - mjd0) * 86400.0
+        k = min(order + 1, n)
+        step = np.median(np.diff(t))
+        for ibeg in range(0, len(t_out), _EPO_CHUNK):
+            to = t_out[ibeg:ibeg + _EPO_CHUNK]
+            i0 = np.clip(np.searchsorted(t, to) - k // 2, 0, n - k)
+            idx = i0[:, None] + np.arange(k)
+            w, dw = _lagrange_weights(t[idx], to)
+            nodes = self.xyz[idx]
+            p = np.einsum('pk,pksc->psc', w, nodes)
+            v = np.einsum('pk,pksc->psc', dw, nodes)
+            bad = (to < t[0] - 1e-3) | (to > t[-1] + 1e-3) | (t[idx[:, -1]] - t[idx[:, 0]] > (k - 1) * step * 1.5)
+            p[bad] = np.nan
+            v[bad] = np.nan
+            pos[ibeg:ibeg + len(to)] = p
+            vel[ibeg:ibeg + len(to)] = v
+        return pos, vel
+
+
+def _lagrange_weights(x, t):
+    """
+    Purpose: Lagrange basis and its derivative
+    Inputs : x  nodes (nout x k), t output times (nout)
+    Return : (w, dw), (nout x k), value = sum(w * y), derivative = sum(dw * y)
+    """
+    k = x.shape[1]
+    eye = np.eye(k, dtype=bool)
+    dt = t[:, None] - x
+    den = np.where(eye, 1.0, x[:, :, None] - x[:, None, :]).prod(axis=2)
+    # prod_{m != j} dt_m
+    w = np.where(eye, 1.0, dt[:, None, :]).prod(axis=2) / den
+    # L_j' = sum_{i != j} prod_{m != i, j} dt_m / den_j
+    excl = eye[None, :, :] | eye[:, None, :]
+    terms = np.where(excl, 1.0, dt[:, None, None, :]).prod(axis=3)
+    terms[:, eye] = 0.0
+    dw = terms.sum(axis=2) / den
+    return w, dw
+
+
+def read_orbit(f_name):
+    """ SP3 file as OrbitProduct, the last files read are memoized (validated by size and mtime) """
+    try:
+        st = os.stat(f_name)
+    except FileNotFoundError:
+        logging.warning(f"file not found {f_name}")
+        return
+    key = os.path.abspath(f_name)
+    stamp = (st.st_size, st.st_mtime_ns)
+    orb = _orb_memo.get(key, stamp)
+    if orb is not None:
+        return orb
+    orb = OrbitProduct.from_frame(read_sp3_file(f_name))
+    _orb_memo.put(key, stamp, orb)
+    return orb
+
+
+def _acr_axes(pos, vel):
+    """ unit vectors along, cross, radial (... x 3) from ECEF position and velocity """
+    vel = vel + OMGE * np.stack((-pos[..., 1], pos[..., 0], np.zeros(pos.shape[:-1])), axis=-1)
+    e_r = pos / np.linalg.norm(pos, axis=-1, keepdims=True)
+    e_c = np.cross(pos, vel)
+    e_c /= np.linalg.norm(e_c, axis=-1, keepdims=True)
+    return np.cross(e_c, e_r), e_c, e_r
+
+
+def _helmert_design(xyz):
+    """ design matrix (npt*3 x 7) of translation (m), rotation (rad) and scale of small-angle Helmert """
+    x, y, z = xyz[:, 0], xyz[:, 1], xyz[:, 2]
+    one, zero = np.ones(len(xyz)), np.zeros(len(xyz))
+    return np.stack((np.column_stack((one, zero, zero, zero, z, -y, x)),
+                     np.column_stack((zero, one, zero, -z, zero, x, y)),
+                     np.column_stack((zero, zero, one, y, -x, zero, z))), axis=1).reshape(-1, 7)
+
+
+def fit_helmert(ref, dif, niter=3, thres=3.0):
+    """
+    Purpose: 7-parameter Helmert of the differences dif = prd - ref, with outlier rejection
+    Inputs : ref, dif   (npt x 3) in meters
+    Return : (parameters [tx, ty, tz (m), rx, ry, rz (rad), scale], model (npt x 3))
+    """
+    a = _helmert_design(ref)
+    # columns scaled to the same magnitude for the solution
+    norm = np.array([1.0] * 3 + [np.mean(np.linalg.norm(ref, axis=1))] * 4)
+    y = dif.ravel()
+    use = np.ones(len(ref), dtype=bool)
+    par = np.zeros(7)
+    for _ in range(niter):
+        rows = np.repeat(use, 3)
+        if rows.sum() < 7:
+            break
+        sol = np.linalg.lstsq(a[rows] / norm, y[rows], rcond=None)[0]
+        par = sol / norm
+        res = np.linalg.norm((y - a @ par).reshape(-1, 3), axis=1)
+        sig = np.sqrt(np.mean(res[use] ** 2))
+        new = res < thres * sig
+        if np.array_equal(new, use):
+            break
+        use = new
+    return par, (a @ par).reshape(-1, 3)
+
+
+class OrbitDiff:
+    """
+    Purpose: orbit differences of a product against a reference product in along, cross and radial
+             both products are interpolated to a common epoch grid, the native alternative of
+             great_sp3orb + great_orbdif for quick-look monitoring
+             epochs     fractional MJD (nepo)
+             sats       satellites (nsat)
+             dxyz, acr  differences (nepo x nsat x 3) in meters, ECEF and along/cross/radial
+             helmert    {tx, ty, tz (mm), rx, ry, rz (mas), scale (ppb)} if a Helmert is removed
+    """
+
+    def __init__(self, epochs, sats, dxyz, acr, helmert=None):
+        self.epochs = epochs
+        self.sats = sats
+        self.dxyz = dxyz
+        self.acr = acr
+        self.helmert = helmert
+
+    @classmethod
+    def compute(cls, prd: OrbitProduct, ref: OrbitProduct, sats=None, intv=300, t_beg=None, t_end=None,
+                helmert=False, order=9):
+        """
+        Inputs : prd, ref       orbit products to be compared
+                 sats           satellites to compare (default all common satellites)
+                 intv           interval of the epoch grid (s)
+                 t_beg, t_end   time window (GnssTime or fractional MJD), default the common span
+                 helmert        estimate and remove a 7-parameter Helmert of all epochs
+        """
+        common = np.intersect1d(prd.sats, ref.sats)
+        if sats is not None:
+            common = common[np.isin(common, list(sats))]
+        empty = np.zeros((0, len(common), 3))
+        if len(common) == 0 or len(prd) < 2 or len(ref) < 2:
+            return cls(np.zeros(0), common, empty, empty)
+        prd, ref = prd.subset(common), ref.subset(common)
+
+        t_lo = max(prd.epochs[0], ref.epochs[0]) if t_beg is None else _fmjd(t_beg)
+        t_hi = min(prd.epochs[-1], ref.epochs[-1]) if t_end is None else _fmjd(t_end)
+        mjd0 = np.floor(t_lo)
+        sec = np.arange(math.ceil(round((t_lo - mjd0) * 86400.0, 3) / intv) * intv,
+                        round((t_hi - mjd0) * 86400.0, 3) + 1e-3, intv)
+        epochs = mjd0 + sec / 86400.0
+        pos1, _ = prd.interpolate(epochs, order)
+        pos2, vel2 = ref.interpolate(epochs, order)
+        dxyz = pos1 - pos2
+
+        par = None
+        if helmert:
+            ok = ~np.isnan(dxyz).any(axis=2)
+            if ok.sum() > 7:
+                sol, model = fit_helmert(pos2[ok], dxyz[ok])
+                dxyz[ok] -= model
+                par = {'tx': sol[0] * 1e3, 'ty': sol[1] * 1e3, 'tz': sol[2] * 1e3, 'rx': sol[3] * _MAS,
+                       'ry': sol[4] * _MAS, 'rz': sol[5] * _MAS, 'scale': sol[6] * 1e9}
+
+        e_a, e_c, e_r = _acr_axes(pos2, vel2)
+        acr = np.stack((np.sum(dxyz * e_a, axis=2), np.sum(dxyz * e_c, axis=2), np.sum(dxyz * e_r, axis=2)), axis=2)
+        return cls(epochs, common, dxyz, acr, par)
+
+    @classmethod
+    def from_files(cls, f_prds, f_refs, **kwargs):
+        """ orbit differences of the product SP3 files against the reference SP3 files (lists of multi-day files) """
+        prd = OrbitProduct.merge([read_orbit(f) for f in f_prds])
+        ref = OrbitProduct.merge([read_orbit(f) for f in f_refs])
+        return cls.compute(prd, ref, **kwargs)
+
+    @classmethod
+    def from_config(cls, config, excsat=(), trans='STRD', **kwargs):
+        """
+        the input SP3 of GrtSp3orb against the reference SP3 of GrtOrbdif, within beg and end of config
+        excsat  satellites excluded besides sat_rm of config (as excsat of GrtOrbdif)
+        trans   'NONE' for the plain differences, else a Helmert is removed (as trans of GrtOrbdif)
+        """
+        with config.compressed_files():
+            f_prd = config.get_xml_file('sp3_inp', check=True)
+            f_ref = config.get_xml_file('sp3', check=True)
+        excsat = set(excsat)
+        sats = [s for s in config.all_gnssat if s not in excsat]
+        kwargs.setdefault('intv', config.intv)
+        kwargs.setdefault('helmert', trans.upper() != 'NONE')
+        return cls.from_files(f_prd, f_ref, sats=sats, t_beg=config.beg_time, t_end=config.end_time, **kwargs)
+
+    def rms(self):
+        """ RMS of along, cross, radial (nsat x 3) in meters, NaN if no epoch """
+        ok = ~np.isnan(self.acr).any(axis=2)
+        nobs = ok.sum(axis=0)
+        sq = np.where(ok[..., None], self.acr, 0.0) ** 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt(sq.sum(axis=0) / nobs[:, None])
+
+    def summary(self, mjd=None, max_3d=200.0):
+        """ RMS of each satellite, the same columns as read_orbdif_sum (mjd, sat, val in cm, type) """
+        if mjd is None:
+            mjd = self.epochs[0] if len(self.epochs) else 0.0
+        rms = self.rms() * 100
+        val_3d = np.sqrt(np.sum(rms ** 2, axis=1))
+        data = []
+        for i, sat in enumerate(self.sats.tolist()):
+            if np.isnan(val_3d[i]) or val_3d[i] > max_3d:
+                continue
+            for j, name in enumerate(['along', 'cross', 'radial']):
+                data.append({'mjd': mjd, 'sat': sat, 'val': rms[i, j], 'type': name})
+            data.append({'mjd': mjd, 'sat': sat, 'val': val_3d[i], 'type': '3d'})
+        return pd.DataFrame(data)
+
+    def to_frame(self):
+        """ differences of each epoch, the same columns as read_orbdif of gnss_plot (date, sat, gns, da, dc, dr, 3d, 1d in mm) """
+        irow, icol = np.nonzero(~np.isnan(self.acr).any(axis=2))
+        acr = self.acr[irow, icol] * 1000
+        d_3d = np.linalg.norm(acr, axis=1)
+        sats = self.sats[icol].astype(object)
+        return pd.DataFrame({'date': pd.Timestamp(1858, 11, 17) + pd.to_timedelta(self.epochs[irow], unit='D').round('ms'),
+                             'sat': sats, 'gns': [gns_name(s[0]) for s in sats], 'da': acr[:, 0], 'dc': acr[:, 1],
+                             'dr': acr[:, 2], '3d': d_3d, '1d': d_3d / math.sqrt(3)})
+
+
+def _fmjd(t):
+    return t.mjd + t.sod / 86400.0 if hasattr(t, 'mjd') else float(t)
+
+
+__all__ = ['OrbitProduct', 'OrbitDiff', 'read_orbit', 'fit_helmert']
@@ -0,0 +1,132 @@
+import os
+import json
+import hashlib
+import logging
+from .gnss_clock import ClockProduct, DUP_RULES, read_clock
+from .gnss_orbit import OrbitProduct, read_orbit
+from .gnss_io import open_gnss, find_source
+from .lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+# arrays of each product kind saved for memory mapping
+_ARRAYS = {'sp3': ['epochs', 'sats', 'xyz'], 'clk': ['mjd', 'sod', 'name', 'rtype', 'val', 'sig']}
+# the same margins as GnssConfig._daily_file
+_MARGINS = {'sp3': (5400, 5400), 'sp3_inp': (5400, 5400), 'rinexc': (0, 5400)}
+
+
+def product_kind(f_name):
+    """ 'sp3' or 'clk' from the first line of the (compressed) file, '' if unknown """
+    try:
+        with open_gnss(f_name, errors='replace') as f:
+            line = f.readline()
+    except (OSError, EOFError):
+        return ''
+    if line.startswith('#') and line[1:2] in 'abcd':
+        return 'sp3'
+    if 'RINEX VERSION' in line and line[20:21] == 'C':
+        return 'clk'
+    return ''
+
+
+def _mmap_key(files, t_beg, t_end, rule):
+    items = []
+    for f in files:
+        st = os.stat(f)
+        items.append([os.path.abspath(f), st.st_size, st.st_mtime_ns])
+    items.append([str(t_beg), str(t_end), rule])
+    return hashlib.sha1(json.dumps(items).encode()).hexdigest()[0:16]
+
+
+def _load_mmap(path, kind):
+    try:
+        arrays = [np.load(os.path.join(path, f'{k}.npy'), mmap_mode='r') for k in _ARRAYS[kind]]
+    except (OSError, ValueError):
+        return
+    if kind == 'sp3':
+        return OrbitProduct(*arrays)
+    with open(os.path.join(path, 'header.json')) as f:
+        header = json.load(f)
+    return ClockProduct(*arrays, header)
+
+
+def _save_mmap(path, kind, product):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    for k in _ARRAYS[kind]:
+        np.save(os.path.join(tmp, f'{k}.npy'), getattr(product, k))
+    if kind == 'clk':
+        with open(os.path.join(tmp, 'header.json'), 'w') as f:
+            json.dump(product.header, f)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # saved by another process in the meantime
+        for f_name in os.listdir(tmp):
+            os.remove(os.path.join(tmp, f_name))
+        os.rmdir(tmp)
+
+
+def load_product(files, t_beg=None, t_end=None, rule='last', kind='', mmap_dir=''):
+    """
+    Purpose: one continuous product of consecutive SP3 or RINEX clock files (e.g. daily files)
+    Inputs : files          files in time order, compressed variants (.gz, .Z, .zst ...) are found as
+                            for staging (find_source), missing files are skipped
+             t_beg, t_end   window (GnssTime or fractional MJD), each file is trimmed right after reading
+             rule           duplicated epochs of consecutive files, 'first', 'last' or 'mean' (see DUP_RULES)
+             kind           'sp3' or 'clk', from the first file if empty
+             mmap_dir       if given, the product is saved there once and memory mapped afterwards
+    Return : OrbitProduct or ClockProduct, None if no file is found
+    """
+    if rule not in DUP_RULES:
+        logging.error(f"unknown duplicate rule {rule}, one of {' '.join(DUP_RULES)}")
+        return
+    files = [f for f in (find_source(f) for f in files if f) if f]
+    if not files:
+        logging.warning("no product file found")
+        return
+    kind = kind or product_kind(files[0])
+    if kind not in _ARRAYS:
+        logging.error(f"unknown product type {files[0]}")
+        return
+
+    path = ''
+    if mmap_dir:
+        path = os.path.join(mmap_dir, f"{kind}_{_mmap_key(files, t_beg, t_end, rule)}")
+        if os.path.isdir(path):
+            product = _load_mmap(path, kind)
+            if product is not None:
+                return product
+
+    reader = read_orbit if kind == 'sp3' else read_clock
+    parts = []
+    for f in files:
+        data = reader(f)
+        if data is not None:
+            parts.append(data.window(t_beg, t_end))
+    product = (OrbitProduct if kind == 'sp3' else ClockProduct).merge(parts, rule)
+
+    if path:
+        try:
+            _save_mmap(path, kind, product)
+            return _load_mmap(path, kind) or product
+        except OSError as e:
+            logging.warning(f"unable to save product {path}: {e}")
+    return product
+
+
+def config_product(config, f_type, rule='last', margin=None, mmap_dir=''):
+    """
+    Purpose: continuous product of the daily files of config (e.g. sp3, sp3_inp, rinexc, ssrclk, satclk)
+             within beg_time - margin[0] ... end_time + margin[1], the default margins are those of
+             GnssConfig._daily_file, e.g. 5400 s for SP3
+    """
+    if margin is None:
+        margin = _MARGINS.get(f_type, (0, 0))
+    with config.compressed_files():
+        files = config.get_xml_file(f_type, check=True)
+    kind = 'sp3' if f_type.startswith('sp3') else ''
+    return load_product(files, config.beg_time - margin[0], config.end_time + margin[1], rule, kind, mmap_dir)
+
+
+__all__ = ['load_product', 'config_product', 'product_kind']
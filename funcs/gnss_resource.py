@@ -0,0 +1,245 @@
+import os
+import json
+import math
+import time
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, the budget is then not enforced between processes
+    fcntl = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# default directory of the core slots shared by all processes of the user, and of the scaling history,
+# [common] resource_dir to share the slots between users or to keep them off a tmpfs
+RESOURCE_DIR = os.path.join(tempfile.gettempdir(), f"gnss_resource_{os.getuid() if hasattr(os, 'getuid') else 0}")
+
+
+def _read_first(f_name):
+    try:
+        with open(f_name) as f:
+            return f.readline().strip()
+    except OSError:
+        return ''
+
+
+@lru_cache(maxsize=None)
+def available_cores():
+    """ number of cores usable by this process: cpu affinity and cgroup (v2 or v1) cpu quota """
+    try:
+        ncore = len(os.sched_getaffinity(0))
+    except AttributeError:
+        ncore = os.cpu_count() or 1
+    # cgroup v2: "max 100000" or "<quota> <period>"
+    quota, period = (_read_first('/sys/fs/cgroup/cpu.max').split() + ['max', '100000'])[0:2]
+    if quota == 'max':
+        # cgroup v1
+        quota = _read_first('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') or '-1'
+        period = _read_first('/sys/fs/cgroup/cpu/cpu.cfs_period_us') or '100000'
+    if quota not in ['max', '-1'] and int(period) > 0:
+        ncore = min(ncore, max(1, math.ceil(int(quota) / int(period))))
+    return ncore
+
+
+@lru_cache(maxsize=None)
+def available_memory():
+    """ memory usable by this process (bytes): cgroup memory limit and MemAvailable, 0 if unknown """
+    limits = []
+    for f_name in ['/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes']:
+        val = _read_first(f_name)
+        # v1 reports a huge number when there is no limit
+        if val.isdigit() and int(val) < 1 << 60:
+            limits.append(int(val))
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    limits.append(int(line.split()[1]) * 1024)
+                    break
+    except OSError:
+        pass
+    return min(limits) if limits else 0
+
+
+def _lock_file(f_name, timeout=0):
+    """
+    Purpose: open f_name and hold an exclusive flock on it, waiting (blocking) up to timeout seconds
+    Return : the file descriptor, None when timed out
+    """
+    fd = os.open(f_name, os.O_WRONLY | os.O_CREAT, 0o644)
+    if timeout <= 0:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return fd
+    except OSError:
+        pass
+    # flock itself has no timeout: a helper thread blocks on it and gives it up if the caller stopped waiting
+    got = threading.Event()
+    mutex = threading.Lock()
+    abandoned = []
+
+    def wait():
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        with mutex:
+            if abandoned:
+                os.close(fd)
+            else:
+                got.set()
+
+    threading.Thread(target=wait, daemon=True).start()
+    if got.wait(timeout):
+        return fd
+    with mutex:
+        if got.is_set():
+            return fd
+        abandoned.append(True)
+    return None
+
+
+def children_maxrss():
+    """ peak resident memory (bytes) of the largest finished child process """
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+
+
+class ResourceBudget:
+    """
+    Purpose: core and memory budget of the GREAT binaries
+             plan()     number of processes x threads of a command, from the budget and the scaling history
+             reserve()  cores held while a command runs, shared by concurrent commands and days (flock)
+             record()   scaling history, {stage: {"<nmp>x<threads>": [receivers per second, peak memory]}}
+    """
+
+    def __init__(self, cores=0, memory=0, root=RESOURCE_DIR, timeout=3600):
+        self.cores = min(cores, available_cores()) if cores > 0 else available_cores()
+        self.memory = memory if memory > 0 else available_memory()
+        self.root = root
+        self.timeout = timeout
+        self.f_history = os.path.join(root, 'scaling.json')
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.max_cores, config.max_memory * 1e9, config.resource_dir or RESOURCE_DIR,
+                   config.resource_timeout)
+
+    def _history(self):
+        try:
+            with open(self.f_history) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def plan(self, stage, nmp, nrec, max_threads=1):
+        """
+        Purpose: (number of processes, threads per process) of a command
+        Inputs : stage          name of the GREAT binary
+                 nmp            number of processes requested, e.g. one per receiver group
+                 nrec           number of receivers, a process needs at least one receiver
+                 max_threads    threads a single process can use efficiently (1 for single-threaded binaries)
+        """
+        nmp = max(1, min(nmp, nrec, self.cores))
+        history = self._history().get(stage, {})
+        mem = max([rec[1] for rec in history.values()], default=0)
+        if mem > 0 and self.memory > 0:
+            nmp = max(1, min(nmp, int(self.memory // mem)))
+        nthd = max(1, min(max_threads, self.cores // nmp))
+        # an already measured configuration with a better throughput within the budget
+        best = history.get(f"{nmp}x{nthd}")
+        if best is not None:
+            for key, rec in history.items():
+                n1, n2 = [int(x) for x in key.split('x')]
+                if n1 <= nmp and n2 <= max_threads and n1 * n2 <= self.cores and rec[0] > best[0] * 1.1:
+                    best = rec
+                    nmp, nthd = n1, n2
+        return nmp, nthd
+
+    def record(self, stage, nmp, nthd, nrec, seconds, maxrss=0):
+        """ add the throughput of a run to the scaling history, maxrss: peak memory of a process (0 if unknown) """
+        if seconds <= 0 or nrec <= 0:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        with self._locked('history.lock'):
+            history = self._history()
+            old = history.setdefault(stage, {}).get(f"{nmp}x{nthd}", [0, 0])
+            rate = nrec / seconds
+            # exponential smoothing of the throughput, the maximum of the memory
+            history[stage][f"{nmp}x{nthd}"] = [rate if old[0] == 0 else 0.7 * old[0] + 0.3 * rate,
+                                               max(old[1], maxrss)]
+            tmp = f"{self.f_history}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(history, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.f_history)
+
+    @contextmanager
+    def _locked(self, name):
+        with open(os.path.join(self.root, name), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    @contextmanager
+    def reserve(self, ncore, label=''):
+        """
+        hold ncore cores of the budget, wait (blocking flock) until they are released by other commands,
+        the command runs without a reservation after timeout seconds
+        """
+        if fcntl is None:
+            yield
+            return
+        ncore = max(1, min(ncore, self.cores))
+        os.makedirs(self.root, exist_ok=True)
+        start = time.time()
+
+        def remaining():
+            return max(1e-3, start + self.timeout - time.time()) if self.timeout > 0 else 0
+
+        # the waiting commands queue on the mutex, the first one takes free slots and waits for the busy ones,
+        # so that waiting commands never hold a part of the cores needed by another
+        slots = {}
+        mutex = _lock_file(os.path.join(self.root, 'alloc.lock'), remaining())
+        try:
+            while mutex is not None and len(slots) < ncore:
+                busy = []
+                for i in range(self.cores):
+                    if i in slots or len(slots) == ncore:
+                        continue
+                    fd = os.open(os.path.join(self.root, f'core{i:03d}'), os.O_WRONLY | os.O_CREAT, 0o644)
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        slots[i] = fd
+                    except OSError:
+                        os.close(fd)
+                        busy.append(i)
+                if len(slots) < ncore:
+                    fd = _lock_file(os.path.join(self.root, f'core{busy[0]:03d}'), remaining())
+                    if fd is None:
+                        break
+                    slots[busy[0]] = fd
+        finally:
+            if mutex is not None:
+                os.close(mutex)
+        if len(slots) < ncore:
+            logging.warning(f"{label} no {ncore} cores free after {self.timeout:.0f} sec, run without a reservation")
+            for fd in slots.values():
+                os.close(fd)
+            slots = {}
+        elif time.time() - start > 1:
+            logging.info(f"{label} waited {time.time() - start:.1f} sec for {ncore} cores")
+        try:
+            yield
+        finally:
+            for fd in slots.values():
+                os.close(fd)
+
+__all__ = ['ResourceBudget', 'RESOURCE_DIR', 'available_cores', 'available_memory', 'children_maxrss']
@@ -0,0 +1,185 @@
+import os
+import shutil
+import fnmatch
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from .constants import MAX_THREAD
+from .gnss_io import compression
+from .gnss_archive import DedupStore, DEDUP_STORE
+
+try:
+    import zstandard
+except ImportError:  # optional, the zstd command is used instead
+    zstandard = None
+
+_BUF_SIZE = 1024 * 1024
+# hidden entries (e.g. the snapshot store) and backups restored by recover_files are never touched
+_KEEP_ALWAYS = ['.*', '*.bak', '*.tmp']
+# one background thread per process, the files of a run are compressed by a pool of nthread
+_pool = None
+# [(work directory, future), ...]
+_futures = []
+
+
+def _match(rel, patterns):
+    """ rel (path relative to the work directory) or one of its parent directories matches a pattern """
+    parts = rel.split(os.sep)
+    for i in range(1, len(parts) + 1):
+        sub = '/'.join(parts[0:i])
+        if any(fnmatch.fnmatch(sub, p) for p in patterns):
+            return True
+    return False
+
+
+def compress_zstd(f_name, level=3):
+    """ f_name => f_name.zst with the same mtime, the original is removed, return the new file name """
+    f_out = f"{f_name}.zst"
+    tmp = f"{f_out}.{os.getpid()}.tmp"
+    st = os.stat(f_name)
+    try:
+        if zstandard is not None:
+            cctx = zstandard.ZstdCompressor(level=level)
+            with open(f_name, 'rb') as fin, open(tmp, 'wb') as fout:
+                cctx.copy_stream(fin, fout, read_size=_BUF_SIZE, write_size=_BUF_SIZE)
+        else:
+            subprocess.run(['zstd', '-q', '-f', f'-{level}', '-o', tmp, f_name], check=True,
+                           stdout=subprocess.DEVNULL)
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, f_out)
+    except BaseException:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+        raise
+    os.remove(f_name)
+    return f_out
+
+
+class RetentionPolicy:
+    """
+    Purpose: retention of the outputs in a work directory, rules of the [retention] section, e.g.
+                 [retention]
+                 compress = res_* log_tb_* ambcon_* ambupd_* *_F? *_AR*
+                 delete   = tmp/*
+                 keep     = log_tb_orig
+                 min_size = 0.1
+             patterns are matched against paths relative to the work directory (a matched directory
+             applies to all its files), keep > delete > compress, other (hot) files are not touched.
+             compressed files are read by open_gnss
+    """
+
+    def __init__(self, compress=(), delete=(), keep=(), min_size=0.0, level=3, nthread=MAX_THREAD):
+        self.compress = list(compress)
+        self.delete = list(delete)
+        self.keep = _KEEP_ALWAYS + list(keep)
+        self.min_size = min_size
+        self.level = level
+        self.nthread = nthread
+
+    @classmethod
+    def from_config(cls, config):
+        """ None if the config has no [retention] section """
+        if not config.config.has_section('retention'):
+            return None
+        sec = config.config['retention']
+        return cls(sec.get('compress', '').split(), sec.get('delete', '').split(), sec.get('keep', '').split(),
+                   sec.getfloat('min_size', 0.0) * 1e6, sec.getint('level', 3), sec.getint('nthread', MAX_THREAD))
+
+    def action(self, rel):
+        """ 'keep', 'delete', 'compress' or '' (hot, not touched) of a path relative to the work directory """
+        if _match(rel, self.keep):
+            return 'keep'
+        if _match(rel, self.delete):
+            return 'delete'
+        if _match(rel, self.compress):
+            return 'compress'
+        return ''
+
+    def plan(self, root='.'):
+        """ {'delete': [files], 'compress': [files]} of the work directory """
+        todo = {'delete': [], 'compress': []}
+        for path, dirs, files in os.walk(root):
+            rel_dir = os.path.relpath(path, root)
+            rel_dir = '' if rel_dir == '.' else rel_dir
+            # directories which are kept as a whole are not scanned
+            dirs[:] = [d for d in dirs if self.action(os.path.join(rel_dir, d)) != 'keep']
+            for f in files:
+                act = self.action(os.path.join(rel_dir, f))
+                f_name = os.path.join(path, f)
+                if act == 'delete':
+                    todo['delete'].append(f_name)
+                elif act == 'compress' and not os.path.islink(f_name):
+                    try:
+                        if os.path.getsize(f_name) >= self.min_size and not compression(f_name):
+                            todo['compress'].append(f_name)
+                    except OSError:
+                        continue
+        return todo
+
+    def apply(self, root='.'):
+        """ apply the rules to the work directory, return {'delete', 'compress', 'pruned': n, 'saved': bytes} """
+        todo = self.plan(root)
+        result = {'delete': 0, 'compress': 0, 'saved': 0, 'pruned': 0}
+        for f_name in todo['delete']:
+            try:
+                os.remove(f_name)
+                result['delete'] += 1
+            except OSError as e:
+                logging.warning(f"unable to delete {f_name}: {e}")
+
+        def _one(f_name):
+            try:
+                size = os.path.getsize(f_name)
+                return size - os.path.getsize(compress_zstd(f_name, self.level))
+            except Exception as e:  # e.g. zstandard.ZstdError, the file is kept as it is
+                logging.warning(f"unable to compress {f_name}: {e}")
+                return None
+
+        if todo['compress']:
+            with ThreadPoolExecutor(max(1, min(self.nthread, len(todo['compress'])))) as pool:
+                for saved in pool.map(_one, todo['compress']):
+                    if saved is not None:
+                        result['compress'] += 1
+                        result['saved'] += saved
+            # the snapshots compressed (backup_dir with dedup) were hard links, their objects are orphaned now
+            store = os.path.join(root, DEDUP_STORE)
+            if os.path.isdir(store):
+                result['pruned'] = DedupStore(store).prune()
+        # empty directories of deleted files
+        for path, dirs, files in os.walk(root, topdown=False):
+            if path != root and not dirs and not files and _match(os.path.relpath(path, root), self.delete):
+                shutil.rmtree(path, ignore_errors=True)
+        if result['delete'] or result['compress']:
+            logging.info(f"retention of {os.path.abspath(root)}: {result['compress']} files compressed "
+                         f"({result['saved'] / 1e6:.1f} MB saved), {result['delete']} files deleted, "
+                         f"{result['pruned']} snapshot objects removed")
+        return result
+
+    def submit(self, root='.'):
+        """ apply the rules in the background, see wait_retention """
+        global _pool
+        if _pool is None:
+            _pool = ThreadPoolExecutor(1)
+        root = os.path.abspath(root)
+        future = _pool.submit(self.apply, root)
+        _futures.append((root, future))
+        return future
+
+
+def wait_retention(root=''):
+    """
+    wait until the retention of the submitted work directories has finished,
+    of all directories or only of root (to be called before root is used again)
+    """
+    root = os.path.abspath(root) if root else ''
+    for item in list(_futures):
+        if root and item[0] != root:
+            continue
+        _futures.remove(item)
+        try:
+            item[1].result()
+        except Exception as e:
+            logging.warning(f"retention of {item[0]} failed: {e}")
+
+
+__all__ = ['RetentionPolicy', 'compress_zstd', 'wait_retention']
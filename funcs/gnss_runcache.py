@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import xml.etree.ElementTree as ET
+from .gnss_archive import DedupStore, file_hash, snapshot_file
+
+
+class RunCache:
+    """
+    Purpose: memoization of GREAT command runs, enabled by [common] run_cache = <directory>
+             key        sha256 of the command lines, the generated xml files, the binary
+                        and the input files listed in <inputs> (size + mtime, or content hash)
+             runs/<key>.json    manifest of a completed run {output file: object}
+             objects/           content-addressed store of the output files
+             a run is restored from the cache only if all of its shards succeeded before,
+             binaries which edit their inputs in place (GrtCmd.cacheable = False) are never cached
+    """
+
+    def __init__(self, root, check='mtime'):
+        self.root = os.path.abspath(root)
+        self.check = check
+        self.store = DedupStore(os.path.join(self.root, 'objects'))
+        self._hashes = {}
+        os.makedirs(os.path.join(self.root, 'runs'), exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        """ None if the run cache is not enabled in the config """
+        if not config.run_cache:
+            return None
+        return cls(config.run_cache, config.run_cache_check)
+
+    @staticmethod
+    def _parse_cmd(cmd):
+        """ (xml file, log file) of a command line formed by GrtCmd.form_cmd """
+        args = cmd.split()
+        xml = args[args.index('-x') + 1] if '-x' in args else ''
+        log = args[args.index('>') + 1] if '>' in args else ''
+        return xml, log
+
+    @staticmethod
+    def _xml_files(f_xml, section):
+        """ file names listed in a section (inputs or outputs) of a xml config """
+        try:
+            root = ET.parse(f_xml).getroot()
+        except (OSError, ET.ParseError):
+            return []
+        sec = root.find(section)
+        if sec is None:
+            return []
+        files = []
+        for elem in sec:
+            if elem.text:
+                files.extend(elem.text.split())
+        return files
+
+    def _signature(self, f_name):
+        """ identity of an input file (or of the files in an input directory) """
+        try:
+            st = os.stat(f_name)
+        except OSError:
+            return f"{f_name} missing"
+        if os.path.isdir(f_name):
+            return ';'.join(self._signature(os.path.join(f_name, f)) for f in sorted(os.listdir(f_name)))
+        if self.check != 'hash':
+            return f"{f_name} {st.st_size} {st.st_mtime_ns}"
+        stat_key = (os.path.abspath(f_name), st.st_size, st.st_mtime_ns)
+        if stat_key not in self._hashes:
+            self._hashes[stat_key] = file_hash(f_name)
+        return f"{f_name} {self._hashes[stat_key]}"
+
+    def key(self, exe, cmds):
+        h = hashlib.sha256()
+        h.update(self._signature(exe).split(' ', 1)[-1].encode())
+        for cmd in cmds:
+            h.update(cmd.encode())
+            f_xml, _ = self._parse_cmd(cmd)
+            try:
+                with open(f_xml, 'rb') as f:
+                    h.update(f.read())
+            except OSError:
+                return None
+            for f_inp in self._xml_files(f_xml, 'inputs'):
+                h.update(self._signature(f_inp).encode())
+        return h.hexdigest()
+
+    def _manifest(self, key):
+        return os.path.join(self.root, 'runs', f'{key}.json')
+
+    def restore(self, key, label=''):
+        """ restore the outputs of a completed run, False if the run is not cached """
+        f_run = self._manifest(key)
+        try:
+            with open(f_run) as f:
+                run = json.load(f)
+        except (OSError, ValueError):
+            logging.info(f"run cache miss {label}")
+            return False
+        start = time.time()
+        try:
+            for dst, obj in run['outputs'].items():
+                if os.path.dirname(dst):
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                snapshot_file(os.path.join(self.store.root, obj), dst)
+        except OSError as e:
+            logging.warning(f"run cache of {label} is damaged, run again: {e}")
+            os.remove(f_run)
+            return False
+        end = time.time()
+        logging.info(f"run cache hit {label}: {len(run['outputs'])} files restored in {end - start:.2f} sec, "
+                     f"{run['seconds'] - (end - start):.2f} sec saved")
+        return True
+
+    def save(self, key, cmds, start, label=''):
+        """ store the outputs written by the commands since start (time.time() before the run) """
+        seconds = time.time() - start
+        outputs = {}
+        for cmd in cmds:
+            f_xml, f_log = self._parse_cmd(cmd)
+            files = self._xml_files(f_xml, 'outputs') + ([f_log] if f_log else [])
+            for f_out in files:
+                if os.path.isdir(f_out):
+                    # output directories, e.g. ambflag_dir, only the files written by this run
+                    for f in sorted(os.listdir(f_out)):
+                        f_name = os.path.join(f_out, f)
+                        if os.path.isfile(f_name) and os.path.getmtime(f_name) >= start:
+                            outputs[f_name] = None
+                elif os.path.isfile(f_out):
+                    outputs[f_out] = None
+        try:
+            for f_out in outputs:
+                obj, _ = self.store.put(f_out)
+                outputs[f_out] = os.path.relpath(obj, self.store.root)
+        except OSError as e:
+            logging.warning(f"unable to save {label} into run cache: {e}")
+            return False
+        run = {'label': label, 'created': time.time(), 'seconds': seconds, 'outputs': outputs}
+        f_run = self._manifest(key)
+        with open(f"{f_run}.tmp", 'w') as f:
+            json.dump(run, f, indent=1)
+        os.replace(f"{f_run}.tmp", f_run)
+        logging.info(f"run cache saved {label}: {len(outputs)} files")
+        return True
+
+
+__all__ = ['RunCache']
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+
+try:
+    import resource
+except ImportError:  # not available on Windows, no CPU time and memory of the child processes
+    resource = None
+
+# one id per process (run) to compare different runs of a campaign
+RUN_ID = f"{time.strftime('%Y%m%dT%H%M%S')}_{os.getpid()}"
+# columns of the telemetry table, other fields are kept as JSON in 'extra'
+COLUMNS = ['run', 'host', 'time', 'label', 'stage', 'day', 'nmp', 'receivers', 'satellites',
+           'wall', 'cpu', 'cpu_children', 'maxrss', 'read_bytes', 'write_bytes']
+
+_sink = ''
+_context = {}
+_lock = threading.Lock()
+
+
+def set_telemetry(sink):
+    """ JSON lines (*.jsonl) or SQLite (*.db, *.sqlite) file of the telemetry records, empty to disable """
+    global _sink
+    _sink = os.path.abspath(sink) if sink else ''
+
+
+def set_context(**fields):
+    """ fields added to all following records, e.g. set_context(day='2021-001'), None to remove """
+    for key, val in fields.items():
+        if val is None:
+            _context.pop(key, None)
+        else:
+            _context[key] = val
+
+
+def _io_bytes():
+    """ bytes read and written by this process and its finished children """
+    rd, wr = 0, 0
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    rd = int(line.split()[1])
+                elif line.startswith('wchar:'):
+                    wr = int(line.split()[1])
+    except OSError:
+        pass
+    return rd, wr
+
+
+def _usage():
+    if resource is None:
+        return time.process_time(), 0.0, 0
+    ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time(), ru.ru_utime + ru.ru_stime, ru.ru_maxrss * 1024
+
+
+class Probe:
+    """ resource usage of a stage: wall and CPU time, peak memory of the children, bytes read and written """
+
+    def __init__(self):
+        self.enabled = bool(_sink)
+        if self.enabled:
+            self._wall = time.perf_counter()
+            self._cpu, self._cpu_child, self._rss = _usage()
+            self._io = _io_bytes()
+
+    def finish(self, label, **fields):
+        if not self.enabled:
+            return None
+        cpu, cpu_child, rss = _usage()
+        rd, wr = _io_bytes()
+        rec = {'run': RUN_ID, 'host': socket.gethostname(), 'time': time.time(), 'label': label}
+        rec.update(_context)
+        rec.update(fields)
+        rec.update({
+            'wall': time.perf_counter() - self._wall, 'cpu': cpu - self._cpu, 'cpu_children': cpu_child - self._cpu_child,
+            # peak of all children so far, known for this stage only if it increased
+            'maxrss': rss if rss > self._rss else 0,
+            'read_bytes': rd - self._io[0], 'write_bytes': wr - self._io[1]
+        })
+        try:
+            write_record(_sink, rec)
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"unable to write telemetry to {_sink}: {e}")
+        return rec
+
+
+def write_record(sink, rec):
+    if sink.endswith(('.db', '.sqlite')):
+        extra = {k: v for k, v in rec.items() if k not in COLUMNS}
+        with _lock, sqlite3.connect(sink, timeout=60) as db:
+            db.execute(f"CREATE TABLE IF NOT EXISTS telemetry ({', '.join(COLUMNS)}, extra)")
+            db.execute(f"INSERT INTO telemetry VALUES ({', '.join(['?'] * (len(COLUMNS) + 1))})",
+                       [rec.get(c) for c in COLUMNS] + [json.dumps(extra) if extra else None])
+        db.close()
+    else:
+        line = json.dumps(rec) + '\n'
+        # a single write in append mode, lines of concurrent processes are not interleaved
+        with _lock, open(sink, 'a') as f:
+            f.write(line)
+
+
+def read_records(sink):
+    """ all records of a JSON lines or SQLite telemetry file, list of dict """
+    if sink.endswith(('.db', '.sqlite')):
+        with sqlite3.connect(sink) as db:
+            rows = db.execute(f"SELECT {', '.join(COLUMNS)}, extra FROM telemetry").fetchall()
+        db.close()
+        recs = []
+        for row in rows:
+            rec = dict(zip(COLUMNS, row[:-1]))
+            if row[-1]:
+                rec.update(json.loads(row[-1]))
+            recs.append(rec)
+        return recs
+    recs = []
+    with open(sink) as f:
+        for line in f:
+            if line.strip():
+                recs.append(json.loads(line))
+    return recs
+
+
+__all__ = ['RUN_ID', 'set_telemetry', 'set_context', 'Probe', 'write_record', 'read_records']
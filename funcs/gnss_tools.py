@@ -1,27 +1,38 @@
 import os
 import math
 import logging
-import shutil
-import pandas as pd
 import time
+import heapq
 import xml.etree.ElementTree as ET
+from itertools import groupby
+from operator import itemgetter
 from functools import wraps
 from contextlib import contextmanager
 from . import gnss_files as gf
+from .gnss_upd import read_clk_wsb
+from .gnss_clock import read_clock_header, header_prns
+from .gnss_archive import snapshot_files, sync_dir
+from .gnss_io import open_gnss
+from .gnss_telemetry import Probe
+from .lazy_import import lazy_import
 
+pd = lazy_import('pandas')
 
-def timethis(label):
+
+def timethis(label, **fields):
     if label is None:
         label = 'Normal end'
 
     def decorate(func):
-        """ Decorator that reports the execution time. """
+        """ Decorator that reports the execution time, and records the telemetry if enabled. """
         @wraps(func)
         def wrapper(*args, **kwargs):
+            probe = Probe()
             start = time.time()
             result = func(*args, **kwargs)
             end = time.time()
             logging.info(f"#### {label:30s}, duration {end - start:15.5f} sec")
+            probe.finish(label, **fields)
             return result
 
         return wrapper
@@ -30,13 +41,16 @@ def timethis(label):
 
 
 @contextmanager
-def timeblock(label):
+def timeblock(label, **fields):
+    """ log the duration of a block, fields (stage, nmp, receivers ...) are added to the telemetry record """
+    probe = Probe()
     start = time.perf_counter()
     try:
         yield
     finally:
         end = time.perf_counter()
         logging.info(f"#### {label:30s}, duration {end - start:15.5f} sec")
+        probe.finish(label, **fields)
 
 
 def split_receivers(config, num):
@@ -81,17 +95,20 @@ def _auto_wrap(line, intent, linelen=60):
         parts = line
     else:
         parts = line.split()
-    info = ''
+    # one pass, the length of the joined pieces is counted instead of concatenating
+    pieces = []
+    size = 0
     newline = 1
     for part in parts:
-        info = info + ' ' + part
-        if len(info) >= newline * linelen + (1 + len(intent)) * (newline - 1):
+        pieces.append(' ' + part)
+        size += 1 + len(part)
+        if size >= newline * linelen + (1 + len(intent)) * (newline - 1):
             if newline == 1:
-                linelen = len(info)
-            info = info + '\n' + intent
+                linelen = size
+            pieces.append('\n' + intent)
+            size += 1 + len(intent)
             newline += 1
-    info = info.rstrip()
-    return info
+    return ''.join(pieces).rstrip()
 
 
 def pretty_xml(element, indent='\t', newline='\n', level=0):
@@ -114,21 +131,91 @@ def pretty_xml(element, indent='\t', newline='\n', level=0):
             else:
                 element.text = ' ' + element.text + ' '
     temp = list(element)
-    for subelement in temp:
-        if temp.index(subelement) < (len(temp) - 1):
+    for i, subelement in enumerate(temp):
+        if i < (len(temp) - 1):
             subelement.tail = newline + indent * (level + 1)
         else:
             subelement.tail = newline + indent * level
         pretty_xml(subelement, indent, newline, level=level + 1)
 
 
+# the same entities as ElementTree.write (xml.sax.saxutils is slow to import)
+_TEXT_ENTITIES = [('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;')]
+_ATTRIB_ENTITIES = _TEXT_ENTITIES + [('"', '&quot;'), ('\r', '&#13;'), ('\n', '&#10;'), ('\t', '&#09;')]
+
+
+def _escape(text, entities=_TEXT_ENTITIES):
+    for char, entity in entities:
+        if char in text:
+            text = text.replace(char, entity)
+    return text
+
+
+def _serialize_pretty(element, write, indent, newline, level, tail):
+    """ write an element as formatted by pretty_xml, without changing the tree """
+    tag = element.tag
+    write('<' + tag)
+    for key, val in element.items():
+        write(f' {key}="{_escape(val, _ATTRIB_ENTITIES)}"')
+    children = list(element)
+    text = element.text
+    if children:
+        if text is None or text.isspace():
+            text = newline + indent * (level + 1)
+        else:
+            text = newline + indent * (level + 1) + text.strip() + newline + indent * (level + 1)
+    elif text is not None:
+        if len(text) > 60:
+            text = newline + indent * (level + 1) + _auto_wrap(text, indent * (level + 1)) + newline + indent * level
+            tail = newline + indent * level
+        else:
+            text = ' ' + text + ' '
+    if text or children:
+        write('>')
+        if text:
+            write(_escape(text))
+        last = len(children) - 1
+        for i, sub in enumerate(children):
+            _serialize_pretty(sub, write, indent, newline, level + 1,
+                              newline + indent * (level + 1 if i < last else level))
+        write('</' + tag + '>')
+    else:
+        write(' />')
+    if tail:
+        write(_escape(tail))
+
+
+def format_xml(element, indent='\t', newline='\n', level=0) -> str:
+    """
+    Purpose: the xml of ET.ElementTree.write after pretty_xml, streamed into one string,
+             the tree is not changed (pretty_xml changes text and tail of every node)
+    """
+    chunks = []
+    _serialize_pretty(element, chunks.append, indent, newline, level, element.tail)
+    return ''.join(chunks)
+
+
+def write_xml(element, f_xml, indent='\t', newline='\n'):
+    """ the same file as pretty_xml + ET.ElementTree.write(f_xml, encoding='utf-8', xml_declaration=True) """
+    text = format_xml(element, indent, newline)
+    with open(f_xml, 'w', encoding='utf-8', errors='xmlcharrefreplace') as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        f.write(text)
+
+
+def write_xml_files(items, indent='\t', newline='\n'):
+    """ write_xml of each (element, f_xml) in items, e.g. the shards of a command formed before """
+    for element, f_xml in items:
+        write_xml(element, f_xml, indent, newline)
+
+
 def check_pod_sigma(config, maxsig=8):
     f_res = config.get_xml_file('recover_in')[0]
     if not os.path.isfile(f_res):
         logging.warning(f"file not found {f_res}")
         return False
     sig = -1
-    with open(f_res) as f:
+    with open_gnss(f_res) as f:
         for line in f:
             if line[0:2] != '##':
                 break
@@ -305,7 +392,7 @@ def check_pod_residuals_new(config, max_res_L=0.3, max_freq=0.3):
 def good_tb_site(file):
     site_good = []
     try:
-        with open(file) as f:
+        with open_gnss(file) as f:
             lines = f.readlines()
     except FileNotFoundError:
         logging.warning(f"Cannot open turboedit log file {file}")
@@ -343,7 +430,7 @@ def check_brd_orbfit(f_name):
     val = {}
     num = {}
     try:
-        with open(f_name) as f:
+        with open_gnss(f_name) as f:
             for line in f:
                 if line[0:4] != "APRI":
                     continue
@@ -381,7 +468,7 @@ def check_brd_orbfit(f_name):
 
 def edit_ics(file, sat_rm):
     try:
-        with open(file) as f:
+        with open_gnss(file) as f:
             lines = f.readlines()
     except FileNotFoundError:
         logging.warning(f"ics file not found {file}")
@@ -436,7 +523,7 @@ def check_ics(config):
         logging.warning(f"ics file not found {file}")
         return False
     
-    with open(file) as f:
+    with open_gnss(file) as f:
         lines = f.readlines()
 
     sats = []
@@ -460,7 +547,7 @@ def check_res_sigma(config, max_sig=8):
             site_rm.append(rec['rec'])
             continue
         sig = -1
-        with open(file) as f:
+        with open_gnss(file) as f:
             for line in f:
                 if line[0:2] != '##':
                     break
@@ -479,71 +566,44 @@ def check_res_sigma(config, max_sig=8):
         config.remove_ambflag_file(site_rm)
 
 
-def backup_dir(dir1, dir2):
-    if not os.path.isdir(dir1):
-        logging.error(f"directory not exists {dir1}")
-        return
-    if not os.path.isdir(dir2):
-        os.makedirs(dir2)
-
-    f2 = [file for file in os.listdir(dir2)]
-    for file in os.listdir(dir1):
-        if file not in f2:
-            f_org = os.path.join(dir1, file)
-            f_est = os.path.join(dir2, file)
-            shutil.copy(f_org, f_est)
+def backup_dir(dir1, dir2, dedup=False, dry_run=False):
+    """ copy new or changed files of dir1 to dir2, dedup: share identical files through the snapshot store """
+    return sync_dir(dir1, dir2, dedup=dedup, dry_run=dry_run)
 
 
-def copy_dir(dir1, dir2):
-    if not os.path.isdir(dir1):
-        logging.error(f"directory not exists {dir1}")
-        return
-    if not os.path.isdir(dir2):
-        os.makedirs(dir2)
-
-    for file in os.listdir(dir1):
-        f_org = os.path.join(dir1, file)
-        f_est = os.path.join(dir2, file)
-        shutil.copy(f_org, f_est)
+def copy_dir(dir1, dir2, dedup=False, check='mtime'):
+    """ same as backup_dir, check='hash' compares the file contents instead of size and mtime """
+    return sync_dir(dir1, dir2, check=check, dedup=dedup)
 
 
 def backup_files(config, files, sattype='gns', suffix="bak"):
+    pairs = []
     for file in files:
         file_olds = config.get_xml_file(file.lower(), check=True, sattype=sattype)
-        for f_name in file_olds:
-            f_new = f"{f_name}.{suffix}"
-            try:
-                shutil.copy(f_name, f_new)
-            except IOError:
-                logging.warning(f"unable to backup file {file}")
+        pairs.extend((f_name, f"{f_name}.{suffix}") for f_name in file_olds)
+    snapshot_files(pairs)
 
 
 def recover_files(config, files, sattype='gns', suffix="bak"):
+    pairs = []
     for file in files:
         file_olds = config.get_xml_file(file.lower(), check=False, sattype=sattype)
-        for f_name in file_olds:
-            f_new = f"{f_name}.{suffix}"
-            try:
-                shutil.copy(f_new, f_name)
-            except IOError:
-                logging.warning(f"unable to recover file {file}.{suffix}")
+        pairs.extend((f"{f_name}.{suffix}", f_name) for f_name in file_olds)
+    snapshot_files(pairs)
 
 
 def get_rnxc_satlist(f_name):
-    sats = []
-    try:
-        with open(f_name) as f:
-            for line in f:
-                if line.find("END OF HEADER") > 0:
-                    break
-                pos = line.find('PRN LIST') 
-                if pos > 0:
-                    info = line[0: pos]
-                    sats.extend(info.split())
-            return sats
-    except FileNotFoundError:
+    """ satellites of the PRN LIST of a RINEX clock file, the header is shared with read_clock """
+    header = read_clock_header(f_name)
+    if header is None:
         logging.error(f"file not found {f_name}")
-        return sats
+        return []
+    return header_prns(header)
+
+
+def _is_ambflag(file):
+    n = len(file)
+    return n >= 7 and (file[n - 5: n] == "o.log" or file[n - 7: n] in ["o.log13", "o.log14", "o.log15"])
 
 
 def copy_ambflag_from(ambflagdir):
@@ -551,18 +611,8 @@ def copy_ambflag_from(ambflagdir):
         logging.warning(f"cannot find source ambflag dir {ambflagdir}")
         return False
     logging.info(f"ambflag files are copied from {ambflagdir}")
-    if os.path.isdir('log_tb'):
-        shutil.rmtree('log_tb')
-    if not os.path.isdir('log_tb'):
-        os.makedirs('log_tb')
-    for file in os.listdir(ambflagdir):
-        n = len(file)
-        if n < 7:
-            continue
-        if file[n - 5: n] == "o.log" or file[n - 7: n] in ["o.log13", "o.log14", "o.log15"]:
-            f0 = os.path.join(ambflagdir, file)
-            f1 = os.path.join('log_tb', file)
-            shutil.copy(f0, f1)
+    # only new or changed files are copied, other files in log_tb are removed
+    sync_dir(ambflagdir, 'log_tb', select=_is_ambflag, delete=True)
 
 
 def copy_result_files(config, files, scheme, sattype='gns'):
@@ -570,20 +620,18 @@ def copy_result_files(config, files, scheme, sattype='gns'):
     Purpose: Copy result files
     e.g. cp orbdif_2020001 orbdif_2020001_flt
     """
+    pairs = []
     for file in files:
         file_olds = config.get_xml_file(file, check=True, sattype=sattype)
-        for f_name in file_olds:
-            f_new = f"{f_name}_{scheme}"
-            try:
-                shutil.copy(f_name, f_new)
-            except IOError:
-                logging.warning(f"unable to copy file {file}")
+        pairs.extend((f_name, f"{f_name}_{scheme}") for f_name in file_olds)
+    snapshot_files(pairs)
 
 
 def copy_result_files_to_path(config, files, path, schemes=None, sattype='gns'):
     """
     Purpose: Copy result files to another path
     e,g, cp upd_nl_2019100_G ${upd_dir}
+    return: list of the copied files in path
     """
     if not os.path.isdir(path):
         # logging.warning(f"Input path {path} not exists, creating...")
@@ -591,27 +639,19 @@ def copy_result_files_to_path(config, files, path, schemes=None, sattype='gns'):
             os.makedirs(path)
         except FileExistsError:
             logging.warning(f"path already exists: {path}")
+    f_srcs = []
     for file in files:
         file_olds = config.get_xml_file(file.lower(), check=False, sattype=sattype)
         for f_name in file_olds:
-            if not schemes:
-                if os.path.isfile(f_name):
-                    try:
-                        shutil.copy(f_name, path)
-                    except IOError as dummy_e:
-                        logging.warning(f"unable to copy file {f_name}")
-                else:
-                    logging.warning(f"file not found {f_name}")
-            else:
-                for sch in schemes:
-                    f_new = f"{f_name}_{sch}"
-                    if os.path.isfile(f_new):
-                        try:
-                            shutil.copy(f_new, path)
-                        except IOError as dummy_e:
-                            logging.warning(f"unable to copy file {f_new}")
-                    else:
-                        logging.warning(f"file not found {f_new}")
+            f_srcs.extend([f_name] if not schemes else [f"{f_name}_{sch}" for sch in schemes])
+    pairs = []
+    for f_src in f_srcs:
+        if os.path.isfile(f_src):
+            pairs.append((f_src, os.path.join(path, os.path.basename(f_src))))
+        else:
+            logging.warning(f"file not found {f_src}")
+    snapshot_files(pairs)
+    return [dst for _, dst in pairs if os.path.isfile(dst)]
 
 
 def get_grg_wsb(config):
@@ -626,28 +666,13 @@ def get_grg_wsb(config):
         if not clk_file[0:3] in ['grg', 'grm', 'gr2']:
             continue
         f_clks_select.append(f_clk)
-    if f_clks_select:
-        idx = int(len(f_clks_select) / 2)  # choose the WSB of the middle day
-        f_clk = f_clks_select[idx]
-        wlupd = []
-        with open(f_clk) as file_object:
-            for line in file_object:
-                if line.find('WL') == 0:
-                    info = line.split()
-                    sat = info[1]
-                    upd = -1.0 * float(info[9])
-                    wlupd.append({'sat': sat, 'wsb': upd})
-                if line.find('END OF HEADER') > 0:
-                    break
-    else:
+    if not f_clks_select:
         logging.error("integer clock product not found")
         return
-    with open(f_wsb, 'w') as file_object:
-        line = "% UPD generated from CNES/CLS clock using upd_wl\n"
-        file_object.write(line)
-        for rec in wlupd:
-            line = f" {rec['sat']:>3s}{rec['wsb']:>18.3f}{0.01:>10.3f}{50:>5d}\n"
-            file_object.write(line)
+    idx = int(len(f_clks_select) / 2)  # choose the WSB of the middle day
+    wsb = read_clk_wsb(f_clks_select[idx])
+    if wsb is not None:
+        wsb.write(f_wsb, eof=False)
 
 
 def merge_upd_bds(config, files):
@@ -685,52 +710,61 @@ def merge_upd_all(config, gsys, files):
     config.gsys = gsys
 
 
-def merge_upd(f_ins, f_out, mode, intv=30):
+def iter_upd_epochs(f_upd):
+    """
+    Purpose: read an epoch-wise UPD file block by block
+    Yields : ((mjd, sod), epoch_line, records)
+    """
+    try:
+        with open_gnss(f_upd) as f:
+            key, head, recs = None, '', []
+            for line in f:
+                if "EPOCH-TIME" in line:
+                    if key is not None:
+                        yield key, head, recs
+                    mjd, sod = line[12:].split()[0:2]
+                    key, head, recs = (int(mjd), round(float(sod), 3)), line, []
+                elif line[0] == '%' or line.startswith("EOF"):
+                    continue
+                elif key is not None:
+                    recs.append(line)
+            if key is not None:
+                yield key, head, recs
+    except FileNotFoundError:
+        logging.warning(f"file not found {f_upd}")
+
+
+def merge_epo_upd(f_ins, f_out, header='% UPD generated using upd_NL\n', intv=0):
+    """
+    Purpose: k-way merge of epoch-wise UPD files by epoch time
+             only one epoch of each file is held in memory, epochs missing in some files are kept
+    Inputs : intv   if > 0, epochs off the grid of intv seconds are dropped
+    """
+    streams = [iter_upd_epochs(f) for f in f_ins]
+    nepo = 0
+    with open(f_out, 'w') as f:
+        f.write(header)
+        for key, blocks in groupby(heapq.merge(*streams, key=itemgetter(0)), key=itemgetter(0)):
+            if intv > 0 and round(key[1]) % intv != 0:
+                continue
+            blocks = list(blocks)
+            f.write(blocks[0][1])
+            for blk in blocks:
+                f.writelines(blk[2])
+            nepo += 1
+        f.write("EOF\n")
+    return nepo
+
+
+def merge_upd(f_ins, f_out, mode):
+    """ merge UPD files of different systems, epoch-wise NL files by epoch time """
     if mode == "NL":
-        lines_in = []
-        nlines = []
-        nsats = []
-        idx_sys = []
-        for isys in range(0, len(f_ins)):
-            idxHeads = []
-            with open(f_ins[isys]) as file_object:
-                lines = file_object.readlines()
-            nline = len(lines)
-            nlines.append(nline)
-            for i in range(0, nline):
-                lines_in.append(lines[i])
-                if len(idxHeads) < 3:
-                    if "EPOCH-TIME" in lines[i]:
-                        idxHeads.append(i)
-            recLen = idxHeads[1] - idxHeads[0] - 1
-            nsats.append(recLen)
-
-        idx_sys.append(0)
-        idx = nlines[0]
-        for isys in range(1, len(f_ins)):
-            idx_sys.append(idx)
-            idx += nlines[isys]
-
-        nepo = int(86400 / intv) + 1
-        with open(f_out, 'w') as file_object:
-            file_object.write('% UPD generated using upd_NL\n')
-            for i in range(1, nepo):
-                idx1 = 2 + (i - 1) * (nsats[0] + 1) - 1
-                idx2 = 1 + i * (nsats[0] + 1) - 1
-                for j in range(idx1, idx2 + 1):
-                    file_object.write(lines_in[j])
-
-                for isys in range(1, len(f_ins)):
-                    idx1 = idx_sys[isys] + 3 + (i - 1) * (nsats[isys] + 1) - 1
-                    idx2 = idx_sys[isys] + 1 + i * (nsats[isys] + 1) - 1
-                    for j in range(idx1, idx2 + 1):
-                        file_object.write(lines_in[j])
-            file_object.write("EOF\n")
+        merge_epo_upd(f_ins, f_out)
     elif mode in ["EWL25", "EWL24", "EWL", "WL"]:
         with open(f_out, 'w') as f1:
             f1.write(f"% UPD generated using upd_{mode}\n")
             for file in f_ins:
-                with open(file) as f2:
+                with open_gnss(file) as f2:
                     for line in f2:
                         if line[0] != "%" and line.find("EOF") < 0:
                             f1.write(line)
@@ -740,7 +774,7 @@ def merge_upd(f_ins, f_out, mode, intv=30):
 def get_crd_snx(f_snx, site_list):
     data = []
     try:
-        with open(f_snx, 'r', encoding='UTF-8') as f:
+        with open_gnss(f_snx, encoding='UTF-8') as f:
             block = ''
             for line in f:
                 if line.startswith('-SOLUTION/ESTIMATE'):
@@ -784,7 +818,7 @@ def get_crd_snx(f_snx, site_list):
 
 def get_crd_res(f_res, site_list, max_sig=8):
     try:
-        with open(f_res) as f:
+        with open_gnss(f_res) as f:
             lines = f.readlines()
     except FileNotFoundError:
         logging.warning(f'file not found {f_res}')
@@ -862,9 +896,7 @@ def xml_receiver_snx(sites: list, f_snxs: list, f_xml):
     rec.text = ' '.join([s.upper() for s in sites_used])
     root.append(receiver)
 
-    tree = ET.ElementTree(root)
-    pretty_xml(root, '\t', '\n', 0)
-    tree.write(f_xml, encoding='utf-8', xml_declaration=True)
+    write_xml(root, f_xml)
 
 
 def mkdir(dir_list):
@@ -876,3 +908,12 @@ def mkdir(dir_list):
 def _raise_error(msg):
     logging.critical(msg)
     raise SystemExit(msg)
+
+
+__all__ = ['timethis', 'timeblock', 'split_receivers', 'pretty_xml', 'format_xml', 'write_xml',
+           'write_xml_files', 'check_pod_sigma',
+           'check_pod_residuals', 'check_pod_residuals_new', 'good_tb_site', 'check_turboedit_log',
+           'check_brd_orbfit', 'edit_ics', 'check_ics', 'check_res_sigma', 'backup_dir', 'copy_dir',
+           'backup_files', 'recover_files', 'get_rnxc_satlist', 'copy_ambflag_from', 'copy_result_files',
+           'copy_result_files_to_path', 'get_grg_wsb', 'merge_upd_bds', 'merge_upd_all', 'iter_upd_epochs',
+           'merge_epo_upd', 'merge_upd', 'get_crd_snx', 'get_crd_res', 'xml_receiver_snx', 'mkdir']
@@ -0,0 +1,231 @@
+import os
+import logging
+from .constants import gns_name
+from .gnss_clock import read_clock_header
+from .gnss_io import open_gnss, product_cache_file, save_product_cache, ProductMemo
+from .lazy_import import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+_CACHE_VERSION = 1
+# in-process memo of the last UPD files read (EWL/WL/NL of a few days), the files are small
+_upd_memo = ProductMemo(16)
+
+
+class UpdProduct:
+    """
+    Purpose: UPD product held as arrays (mjd, sod, sat, val, sig, nobs)
+             daily products (EWL/WL) have mjd = 0 and sod = 0
+    """
+    __slots__ = ['header', 'mjd', 'sod', 'sat', 'val', 'sig', 'nobs', '_sat_idx', '_epochs', '_epo_beg']
+
+    def __init__(self, mjd, sod, sat, val, sig, nobs, header=None):
+        self.header = list(header) if header else []
+        self.mjd = np.asarray(mjd, dtype=np.int32)
+        self.sod = np.asarray(sod, dtype=np.float64)
+        self.sat = np.asarray(sat, dtype='U3')
+        self.val = np.asarray(val, dtype=np.float64)
+        self.sig = np.asarray(sig, dtype=np.float64)
+        self.nobs = np.asarray(nobs, dtype=np.int32)
+        self._sat_idx = None
+        self._epochs = None
+        self._epo_beg = None
+
+    def __len__(self):
+        return len(self.sat)
+
+    @property
+    def is_epoch(self):
+        """ True for epoch-wise products (NL) """
+        return len(self) > 0 and bool(np.any(self.mjd > 0))
+
+    @property
+    def fmjd(self):
+        return self.mjd + self.sod / 86400.0
+
+    @property
+    def sats(self):
+        return sorted(self._index().keys())
+
+    def _index(self):
+        if self._sat_idx is None:
+            order = np.lexsort((self.fmjd, self.sat))
+            sats, beg = np.unique(self.sat[order], return_index=True)
+            end = np.append(beg[1:], len(order))
+            self._sat_idx = {s: order[i:j] for s, i, j in zip(sats, beg, end)}
+        return self._sat_idx
+
+    def get(self, sat):
+        """ all records of a satellite, sorted by epoch """
+        idx = self._index().get(sat)
+        if idx is None:
+            return None
+        return self.fmjd[idx], self.val[idx], self.sig[idx], self.nobs[idx]
+
+    def value(self, sat, mjd=0, sod=0.0):
+        """ UPD value of a satellite at (or just before) an epoch, None if not available """
+        idx = self._index().get(sat)
+        if idx is None:
+            return None
+        if not self.is_epoch:
+            return float(self.val[idx[0]])
+        t = self.fmjd[idx]
+        i = np.searchsorted(t, mjd + sod / 86400.0 + 1e-9, side='right') - 1
+        return float(self.val[idx[i]]) if i >= 0 else None
+
+    def epoch(self, mjd, sod):
+        """ records of the epoch (mjd, sod) found by binary search """
+        if self._epochs is None:
+            order = np.argsort(self.fmjd, kind='stable')
+            self._epochs, beg = np.unique(self.fmjd[order], return_index=True)
+            self._epo_beg = (order, np.append(beg, len(order)))
+        order, beg = self._epo_beg
+        t = mjd + sod / 86400.0
+        i = np.searchsorted(self._epochs, t - 1e-8)
+        if i >= len(self._epochs) or abs(self._epochs[i] - t) > 1e-8:
+            return self.subset(np.array([], dtype=int))
+        return self.subset(order[beg[i]:beg[i + 1]])
+
+    def subset(self, idx):
+        return UpdProduct(self.mjd[idx], self.sod[idx], self.sat[idx], self.val[idx], self.sig[idx],
+                          self.nobs[idx], self.header)
+
+    def to_frame(self):
+        """ DataFrame with columns date, sat, upd, sig, nobs, sys """
+        data = pd.DataFrame({'sat': self.sat, 'upd': self.val, 'sig': self.sig, 'nobs': self.nobs})
+        data['sys'] = data.sat.str[0].map({g: gns_name(g) for g in set(data.sat.str[0])})
+        data.insert(0, 'date', pd.Timestamp(1858, 11, 17) + pd.to_timedelta(self.mjd, unit='D') +
+                    pd.to_timedelta(self.sod, unit='s'))
+        return data
+
+    @classmethod
+    def concat(cls, products, header=None):
+        products = [p for p in products if p is not None]
+        if not products:
+            return cls([], [], [], [], [], [], header)
+        return cls(*[np.concatenate([getattr(p, k) for p in products])
+                     for k in ['mjd', 'sod', 'sat', 'val', 'sig', 'nobs']],
+                   header if header is not None else products[0].header)
+
+    @classmethod
+    def from_lines(cls, lines):
+        header, mjd, sod, sat, val, sig, nobs = [], [], [], [], [], [], []
+        cur_mjd, cur_sod = 0, 0.0
+        for line in lines:
+            if line[0:1] == '%':
+                header.append(line)
+            elif line.startswith(' EPOCH-TIME'):
+                info = line[12:].split()
+                cur_mjd, cur_sod = int(info[0]), float(info[1])
+            elif line[0:1] == ' ':
+                info = line.split()
+                if len(info) < 4:
+                    continue
+                mjd.append(cur_mjd)
+                sod.append(cur_sod)
+                sat.append(info[0])
+                val.append(float(info[1]))
+                sig.append(float(info[2]))
+                nobs.append(int(info[3]))
+        return cls(mjd, sod, sat, val, sig, nobs, header)
+
+    def write(self, f_name, header=None, eof=True):
+        """ write the UPD file in the GREAT format """
+        header = header if header is not None else self.header
+        lines = list(header)
+        if self.is_epoch:
+            order = np.lexsort((self.sat, self.fmjd))
+            last = None
+            for i in order:
+                if (self.mjd[i], self.sod[i]) != last:
+                    last = (self.mjd[i], self.sod[i])
+                    lines.append(f" EPOCH-TIME{self.mjd[i]:>8d}{self.sod[i]:>10.1f}\n")
+                lines.append(f" {self.sat[i]:>3s}{self.val[i]:>18.3f}{self.sig[i]:>10.3f}{self.nobs[i]:>5d}\n")
+        else:
+            for i in range(len(self)):
+                lines.append(f" {self.sat[i]:>3s}{self.val[i]:>18.3f}{self.sig[i]:>10.3f}{self.nobs[i]:>5d}\n")
+        if eof:
+            lines.append("EOF\n")
+        with open(f_name, 'w') as f:
+            f.write(''.join(lines))
+
+    def save_npz(self, f_npz, stamp=(0, 0)):
+        np.savez(f_npz, version=_CACHE_VERSION, stamp=np.array(stamp, dtype=np.int64),
+                 header=np.array(self.header, dtype=str), mjd=self.mjd, sod=self.sod, sat=self.sat,
+                 val=self.val, sig=self.sig, nobs=self.nobs)
+
+    @classmethod
+    def load_npz(cls, f_npz, stamp=None):
+        """ load a binary cache, None if it is invalid or out of date """
+        try:
+            with np.load(f_npz, allow_pickle=False) as d:
+                if int(d['version']) != _CACHE_VERSION:
+                    return
+                if stamp is not None and tuple(d['stamp'].tolist()) != tuple(stamp):
+                    return
+                return cls(d['mjd'], d['sod'], d['sat'], d['val'], d['sig'], d['nobs'], d['header'].tolist())
+        except (OSError, KeyError, ValueError):
+            return
+
+
+def read_upd(f_name, cache=True):
+    """
+    Purpose: read an EWL/WL/NL UPD file, each file is parsed only once
+             the last files read are kept in memory and (cache=True) in a binary cache validated by size and mtime,
+             below the product cache root (set_product_cache), not in the archive
+    """
+    try:
+        st = os.stat(f_name)
+    except FileNotFoundError:
+        logging.warning(f"file not found {f_name}")
+        return
+    key = os.path.abspath(f_name)
+    stamp = (st.st_size, st.st_mtime_ns)
+    upd = _upd_memo.get(key, stamp)
+    if upd is not None:
+        return upd
+
+    f_npz = product_cache_file(f_name, 'upd')
+    upd = UpdProduct.load_npz(f_npz, stamp) if cache and os.path.isfile(f_npz) else None
+    if upd is None:
+        with open_gnss(f_name) as f:
+            upd = UpdProduct.from_lines(f.readlines())
+        if cache:
+            save_product_cache(f_npz, lambda f: upd.save_npz(f, stamp))
+    _upd_memo.put(key, stamp, upd)
+    return upd
+
+
+def cache_upd_files(files):
+    """ build the binary cache of UPD files, e.g. after they are archived """
+    return sum(1 for f in files if read_upd(f) is not None)
+
+
+def read_clk_wsb(f_clk):
+    """ WL UPD (wide-lane satellite bias) from the header of a CNES/CLS integer clock file """
+    try:
+        st = os.stat(f_clk)
+    except FileNotFoundError:
+        logging.warning(f"file not found {f_clk}")
+        return
+    key = f"{os.path.abspath(f_clk)}#wsb"
+    stamp = (st.st_size, st.st_mtime_ns)
+    wsb = _upd_memo.get(key, stamp)
+    if wsb is not None:
+        return wsb
+
+    sat, val = [], []
+    for line in read_clock_header(f_clk):
+        if line.find('WL') == 0:
+            info = line.split()
+            sat.append(info[1])
+            val.append(-1.0 * float(info[9]))
+    n = len(sat)
+    wsb = UpdProduct(np.zeros(n), np.zeros(n), sat, val, np.full(n, 0.01), np.full(n, 50),
+                     ["% UPD generated from CNES/CLS clock using upd_wl\n"])
+    _upd_memo.put(key, stamp, wsb)
+    return wsb
+
+
+__all__ = ['UpdProduct', 'read_upd', 'cache_upd_files', 'read_clk_wsb']
@@ -0,0 +1,203 @@
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from .constants import gns_sat, MAX_THREAD
+from .coordinate import _ellipsoid
+from .gnss_files import read_sp3_file
+from .lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+# number of stations (grid points) handled in one NumPy batch, keeps the
+# line-of-sight array (npt x nsat x 3) below ~30 MB per batch
+_STA_CHUNK = 8192
+
+
+def iter_sp3_epochs(data, sats=None):
+    """
+    Purpose: stream the output of read_sp3_file epoch by epoch
+    Yields:  (fmjd, sod, sats, xyz), xyz in meters with shape (nsat, 3)
+    """
+    if data is None or data.empty:
+        return
+    if sats is not None:
+        data = data[data.sat.isin(list(sats))]
+    data = data.sort_values(by=['epoch', 'sat'], kind='stable')
+    epo = data.epoch.values
+    sod = data.sod.values
+    sat = data.sat.values
+    xyz = data[['px', 'py', 'pz']].values
+    idx = np.concatenate(([0], np.flatnonzero(np.diff(epo)) + 1, [len(epo)]))
+    for ibeg, iend in zip(idx[:-1], idx[1:]):
+        if ibeg == iend:
+            continue
+        yield epo[ibeg], sod[ibeg], sat[ibeg:iend], xyz[ibeg:iend]
+
+
+def _gns_sats(gs) -> list:
+    """ 'GREC' or ['G', 'C3'] => sorted satellite list """
+    gsys = list(gs) if isinstance(gs, str) else gs
+    sats = []
+    for g in gsys:
+        sats.extend(gns_sat(g))
+    return sorted(set(sats))
+
+
+def _grid_xyz(lats, lons, ellipsoid='GRS80'):
+    """ geodetic grid (degree, h=0) => ECEF coordinates and local up vectors """
+    ell = _ellipsoid(ellipsoid)
+    lat, lon = np.meshgrid(np.deg2rad(lats), np.deg2rad(lons), indexing='ij')
+    lat, lon = lat.ravel(), lon.ravel()
+    e2 = ell.e1 ** 2
+    n = ell.a / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+    up = np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+    xyz = np.column_stack((n * up[:, 0], n * up[:, 1], (1 - e2) * n * up[:, 2]))
+    return xyz, up
+
+
+def _dop(los, vis):
+    """ GDOP and PDOP of each station from unit line-of-sight vectors (npt, nsat, 3) """
+    npt = los.shape[0]
+    gdop = np.full(npt, np.nan, dtype=np.float32)
+    pdop = np.full(npt, np.nan, dtype=np.float32)
+    ok = vis.sum(axis=1) >= 4
+    if not ok.any():
+        return gdop, pdop
+    w = vis[ok][..., None]
+    g = np.concatenate((-los[ok], np.ones(los[ok].shape[:2] + (1,))), axis=2) * w
+    n = np.einsum('psi,psj->pij', g, g)
+    try:
+        q = np.linalg.inv(n)
+    except np.linalg.LinAlgError:
+        q = np.linalg.pinv(n)
+    diag = np.diagonal(q, axis1=1, axis2=2)
+    gdop[ok] = np.sqrt(np.abs(diag.sum(axis=1)))
+    pdop[ok] = np.sqrt(np.abs(diag[:, 0:3].sum(axis=1)))
+    return gdop, pdop
+
+
+def _visibility_block(xyz_sat, xyz_sta, up, cut, dop=True):
+    """
+    Purpose: number of visible satellites (and DOP) for a block of epochs
+    Inputs : xyz_sat    satellite positions (nepo, nsat, 3), NaN if not available
+             xyz_sta    station positions (npt, 3)
+             up         local up unit vectors of stations (npt, 3)
+             cut        cut-off elevation (degree)
+    """
+    nepo = xyz_sat.shape[0]
+    npt = xyz_sta.shape[0]
+    sin_cut = np.sin(np.deg2rad(cut))
+    nvis = np.zeros((nepo, npt), dtype=np.int16)
+    gdop = np.full((nepo, npt), np.nan, dtype=np.float32)
+    pdop = np.full((nepo, npt), np.nan, dtype=np.float32)
+    for i in range(nepo):
+        sat = xyz_sat[i][~np.isnan(xyz_sat[i, :, 0])]
+        if len(sat) == 0:
+            continue
+        for ibeg in range(0, npt, _STA_CHUNK):
+            iend = min(ibeg + _STA_CHUNK, npt)
+            los = sat[None, :, :] - xyz_sta[ibeg:iend, None, :]
+            los /= np.linalg.norm(los, axis=2, keepdims=True)
+            vis = np.einsum('psk,pk->ps', los, up[ibeg:iend]) > sin_cut
+            nvis[i, ibeg:iend] = vis.sum(axis=1)
+            if dop:
+                gdop[i, ibeg:iend], pdop[i, ibeg:iend] = _dop(los, vis)
+    return nvis, gdop, pdop
+
+
+def _visibility_series(data, sats, xyz_sta, up, cut, dop, nthread, block):
+    """ dispatch blocks of SP3 epochs to a process pool """
+    sats = np.asarray(sats)
+    epochs = []
+    futures = []
+    with ProcessPoolExecutor(max(1, nthread)) as pool:
+        buf = []
+        for fmjd, _, esat, exyz in iter_sp3_epochs(data, sats):
+            cube = np.full((len(sats), 3), np.nan)
+            cube[np.searchsorted(sats, esat)] = exyz
+            buf.append(cube)
+            epochs.append(fmjd)
+            if len(buf) == block:
+                futures.append(pool.submit(_visibility_block, np.stack(buf), xyz_sta, up, cut, dop))
+                buf = []
+        if buf:
+            futures.append(pool.submit(_visibility_block, np.stack(buf), xyz_sta, up, cut, dop))
+        results = [f.result() for f in futures]
+
+    if not results:
+        return np.array(epochs), None, None, None
+    nvis = np.concatenate([r[0] for r in results])
+    gdop = np.concatenate([r[1] for r in results])
+    pdop = np.concatenate([r[2] for r in results])
+    return np.array(epochs), nvis, gdop, pdop
+
+
+def grid_visibility(f_sp3, f_out='', gs='G', cut=10, dlat=1.0, dlon=1.0, dop=True, nthread=MAX_THREAD, block=30):
+    """
+    Purpose: time series of visible satellites, GDOP and PDOP on a global grid
+    Inputs : f_sp3      SP3 file
+             f_out      output npz file (optional)
+             gs         GNSS systems, e.g. 'G', 'GREC'
+             cut        cut-off elevation (degree)
+             dlat/dlon  grid spacing (degree), grid points are cell centers
+    Outputs: dict of arrays, mjd (nepo), lat (nlat), lon (nlon), nsat/gdop/pdop (nepo, nlat, nlon)
+    """
+    start = time.time()
+    data = read_sp3_file(f_sp3)
+    if data is None or data.empty:
+        return
+    sats = [s for s in _gns_sats(gs) if s in set(data.sat)]
+    if not sats:
+        logging.warning(f"no {gs} satellites in {f_sp3}")
+        return
+
+    lats = np.arange(-90 + dlat / 2, 90, dlat)
+    lons = np.arange(-180 + dlon / 2, 180, dlon)
+    xyz_sta, up = _grid_xyz(lats, lons)
+    epochs, nvis, gdop, pdop = _visibility_series(data, sats, xyz_sta, up, cut, dop, nthread, block)
+    if nvis is None:
+        return
+    shape = (len(epochs), len(lats), len(lons))
+    result = {'mjd': epochs, 'lat': lats, 'lon': lons, 'nsat': nvis.reshape(shape)}
+    if dop:
+        result['gdop'] = gdop.reshape(shape)
+        result['pdop'] = pdop.reshape(shape)
+    if f_out:
+        np.savez_compressed(f_out, **result)
+    end = time.time()
+    logging.info(f"visibility of {len(sats)} satellites at {len(epochs)} epochs and {xyz_sta.shape[0]} grid points "
+                 f"is computed in {end - start:.2f} seconds")
+    return result
+
+
+def site_visibility(f_sp3, crds: dict, f_out='', gs='G', cut=10, dop=True, nthread=MAX_THREAD, block=30):
+    """
+    Purpose: time series of visible satellites, GDOP and PDOP of stations
+    Inputs : crds       {site: [x, y, z]} ECEF coordinates (m)
+    Outputs: dict of arrays, mjd (nepo), site (nsite), nsat/gdop/pdop (nepo, nsite)
+    """
+    data = read_sp3_file(f_sp3)
+    if data is None or data.empty or not crds:
+        return
+    sats = [s for s in _gns_sats(gs) if s in set(data.sat)]
+    if not sats:
+        logging.warning(f"no {gs} satellites in {f_sp3}")
+        return
+
+    sites = list(crds.keys())
+    xyz_sta = np.array([crds[s] for s in sites], dtype=float)
+    # geocentric up direction, the same as sat_visible
+    up = xyz_sta / np.linalg.norm(xyz_sta, axis=1, keepdims=True)
+    epochs, nvis, gdop, pdop = _visibility_series(data, sats, xyz_sta, up, cut, dop, nthread, block)
+    if nvis is None:
+        return
+    result = {'mjd': epochs, 'site': np.array(sites), 'nsat': nvis}
+    if dop:
+        result['gdop'] = gdop
+        result['pdop'] = pdop
+    if f_out:
+        np.savez_compressed(f_out, **result)
+    return result
+
+
+__all__ = ['iter_sp3_epochs', 'grid_visibility', 'site_visibility']
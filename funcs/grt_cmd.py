@@ -3,9 +3,13 @@ import subprocess
 import platform
 import xml.etree.ElementTree as ET
 import os
+import time
 import logging
-from .gnss_tools import timeblock, split_receivers, get_rnxc_satlist, pretty_xml
+from .gnss_tools import timeblock, split_receivers, get_rnxc_satlist, write_xml, write_xml_files
 from .gnss_config import GnssConfig
+from .gnss_io import stat_cache, invalidate_stat
+from .gnss_runcache import RunCache
+from .gnss_resource import ResourceBudget, children_maxrss
 from .constants import MAX_THREAD, gns_sat
 
 
@@ -19,8 +23,20 @@ def _run_cmd(cmd):
         return False
 
 
+def _preedit_receiver():
+    """ <receiver> node of xml/preedit.xml, None if not found """
+    f_preedit = os.path.join('xml', 'preedit.xml')
+    if os.path.isfile(f_preedit):
+        return ET.parse(f_preedit).getroot().find('receiver')
+    return None
+
+
 class GrtCmd:
     grt_app = ''
+    # threads a single process of the binary uses efficiently, 1 if num_threads is not set in the xml
+    max_threads = 1
+    # False for the binaries editing their inputs in place, their runs can not be restored from the run cache
+    cacheable = True
 
     def __init__(self, config: GnssConfig, label=None, nmp=1, stop=True, str_args='', **kwargs):
         if label is None:
@@ -36,7 +52,9 @@ class GrtCmd:
         self.label = label
         self.xml = os.path.join('xml', f'{self.label}.xml')
         self.log = os.path.join('tmp', f'{self.label}.log')
-        self.nmp = min(nmp, MAX_THREAD)
+        self.nmp = max(1, nmp)
+        self.num_threads = min(self.max_threads, MAX_THREAD)
+        self._budget = ResourceBudget.from_config(config)
         self.stop = stop
         self.str_args = str_args
 
@@ -44,24 +62,21 @@ class GrtCmd:
         raise NotImplementedError
 
     def xml_receiver(self):
-        f_preedit = os.path.join('xml', 'preedit.xml')
-        rec = None
-        if os.path.isfile(f_preedit):
-            ref_tree = ET.parse(f_preedit)
-            ref_root = ref_tree.getroot()
-            rec = ref_root.find('receiver')
-        
+        rec = self._config.xml_cached('preedit_receiver', _preedit_receiver)
         if not rec:
             rec = self._config.get_xml_receiver()
         return rec
 
     def prepare_xml(self, ithd=-1):
-        root = self.form_xml(ithd)
-        tree = ET.ElementTree(root)
-        pretty_xml(root, '\t', '\n', 0)
-        tree.write(self.xml, encoding='utf-8', xml_declaration=True)
+        write_xml(self.form_xml(ithd), self.xml)
 
     def form_cmd(self):
+        # the shared part of the xml (gns, process, inputs, station coordinates ...) is built once,
+        # only the receiver-dependent nodes are formed for each shard
+        with self._config.xml_cache(), stat_cache():
+            return self._form_cmd()
+
+    def _form_cmd(self):
         if self.nmp < 2:
             self.prepare_xml()
             return [f"{self.grt_exe} -x {self.xml} {self.str_args} > {self.log} 2>&1"]
@@ -70,6 +85,7 @@ class GrtCmd:
             all_leos = self._config.leo_list
             sites, leos = split_receivers(self._config, self.nmp)
             cmds = []
+            xmls = []
             for i in range(self.nmp):
                 if i >= len(sites):
                     self._config.site_list = []
@@ -79,11 +95,12 @@ class GrtCmd:
                     self._config.leo_list = []
                 self.xml = os.path.join('xml', f"{self.label}{i + 1:0>2d}.xml")
                 self.log = os.path.join('tmp', f"{self.label}{i + 1:0>2d}.log")
-                self.prepare_xml(i)
+                xmls.append((self.form_xml(i), self.xml))
                 cmds.append(f"{self.grt_exe} -x {self.xml} {self.str_args} > {self.log} 2>&1")
 
             self._config.site_list = all_sites
             self._config.leo_list = all_leos
+            write_xml_files(xmls)
             return cmds
 
     def check(self):
@@ -93,9 +110,9 @@ class GrtCmd:
             os.makedirs('xml')
         if not os.path.isdir('tmp'):
             os.makedirs('tmp')
-        self.nmp = min(self.nmp, len(self._config.all_sites))
-        if self.nmp == 0:
-            self.nmp = 1
+        # processes x threads from the core and memory budget
+        nrec = max(1, len(self._config.all_sites))
+        self.nmp, self.num_threads = self._budget.plan(self.grt_app, self.nmp, nrec, self.max_threads)
         return True
 
     def run(self):
@@ -103,12 +120,36 @@ class GrtCmd:
             if self.stop:
                 raise RuntimeError('check failed')
             return
-
+        # inside an outer stat_cache(), the outputs of the command are in the work directory
+        invalidate_stat(below=os.getcwd())
+        try:
+            self._run()
+        finally:
+            invalidate_stat(below=os.getcwd())
+
+    def _run(self):
         cmds = self.form_cmd()
-        with timeblock(f'Normal end [{len(cmds):0>2d}] {self.label}'):
-            with ThreadPoolExecutor(self.nmp) as pool:
-                results = pool.map(_run_cmd, cmds)
+        cache = RunCache.from_config(self._config) if self.cacheable else None
+        key = cache.key(self.grt_exe, cmds) if cache else None
+        if key and cache.restore(key, self.label):
+            return
 
+        start = time.time()
+        maxrss = children_maxrss()
+        with self._budget.reserve(len(cmds) * self.num_threads, self.label):
+            with timeblock(f'Normal end [{len(cmds):0>2d}] {self.label}', stage=self.grt_app, nmp=len(cmds),
+                           threads=self.num_threads, receivers=len(self._config.all_sites),
+                           satellites=len(self._config.all_gnssat)):
+                with ThreadPoolExecutor(self.nmp) as pool:
+                    results = list(pool.map(_run_cmd, cmds))
+
+        if all(results):
+            # the peak memory is known only if a process of this run is the largest one so far
+            rss = children_maxrss()
+            self._budget.record(self.grt_app, len(cmds), self.num_threads, max(1, len(self._config.all_sites)),
+                                time.time() - start, rss if rss > maxrss else 0)
+            if key:
+                cache.save(key, cmds, start, self.label)
         for rst in results:
             if self.stop and not rst:
                 raise RuntimeError
@@ -175,6 +216,7 @@ class GrtPreedit(GrtCmd):
 
 class GrtOi(GrtCmd):
     grt_app = 'great_oi'
+    max_threads = 6
 
     def __init__(self, config, label=None, stop=True, sattype='gns'):
         str_args = '-leo' if sattype == 'leo' else ''
@@ -184,7 +226,7 @@ class GrtOi(GrtCmd):
     def form_xml(self, ithd=-1):
         root = ET.Element('config')
         root.append(self._config.get_xml_gen(['sys']))
-        ET.SubElement(root, 'process', attrib={'num_threads': str(min(MAX_THREAD, 6))})
+        ET.SubElement(root, 'process', attrib={'num_threads': str(self.num_threads)})
         root.append(self._config.get_xml_force(self.sattype))
         f_inputs = ['blq', 'poleut1', 'oceantide', 'leapsecond', 'satpars', 'de', 'egm']
         if self.sattype == 'leo':
@@ -213,6 +255,7 @@ class GrtOi(GrtCmd):
 
 class GrtSp3orb(GrtOi):
     grt_app = 'great_sp3orb'
+    max_threads = 1
 
     def form_xml(self, ithd=-1):
         root = ET.Element('config')
@@ -244,6 +287,7 @@ class GrtSp3orb(GrtOi):
 
 class GrtOrbsp3(GrtOi):
     grt_app = 'great_orbsp3'
+    max_threads = 1
 
     def form_xml(self, ithd=-1):
         root = ET.Element('config')
@@ -384,6 +428,8 @@ class GrtClkdif(GrtCmd):
 
 class GrtEditres(GrtCmd):
     grt_app = 'great_editres'
+    # the ambflag files of <inputs> are edited
+    cacheable = False
 
     def __init__(self, config, label=None, nmp=1, stop=True,
                  nshort=600, bad=50, jump=50, freq='LC12', mode='L12', edt_amb=False, all_sites=False):
@@ -543,6 +589,7 @@ class GrtUpdlsq(GrtCmd):
 
 class GrtAmbfix(GrtCmd):
     grt_app = 'great_ambfix'
+    max_threads = 6
     amb_types = ["DD", "SD", "UD"]
 
     def __init__(self, config, mode: str, label=None, nmp=1, stop=True, all_sites=False):
@@ -560,7 +607,7 @@ class GrtAmbfix(GrtCmd):
         # <process>
         proc = ET.SubElement(root, 'process', attrib={
             'obs_combination': self._config.obs_combination,
-            'frequency': str(self._config.freq), 'num_threads': str(min(MAX_THREAD, 6, int(16 / self.nmp)))})
+            'frequency': str(self._config.freq), 'num_threads': str(self.num_threads)})
         elem = ET.SubElement(proc, 'read_ofile_mode')
         elem.text = "REALTIME"
         # <ambiguity>
@@ -640,6 +687,7 @@ class GrtAmbfixDd(GrtCmd):
 
 class GrtPodlsq(GrtCmd):
     grt_app = 'great_podlsq'
+    max_threads = 6
     f_outs = ['ics', 'satclk', 'recclk', 'recover']
 
     def __init__(self, config, label=None, stop=True, str_args='', fix_amb=False, use_res_crd=False):
@@ -650,16 +698,10 @@ class GrtPodlsq(GrtCmd):
             self.str_args = '-ambfix'
 
     def xml_receiver(self):
-        f_preedit = os.path.join('xml', 'preedit.xml')
         if self.use_res_crd:
             rec = self._config.get_xml_receiver(True)
         else:
-            rec  = None
-            if os.path.isfile(f_preedit):
-                ref_tree = ET.parse(f_preedit)
-                ref_root = ref_tree.getroot()
-                rec = ref_root.find('receiver')
-        
+            rec = self._config.xml_cached('preedit_receiver', _preedit_receiver)
             if not rec:
                 rec = self._config.get_xml_receiver()
         return rec
@@ -684,7 +726,7 @@ class GrtPodlsq(GrtCmd):
         else:
             proc.set('ref_clk', self._config.set_ref_clk(mode='site'))
         proc.set('sig_ref_clk', '0.001')
-        proc.set('num_threads', str(min(MAX_THREAD, 6)))
+        proc.set('num_threads', str(self.num_threads))
         proc.set('matrix_remove', 'true')
         proc.set('cmb_equ_multi_thread', 'true')
         # proc.set('sysbias_model', 'ISB+CON' if self._config.lsq_mode == 'LSQ' else 'ISB+WHIT')
@@ -742,7 +784,7 @@ class GrtPodleo(GrtPodlsq):
     def xml_proc(self):
         proc = self._config.get_xml_process()
         proc.set('ambfix', 'true' if self.fix_amb and self._config.lsq_mode == 'LSQ' else 'false')
-        proc.set('num_threads', str(min(MAX_THREAD, 6)))
+        proc.set('num_threads', str(self.num_threads))
         proc.set('matrix_remove', 'false')
         proc.set('cmb_equ_multi_thread', 'true')
         proc.set('lsq_buffer_size', '500')
@@ -837,12 +879,13 @@ class GrtPcelsq(GrtPodlsq):
 
 class GrtPpplsq(GrtPodlsq):
     grt_app = 'great_ppplsq'
+    max_threads = 1
     f_outs = ['ppp', 'enu', 'flt', 'ambupd', 'recover']
 
     def __init__(self, config, label=None, stop=True, nmp=1, fix_amb=False):
         super().__init__(config, label, stop)
         self.fix_amb = fix_amb
-        self.nmp = min(nmp, MAX_THREAD)
+        self.nmp = max(1, nmp)
 
     def xml_parameter(self):
         param = ET.Element('parameters')
@@ -883,3 +926,8 @@ class GrtPpplsq(GrtPodlsq):
             elem.text = 'SEARCH' if self.fix_amb else 'NO'
             root.append(amb)
         return root
+
+
+__all__ = ['GrtCmd', 'GrtTurboedit', 'GrtClockRepair', 'GrtPreedit', 'GrtOi', 'GrtSp3orb', 'GrtOrbsp3',
+           'GrtOrbfit', 'GrtOrbdif', 'GrtOrbfitLeo', 'GrtClkdif', 'GrtEditres', 'GrtConvobs', 'GrtUpdlsq',
+           'GrtAmbfix', 'GrtAmbfixD', 'GrtAmbfixDd', 'GrtPodlsq', 'GrtPodleo', 'GrtPcelsq', 'GrtPpplsq']
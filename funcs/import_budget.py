@@ -0,0 +1,124 @@
+"""
+Import-time budget of the entry points, run from the repository root:
+    python -m funcs.import_budget            check the import time of each entry point
+    python -m funcs.import_budget --update   save the current times (x margin) as the new budget
+The budgets are ratios to the import time of a few standard modules measured in the same run,
+so that they hold on slower or faster machines.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from importlib import import_module
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+_BUDGET = os.path.join(os.path.dirname(__file__), 'import_budget.json')
+# the module body is executed, but not the main function (__name__ != '__main__')
+_RUNNER = "import sys, runpy; sys.path.insert(0, {0!r}); runpy.run_path({1!r}, run_name='import_budget')"
+# reference of the budgets, standard modules imported by most entry points
+_BASELINE = "import logging, argparse, subprocess, json, datetime"
+
+
+def entry_points():
+    files = []
+    for app in ['app_gnss', 'app_plot']:
+        d = os.path.join(_ROOT, app)
+        files += [os.path.join(app, f) for f in sorted(os.listdir(d))
+                  if f.endswith('.py') and f != '__init__.py']
+    return files
+
+
+def import_time(entry, repeat=3):
+    """
+    Purpose: cumulative import time (ms) of an entry point by "python -X importtime", best of repeat
+    Return : (total ms, {top-level module: cumulative ms}), None if the entry point cannot be imported
+    """
+    f_py = os.path.join(_ROOT, entry)
+    return _import_time(entry, _RUNNER.format(os.path.dirname(f_py), f_py), repeat)
+
+
+def baseline_time(repeat=5):
+    """ cumulative import time (ms) of the reference modules on this machine """
+    return _import_time('baseline', _BASELINE, repeat)[0]
+
+
+def _import_time(label, code, repeat):
+    cmd = [sys.executable, '-X', 'importtime', '-c', code]
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(cmd, cwd=_ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            err = proc.stderr.strip().split('\n')[-1]
+            print(f"{label}: import failed, {err}")
+            return None
+        mods = {}
+        for line in proc.stderr.split('\n'):
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cum, name = line[12:].split('|')
+            if not name.startswith('  '):  # top-level imports only, nested ones are in cumulative
+                mods[name.strip()] = int(cum) / 1000.0
+        total = sum(mods.values())
+        if best is None or total < best[0]:
+            best = (total, mods)
+    return best
+
+
+def check_all_names():
+    """ the names of funcs._SUBMODULES must be the same as __all__ of each sub-module """
+    import funcs
+    ok = True
+    for mod, names in funcs._SUBMODULES.items():
+        real = getattr(import_module(f'funcs.{mod}'), '__all__', [])
+        if sorted(real) != sorted(names):
+            print(f"funcs.{mod}: __all__ differs from funcs._SUBMODULES, "
+                  f"missing {sorted(set(real) - set(names))}, unknown {sorted(set(names) - set(real))}")
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import-time budget of the entry points')
+    parser.add_argument('entry', nargs='*', help='entry points (default all app_gnss/app_plot scripts)')
+    parser.add_argument('--update', action='store_true', help='save the current import times as budget')
+    parser.add_argument('--margin', type=float, default=2.0, help='budget = margin x current time')
+    parser.add_argument('--top', type=int, default=3, help='number of the slowest modules to report')
+    args = parser.parse_args()
+
+    budget = {}
+    if os.path.isfile(_BUDGET):
+        with open(_BUDGET) as f:
+            budget = json.load(f)
+    ok = True
+    base = baseline_time()
+    print(f"{'baseline':32s} {base:8.1f} ms  ({_BASELINE[7:]})")
+    for entry in args.entry or entry_points():
+        res = import_time(entry)
+        if res is None:
+            ok = False
+            continue
+        total, mods = res
+        slow = ', '.join(f"{m} {t:.0f}" for m, t in sorted(mods.items(), key=lambda x: -x[1])[0:args.top])
+        if args.update:
+            budget[entry] = round(total / base * args.margin, 2)
+            print(f"{entry:32s} {total:8.1f} ms, budget {budget[entry]:5.2f} x baseline  ({slow})")
+            continue
+        limit = budget.get(entry)
+        status = 'no budget' if limit is None else ('ok' if total <= limit * base else 'OVER')
+        if status == 'OVER':
+            ok = False
+        ratio = f"{total / base:5.2f} x" + (f" <= {limit:5.2f}" if limit is not None else '')
+        print(f"{entry:32s} {total:8.1f} ms {ratio:>15s} {status:>9s}  ({slow})")
+
+    if args.update:
+        with open(_BUDGET, 'w') as f:
+            json.dump(budget, f, indent=2, sort_keys=True)
+            f.write('\n')
+    ok = check_all_names() and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+import sys
+import types
+import importlib
+
+
+class LazyModule(types.ModuleType):
+    """
+    Purpose: placeholder of a heavy module (numpy, pandas, matplotlib.pyplot ...)
+             the module is imported on the first attribute access, then its namespace is copied
+             into the placeholder so that later accesses cost the same as with a normal import
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_lazy_name'] = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__dict__['_lazy_name'])
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    """ import name on first use, e.g. np = lazy_import('numpy') """
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+__all__ = ['LazyModule', 'lazy_import']
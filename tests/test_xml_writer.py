@@ -0,0 +1,123 @@
+""" write_xml / format_xml against the previous pretty_xml + ElementTree.write output """
+import os
+import copy
+import logging
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from funcs import grt_cmd
+from funcs.gnss_config import GnssConfig
+from funcs.gnss_tools import pretty_xml, format_xml, write_xml, write_xml_files
+
+CONFIG = """
+[process_scheme]
+time_beg = 2020-01-01 00:00:00
+time_end = 2020-01-01 23:59:30
+intv = 30
+sys = GREC
+frequency = 2
+obs_comb = IF
+site_list = {sites}
+lsq_mode = LSQ
+orb_ac = wum
+cen = wum
+sat_rm = G04 C01
+
+[common]
+grt_bin = {root}/bin
+gnss_data = {root}/data
+
+[process_files]
+rinexo = ${{common:gnss_data}}/obs/${{yyyy}}/${{ddd}}/${{rec}}${{ddd}}0.${{yy}}o
+rinexn = ${{common:gnss_data}}/nav/brdm${{ddd}}0.${{yy}}p
+sp3 = ${{common:gnss_data}}/prod/wum${{gwkd}}.sp3
+rinexc = ${{common:gnss_data}}/prod/wum${{gwkd}}.clk
+ambflag = log_tb/${{rec}}${{ddd}}0.${{yy}}o.log
+atx = ${{common:gnss_data}}/model/igs14.atx
+blq = ${{common:gnss_data}}/model/oceanload
+de = ${{common:gnss_data}}/model/jpleph_de405_great
+ics = ics_${{yyyy}}${{ddd}}
+orb = orb_${{yyyy}}${{ddd}}
+satclk = clk_${{yyyy}}${{ddd}}
+recclk = rec_${{yyyy}}${{ddd}}
+recover_in = res_${{yyyy}}${{ddd}}
+"""
+
+# a 500-station network, plus names which have to be escaped
+SITES = [f's{i:03d}' for i in range(500)] + ['abmf', 'a&b', '<x>']
+
+COMMANDS = [
+    ('GrtTurboedit', {}), ('GrtClockRepair', {}), ('GrtPreedit', {}), ('GrtOi', {}), ('GrtOrbfit', {}),
+    ('GrtOrbdif', {}), ('GrtClkdif', {}), ('GrtEditres', {'mode': 'L12', 'freq': 'LC12'}), ('GrtConvobs', {}),
+    ('GrtPodlsq', {}), ('GrtPcelsq', {}), ('GrtPpplsq', {}),
+]
+
+
+def _old_bytes(root, f_xml):
+    root = copy.deepcopy(root)
+    pretty_xml(root, '\t', '\n', 0)
+    ET.ElementTree(root).write(f_xml, encoding='utf-8', xml_declaration=True)
+    with open(f_xml, 'rb') as f:
+        return f.read()
+
+
+def _new_bytes(root, f_xml):
+    write_xml(root, f_xml)
+    with open(f_xml, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / 'bin')
+    f_cfg = tmp_path / 'cf.ini'
+    f_cfg.write_text(CONFIG.format(root=tmp_path, sites=' '.join(SITES)))
+    monkeypatch.chdir(tmp_path)
+    logging.disable(logging.WARNING)
+    yield GnssConfig.from_file(str(f_cfg))
+    logging.disable(logging.NOTSET)
+
+
+@pytest.mark.parametrize('name, kwargs', COMMANDS, ids=[c[0] for c in COMMANDS])
+def test_great_xml(config, tmp_path, name, kwargs):
+    root = getattr(grt_cmd, name)(config, **kwargs).form_xml()
+    before = ET.tostring(root)
+    assert _new_bytes(root, tmp_path / 'new.xml') == _old_bytes(root, tmp_path / 'old.xml')
+    # the tree is not changed by format_xml
+    assert ET.tostring(root) == before
+
+
+def test_shards(config, tmp_path):
+    cmd = grt_cmd.GrtPodlsq(config)
+    items = []
+    for i, sites in enumerate([SITES[0:250], SITES[250:]]):
+        config.site_list = sites
+        items.append((cmd.form_xml(i), tmp_path / f'new{i}.xml'))
+    write_xml_files(items)
+    for i, (root, f_xml) in enumerate(items):
+        with open(f_xml, 'rb') as f:
+            assert f.read() == _old_bytes(root, tmp_path / f'old{i}.xml')
+
+
+def test_edge_cases(tmp_path):
+    root = ET.Element('config', {'a': 'x & y <z> "q"', 'b': 'tab\tcr\rlf\n', 'c': 'é'})
+    ET.SubElement(root, 'empty')
+    ET.SubElement(root, 'empty_attr', {'k': 'v'})
+    ET.SubElement(root, 'blank').text = ''
+    ET.SubElement(root, 'space').text = '  \n '
+    ET.SubElement(root, 'short').text = 'G01 G02 & <C01>'
+    ET.SubElement(root, 'tailed').tail = 'tail & <text>'
+    parent = ET.SubElement(root, 'parent')
+    parent.text = '  text of a parent  '
+    ET.SubElement(parent, 'child').text = 'x'
+    ET.SubElement(parent, 'long').text = ' '.join(f'/data/obs/2020/001/s{i:03d}0010.20o' for i in range(40))
+    nested = ET.SubElement(ET.SubElement(root, 'a'), 'b')
+    ET.SubElement(nested, 'c').text = ' '.join(['G01'] * 30)
+    ET.SubElement(nested, 'd').text = 'x' * 70
+    root.tail = '\n'
+    assert _new_bytes(root, tmp_path / 'new.xml') == _old_bytes(root, tmp_path / 'old.xml')
+
+    leaf = ET.Element('rec')
+    leaf.text = ' '.join(['ABMF'] * 40)
+    assert format_xml(leaf) == _old_bytes(leaf, tmp_path / 'leaf.xml').decode().split('\n', 1)[1]